@@ -0,0 +1,275 @@
+"""
+Benchmark suite for the scheduling pipeline.
+
+Times each stage in-process and full requests through the ASGI app, and
+reports p50/p99 latency and ops/sec per workload as JSON:
+
+    python benchmarks/run_benchmarks.py --requests 200 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SCHEDULER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'scheduler')
+sys.path.insert(0, SCHEDULER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Benchmark the computation itself: no per-step logs, no worker pool
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("EXECUTION_POOL", "inline")
+
+from main import app  # noqa: E402
+from models import AppointmentRequest  # noqa: E402
+from appointment_service import process_appointment, response_cache  # noqa: E402
+from utils.date_calculator import (  # noqa: E402
+    calculate_compatible_appointment_date,
+    calculate_counting_start_date,
+    calculate_notification_date,
+    get_employee_calendar
+)
+from utils.holiday_handler import filter_holidays_for_employee  # noqa: E402
+from utils.schedule_validator import validate_compatibility_with_schedules  # noqa: E402
+from workloads import WORKLOADS, generate_requests  # noqa: E402
+
+
+def summarize(durations_ns: List[int]) -> Dict[str, float]:
+    """
+    Latency percentiles (microseconds) and throughput of a list of timings.
+    """
+    ordered = sorted(durations_ns)
+    count = len(ordered)
+    total = sum(ordered)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(count - 1, int(fraction * count))] / 1000
+
+    return {
+        "count": count,
+        "p50_us": round(percentile(0.50), 2),
+        "p99_us": round(percentile(0.99), 2),
+        "mean_us": round(total / count / 1000, 2),
+        "ops_per_sec": round(count / (total / 1e9), 1) if total else 0.0
+    }
+
+
+def timed(function: Callable, *args) -> Tuple[Any, int]:
+    start = time.perf_counter_ns()
+    result = function(*args)
+    return result, time.perf_counter_ns() - start
+
+
+def run_stages(bodies: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Times each pipeline stage in-process. Every stage group works on a freshly
+    parsed request so lazily built indexes aren't shared between stages.
+    """
+    timings: Dict[str, List[int]] = {stage: [] for stage in (
+        "parse", "calendar", "notification_date", "compatible_appointment_date",
+        "validate_with_schedules", "pipeline", "serialize"
+    )}
+
+    for body in bodies:
+        raw = json.dumps(body).encode()
+        request, elapsed = timed(AppointmentRequest.model_validate_json, raw)
+        timings["parse"].append(elapsed)
+        employee = request.employee
+
+        def build_calendar():
+            holidays = filter_holidays_for_employee(request.holiday_dates, employee.works_holidays)
+            return holidays, get_employee_calendar(employee.work_days, holidays, employee.works_holidays)
+
+        (holidays, calendar), elapsed = timed(build_calendar)
+        timings["calendar"].append(elapsed)
+
+        notification_date, elapsed = timed(
+            calculate_notification_date, request.current_date, request.current_time, employee.work_days,
+            holidays, employee.works_holidays, employee.start_time, employee.end_time, calendar
+        )
+        timings["notification_date"].append(elapsed)
+
+        counting_start_date = calculate_counting_start_date(
+            notification_date, employee.work_days, holidays, employee.works_holidays, calendar
+        )
+        try:
+            appointment_date, elapsed = timed(
+                calculate_compatible_appointment_date, counting_start_date, employee.work_days,
+                request.lawyer.work_days, holidays, employee.works_holidays, calendar, request.lead_time_days
+            )
+            timings["compatible_appointment_date"].append(elapsed)
+
+            _, elapsed = timed(
+                validate_compatibility_with_schedules, employee.work_days, request.lawyer.work_days,
+                employee.start_time, employee.end_time, request.lawyer.start_time, request.lawyer.end_time,
+                appointment_date, request.employee_schedule, request.lawyer_schedule
+            )
+            timings["validate_with_schedules"].append(elapsed)
+        except ValueError:
+            # No compatible date: the pipeline answers without validating schedules
+            pass
+
+        fresh_request = AppointmentRequest.model_validate_json(raw)
+        response, elapsed = timed(process_appointment, fresh_request, False)
+        timings["pipeline"].append(elapsed)
+
+        _, elapsed = timed(response.model_dump_json)
+        timings["serialize"].append(elapsed)
+
+    return timings
+
+
+async def asgi_post(path: str, body: bytes, headers: List[Tuple[bytes, bytes]]) -> Tuple[int, bytes]:
+    """
+    Sends one POST request straight to the ASGI app (no network or HTTP client).
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())] + headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def run_asgi(bodies: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Times full requests through the ASGI app, bypassing the response cache and then hitting it.
+    """
+    timings: Dict[str, List[int]] = {"asgi": [], "asgi_cached": []}
+    raw_bodies = [json.dumps(body).encode() for body in bodies]
+
+    for stage, headers in (("asgi", [(b"cache-control", b"no-cache")]), ("asgi_cached", [])):
+        if stage == "asgi_cached":
+            # Fill the cache first so the timed pass measures hits
+            for raw in raw_bodies:
+                await asgi_post("/schedule-appointment", raw, [])
+        for raw in raw_bodies:
+            start = time.perf_counter_ns()
+            status, _ = await asgi_post("/schedule-appointment", raw, headers)
+            timings[stage].append(time.perf_counter_ns() - start)
+            if status >= 500:
+                raise RuntimeError(f"ASGI request failed with status {status}")
+
+    response_cache.clear()
+    return timings
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=SCHEDULER_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(workload_names: List[str], request_count: int, seed: int, warmup: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name in workload_names:
+        workload = WORKLOADS[name]
+        bodies = generate_requests(workload, request_count, seed)
+
+        # Warm up caches and code paths with requests that aren't measured
+        warmup_bodies = generate_requests(workload, warmup, seed + 1000)
+        run_stages(warmup_bodies)
+        asyncio.run(run_asgi(warmup_bodies))
+
+        timings = run_stages(bodies)
+        timings.update(asyncio.run(run_asgi(bodies)))
+        results[name] = {
+            "parameters": workload._asdict(),
+            "stages": {stage: summarize(values) for stage, values in timings.items() if values}
+        }
+        print(f"{name}: pipeline p50 {results[name]['stages']['pipeline']['p50_us']} us", file=sys.stderr)
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests_per_workload": request_count,
+            "seed": seed
+        },
+        "workloads": results
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """
+    Lines with the p50/p99 ratio (current / previous) of every stage found in both reports.
+    """
+    lines = []
+    for name, workload in current["workloads"].items():
+        previous_stages = previous.get("workloads", {}).get(name, {}).get("stages", {})
+        for stage, summary in workload["stages"].items():
+            before = previous_stages.get(stage)
+            if not before or not before["p50_us"] or not before["p99_us"]:
+                continue
+            lines.append(f"{name:22} {stage:28} p50 x{summary['p50_us'] / before['p50_us']:.2f}"
+                         f"  p99 x{summary['p99_us'] / before['p99_us']:.2f}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the appointment scheduling pipeline")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help=f"Comma-separated workloads ({', '.join(WORKLOADS)})")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per workload")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"Unknown workloads: {', '.join(unknown)}")
+
+    report = run(names, args.requests, args.seed, args.warmup)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            for line in compare(report, json.load(file)):
+                print(line, file=sys.stderr)
@@ -0,0 +1,93 @@
+"""
+Synthetic scheduling workloads for the benchmark suite.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple
+
+WORK_PATTERNS = {
+    "weekdays": ["lunes", "martes", "miércoles", "jueves", "viernes"],
+    "alternate": ["lunes", "miércoles", "viernes"],
+    "weekend": ["sábado", "domingo"],
+    "all_week": ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"],
+}
+
+
+class Workload(NamedTuple):
+    name: str
+    holidays: int
+    meetings_per_day: int
+    employee_pattern: str
+    lawyer_pattern: str
+    search_horizon_days: int  # 0 validates only the appointment date
+
+
+WORKLOADS = {
+    workload.name: workload for workload in (
+        Workload("baseline", 0, 0, "weekdays", "weekdays", 0),
+        Workload("many_holidays", 200, 0, "weekdays", "weekdays", 0),
+        Workload("busy_schedules", 10, 8, "weekdays", "weekdays", 0),
+        Workload("very_busy_schedules", 10, 30, "weekdays", "weekdays", 0),
+        Workload("sparse_patterns", 10, 4, "alternate", "weekend", 0),
+        Workload("search_30_days", 10, 8, "weekdays", "alternate", 30),
+        Workload("search_180_days", 10, 16, "weekdays", "alternate", 180),
+    )
+}
+
+
+def _time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _schedule(rng: random.Random, first_day: date, days: int, meetings_per_day: int) -> Dict[str, Any]:
+    meetings = []
+    for offset in range(days):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        for _ in range(meetings_per_day):
+            start = rng.randrange(7 * 60, 18 * 60, 15)
+            meetings.append({
+                "date": day,
+                "start_time": _time(start),
+                "end_time": _time(min(start + rng.choice((15, 30, 45, 60, 90)), 23 * 60 + 59))
+            })
+    return {"meetings": meetings}
+
+
+def generate_requests(workload: Workload, count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Generates request bodies for POST /schedule-appointment following a workload.
+    """
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(count):
+        current_date = date(2024, 1, 1) + timedelta(days=rng.randrange(730))
+        holidays = sorted({(current_date + timedelta(days=rng.randrange(-30, 400))).isoformat()
+                           for _ in range(workload.holidays)})
+        # Busy schedules cover the dates the request can land on
+        schedule_days = max(workload.search_horizon_days, 30) + 30
+
+        body = {
+            "current_date": current_date.isoformat(),
+            "current_time": _time(rng.randrange(6 * 60, 20 * 60, 15)),
+            "employee": {
+                "work_days": WORK_PATTERNS[workload.employee_pattern],
+                "start_time": "08:00",
+                "end_time": "18:00",
+                "works_holidays": rng.random() < 0.2
+            },
+            "lawyer": {
+                "work_days": WORK_PATTERNS[workload.lawyer_pattern],
+                "non_work_days": [],
+                "start_time": "09:00",
+                "end_time": "17:00"
+            },
+            "holiday_dates": holidays
+        }
+        if workload.meetings_per_day:
+            body["employee_schedule"] = _schedule(rng, current_date, schedule_days, workload.meetings_per_day)
+            body["lawyer_schedule"] = _schedule(rng, current_date, schedule_days, workload.meetings_per_day)
+        if workload.search_horizon_days:
+            body["search_free_slot"] = True
+            body["search_horizon_days"] = workload.search_horizon_days
+        bodies.append(body)
+    return bodies
@@ -0,0 +1,516 @@
+from datetime import time, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+import hashlib
+import logging
+import os
+
+from pydantic import ValidationError
+
+from models import (
+    AppointmentRequest,
+    AppointmentResponse,
+    BatchItemError,
+    DateTableRequest,
+    EmployeeMatch,
+    MatchRequest,
+    MatchResponse
+)
+from utils.date_calculator import (
+    calculate_notification_date,
+    calculate_counting_start_date,
+    calculate_compatible_appointment_date,
+    calculate_appointment_date,
+    get_employee_calendar
+)
+from utils.compact_schedule import Meeting, end_minute_to_time, start_minute
+from utils.compatibility_profile import get_compatibility_profile
+from utils.holiday_handler import filter_holidays_for_employee, normalize_holiday_dates
+from utils.slot_search import find_first_free_slot
+from utils.schedule_store import get_schedule_store
+from utils.shared_calendar import current_shared_snapshot
+from utils.person_registry import RegisteredPerson, get_person_registry
+from utils.date_table import DateTableRow, build_appointment_date_table
+from utils.log_pipeline import should_log_steps
+from utils.metrics import stage_timer
+from utils.response_cache import cache_from_environment
+from utils.startup import warmup_snapshot_from_environment
+
+logger = logging.getLogger(__name__)
+
+# Responses of /schedule-appointment, keyed by appointment_cache_key()
+response_cache = cache_from_environment()
+# Recent cached requests, replayed into response_cache on the next start
+warmup_snapshot = warmup_snapshot_from_environment()
+
+# A booked appointment takes the minimum window the scheduling rules look for
+BOOKING_DURATION_MINUTES = 60
+# Times a booking is recomputed when its window is taken before it's reserved
+BOOKING_MAX_ATTEMPTS = int(os.environ.get("BOOKING_MAX_ATTEMPTS", "10"))
+
+
+def resolve_schedule(inline_schedule, schedule_ref: Optional[str], role: str):
+    """
+    Returns the inline schedule or the schedule referenced by person id, from the
+    shared calendar if published there, otherwise from the schedule store.
+
+    Raises:
+        ValueError: If both are given, no store is configured or the reference is unknown
+    """
+    if schedule_ref is None:
+        return inline_schedule
+    if inline_schedule is not None:
+        raise ValueError(f"Provide either {role}_schedule or {role}_schedule_ref, not both")
+
+    # Schedules published in shared memory are mapped once for every worker
+    snapshot = current_shared_snapshot()
+    shared_schedule = snapshot.schedule(schedule_ref) if snapshot is not None else None
+    if shared_schedule is not None:
+        return shared_schedule
+
+    store = get_schedule_store()
+    if store is None:
+        raise ValueError("Schedule references require SCHEDULE_STORE_DIR or a shared calendar to be configured")
+    return store.open(schedule_ref)
+
+
+def resolve_registered_people(request: AppointmentRequest) -> AppointmentRequest:
+    """
+    Returns the request with employee_id/lawyer_id replaced by the registered
+    config and live schedule (the request itself if it references nobody).
+
+    Raises:
+        ValueError: If a person isn't registered or also comes with an inline schedule
+    """
+    if request.employee_id is None and request.lawyer_id is None:
+        return request
+
+    registry = get_person_registry()
+    update = {}
+    for role in ("employee", "lawyer"):
+        person_id = getattr(request, f"{role}_id")
+        if person_id is None:
+            continue
+        if getattr(request, f"{role}_schedule") is not None or getattr(request, f"{role}_schedule_ref") is not None:
+            raise ValueError(f"Registered {role}s use their stored schedule; don't send {role}_schedule")
+        person = registry.get(role, person_id)
+        update.update({role: person.config, f"{role}_schedule": person.schedule, f"{role}_id": None})
+    return request.model_copy(update=update)
+
+
+def resolve_booking_people(request: AppointmentRequest) -> Tuple[AppointmentRequest,
+                                                                  List[Tuple[RegisteredPerson, int]]]:
+    """
+    Resolves the registered employee and lawyer of a booking, each with the
+    schedule version seen before the appointment is computed.
+
+    Raises:
+        ValueError: If either person isn't referenced by id or isn't registered
+    """
+    if request.employee_id is None or request.lawyer_id is None:
+        raise ValueError("Bookings require the employee_id and lawyer_id of registered people")
+
+    registry = get_person_registry()
+    people = [registry.get("employee", request.employee_id), registry.get("lawyer", request.lawyer_id)]
+    # Versions are read before the schedules, so later changes are detected on reserve
+    seen = [(person, person.schedule.version) for person in people]
+    return resolve_registered_people(request), seen
+
+
+def reserve_appointment(response: AppointmentResponse, people: List[Tuple[RegisteredPerson, int]]) -> time:
+    """
+    Reserves the window of a schedulable response in the booked people's schedules
+    and returns the end time of the appointment.
+
+    Raises:
+        BookingConflict: If the window was taken after `people` were resolved
+    """
+    start = start_minute(response.appointment_time)
+    meeting = Meeting(response.appointment_date.toordinal(), start, start + BOOKING_DURATION_MINUTES)
+    get_person_registry().reserve(meeting, people)
+    return end_minute_to_time(meeting.end)
+
+
+def process_appointment(request: AppointmentRequest, log_steps: Optional[bool] = None) -> AppointmentResponse:
+    """
+    Runs the scheduling business rules for a single request.
+    Per-step info logs follow the configured sampling unless log_steps is given.
+    Step durations and the outcome are recorded in the metrics registry.
+
+    Raises:
+        ValueError: If the request dates cannot be calculated
+    """
+    if log_steps is None:
+        log_steps = should_log_steps(logger)
+    timer = stage_timer()
+
+    request = resolve_registered_people(request)
+
+    employee_schedule = resolve_schedule(request.employee_schedule, request.employee_schedule_ref, "employee")
+    lawyer_schedule = resolve_schedule(request.lawyer_schedule, request.lawyer_schedule_ref, "lawyer")
+
+    # Filter holidays according to whether employee works holidays
+    effective_holiday_dates = filter_holidays_for_employee(
+        request.holiday_dates,
+        request.employee.works_holidays
+    )
+
+    calendar = get_employee_calendar(
+        request.employee.work_days,
+        effective_holiday_dates,
+        request.employee.works_holidays
+    )
+
+    if timer:
+        timer.lap("calendar")
+    if log_steps:
+        logger.info("Processing appointment for current date: %s", request.current_date)
+
+    # 1. Calculate notification date
+    notification_date = calculate_notification_date(
+        request.current_date,
+        request.current_time,
+        request.employee.work_days,
+        effective_holiday_dates,
+        request.employee.works_holidays,
+        request.employee.start_time,
+        request.employee.end_time,
+        calendar
+    )
+
+    if timer:
+        timer.lap("notification_date")
+    if log_steps:
+        logger.info("Calculated notification date: %s", notification_date)
+
+    # 2. Calculate counting start date
+    counting_start_date = calculate_counting_start_date(
+        notification_date,
+        request.employee.work_days,
+        effective_holiday_dates,
+        request.employee.works_holidays,
+        calendar
+    )
+
+    if timer:
+        timer.lap("counting_start_date")
+    if log_steps:
+        logger.info("Counting start date: %s", counting_start_date)
+
+    # 3. Calculate appointment date (considering compatibility)
+    try:
+        appointment_date = calculate_compatible_appointment_date(
+            counting_start_date,
+            request.employee.work_days,
+            request.lawyer.work_days,
+            effective_holiday_dates,
+            request.employee.works_holidays,
+            calendar,
+            request.lead_time_days
+        )
+    except ValueError as ve:
+        # Could not find compatible date
+        if log_steps:
+            logger.warning("Could not find compatible date: %s", ve)
+        # Calculate date based only on employee for response purposes
+        appointment_date = calculate_appointment_date(
+            counting_start_date,
+            request.employee.work_days,
+            effective_holiday_dates,
+            request.employee.works_holidays,
+            calendar,
+            request.lead_time_days
+        )
+        reason = "No common work days between employee and lawyer"
+        if timer:
+            timer.lap("appointment_date")
+            timer.finish(reason)
+
+        return AppointmentResponse(
+            current_date=request.current_date,
+            notification_date=notification_date,
+            counting_start_date=counting_start_date,
+            appointment_date=appointment_date,
+            appointment_time=time(0, 0),  # Default time when not schedulable
+            is_schedulable=False,
+            reason=reason
+        )
+
+    if timer:
+        timer.lap("appointment_date")
+    if log_steps:
+        logger.info("Calculated appointment date: %s", appointment_date)
+
+    # 4. Validate schedule compatibility between employee and lawyer considering schedules
+    # Date-independent checks come precomputed for the configuration pair
+    profile = get_compatibility_profile(
+        request.employee.work_days,
+        request.employee.start_time,
+        request.employee.end_time,
+        request.lawyer.work_days,
+        request.lawyer.start_time,
+        request.lawyer.end_time
+    )
+
+    if request.search_free_slot:
+        # Search forward for the first date with a free window
+        is_compatible, incompatibility_reason, free_slot_date, schedule_overlap = find_first_free_slot(
+            appointment_date,
+            calendar,
+            profile,
+            employee_schedule,
+            lawyer_schedule,
+            request.search_horizon_days
+        )
+        if is_compatible:
+            appointment_date = free_slot_date
+    elif employee_schedule or lawyer_schedule:
+        # Use validation with schedules if provided
+        is_compatible, incompatibility_reason, schedule_overlap = profile.compatibility_with_schedules(
+            appointment_date,
+            employee_schedule,
+            lawyer_schedule
+        )
+    else:
+        # Use traditional validation if no schedules provided
+        is_compatible, incompatibility_reason, schedule_overlap = profile.full_compatibility(appointment_date)
+
+    if timer:
+        timer.lap("compatibility")
+    if not is_compatible:
+        if timer:
+            timer.finish(incompatibility_reason)
+        if log_steps:
+            logger.warning("Appointment not schedulable: %s", incompatibility_reason)
+        return AppointmentResponse(
+            current_date=request.current_date,
+            notification_date=notification_date,
+            counting_start_date=counting_start_date,
+            appointment_date=appointment_date,
+            appointment_time=time(0, 0),  # Default time when not schedulable
+            is_schedulable=False,
+            reason=incompatibility_reason
+        )
+
+    # 5. Determine appointment time (start of schedule overlap)
+    appointment_time = schedule_overlap[0]
+    if timer:
+        timer.lap("appointment_time")
+        timer.finish(None)
+
+    if log_steps:
+        logger.info("Appointment successfully scheduled for %s at %s", appointment_date, appointment_time)
+
+    return AppointmentResponse(
+        current_date=request.current_date,
+        notification_date=notification_date,
+        counting_start_date=counting_start_date,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        is_schedulable=True,
+        reason=None
+    )
+
+
+def appointment_cache_key(request: AppointmentRequest) -> bytes:
+    """
+    Canonical hash of everything the scheduling result depends on.
+    Holidays are hashed as a normalized set and busy schedules by their digest.
+    The 128-bit digest makes collisions negligible, so entries don't keep the
+    request to compare against.
+    """
+    request = resolve_registered_people(request)
+    employee = request.employee
+    lawyer = request.lawyer
+    employee_schedule = resolve_schedule(request.employee_schedule, request.employee_schedule_ref, "employee")
+    lawyer_schedule = resolve_schedule(request.lawyer_schedule, request.lawyer_schedule_ref, "lawyer")
+
+    parts = (
+        request.current_date, request.current_time,
+        tuple(employee.work_days), employee.start_time, employee.end_time, employee.works_holidays,
+        tuple(lawyer.work_days), tuple(lawyer.non_work_days), lawyer.start_time, lawyer.end_time,
+        normalize_holiday_dates(request.holiday_dates).digest,
+        employee_schedule.digest() if employee_schedule is not None else None,
+        lawyer_schedule.digest() if lawyer_schedule is not None else None,
+        request.search_free_slot, request.search_horizon_days, request.lead_time_days
+    )
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).digest()
+
+
+def lookup_cached_appointment(request: AppointmentRequest) -> Tuple[bytes, Optional[AppointmentResponse]]:
+    """
+    Returns the cache key of a request and its cached response, if any.
+    """
+    key = appointment_cache_key(request)
+    return key, response_cache.get(key)
+
+
+def store_cached_appointment(key: bytes, response: AppointmentResponse,
+                             request: Optional[AppointmentRequest] = None):
+    """
+    Caches a computed response under the key from lookup_cached_appointment.
+    The request as received, if given, is kept for the warmup snapshot.
+    """
+    response_cache.put(key, response, len(key) + len(response.model_dump_json()))
+    if request is not None and warmup_snapshot is not None:
+        warmup_snapshot.record(key, request)
+
+
+def replay_warmup_snapshot() -> int:
+    """
+    Recomputes the requests of the warmup snapshot into the response cache and
+    returns how many were cached. Requests that no longer validate (e.g. a
+    registered person was removed) are skipped.
+    """
+    if warmup_snapshot is None:
+        return 0
+    cached = 0
+    for line in warmup_snapshot.load():
+        try:
+            request = AppointmentRequest.model_validate_json(line)
+            key = appointment_cache_key(request)
+            store_cached_appointment(key, process_appointment(resolve_registered_people(request), log_steps=False),
+                                     request)
+            cached += 1
+        except ValueError as ve:
+            logger.info("Skipped warmup request: %s", ve)
+    logger.info("Warmed the response cache with %d requests from %s", cached, warmup_snapshot.path)
+    return cached
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    First error of a pydantic validation, prefixed with its field path.
+    """
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+def prepare_batch_item(index: int, item: Dict[str, Any]) -> Union[AppointmentRequest, BatchItemError]:
+    """
+    Validates a batch item and resolves its registered people; an invalid item
+    becomes the error reported in its slot.
+    """
+    try:
+        return resolve_registered_people(AppointmentRequest.model_validate(item))
+    except ValidationError as error:
+        return BatchItemError(index=index, error=validation_message(error))
+    except ValueError as ve:
+        return BatchItemError(index=index, error=str(ve))
+
+
+def process_appointment_batch(items: List[Union[AppointmentRequest, BatchItemError]]
+                              ) -> List[Union[AppointmentResponse, BatchItemError]]:
+    """
+    Runs the scheduling business rules for many requests.
+    Calendars, holiday sets and compatibility profiles are shared across items;
+    responses are returned in the same order as the requests. Items that were
+    already invalid, or whose dates cannot be calculated, get an error in their
+    slot without affecting the others.
+    """
+    responses = []
+
+    for index, item in enumerate(items):
+        if isinstance(item, BatchItemError):
+            responses.append(item)
+            continue
+        try:
+            responses.append(process_appointment(item, log_steps=False))
+        except ValueError as ve:
+            responses.append(BatchItemError(index=index, error=str(ve)))
+
+    return responses
+
+
+def process_match_request(request: MatchRequest) -> MatchResponse:
+    """
+    Finds, for each employee, the lawyer with the earliest common free 60-minute window.
+
+    Each employee's search starts at their own appointment date (lead_time_days work
+    days after the counting start date) and covers search_horizon_days calendar days.
+    """
+    # NumPy is only loaded by processes that serve matching requests
+    from utils.matching_engine import MatchingEngine
+
+    employee_windows = []
+    for employee in request.employees:
+        effective_holiday_dates = filter_holidays_for_employee(request.holiday_dates, employee.config.works_holidays)
+        calendar = get_employee_calendar(employee.config.work_days, effective_holiday_dates,
+                                         employee.config.works_holidays)
+        try:
+            notification_date = calculate_notification_date(
+                request.current_date, request.current_time, employee.config.work_days,
+                effective_holiday_dates, employee.config.works_holidays,
+                employee.config.start_time, employee.config.end_time, calendar
+            )
+            counting_start_date = calculate_counting_start_date(
+                notification_date, employee.config.work_days, effective_holiday_dates,
+                employee.config.works_holidays, calendar
+            )
+            earliest_date = calculate_appointment_date(
+                counting_start_date, employee.config.work_days, effective_holiday_dates,
+                employee.config.works_holidays, calendar, request.lead_time_days
+            )
+        except ValueError as ve:
+            employee_windows.append((calendar, None, str(ve)))
+            continue
+        employee_windows.append((calendar, earliest_date, None))
+
+    earliest_dates = [window[1] for window in employee_windows if window[1] is not None]
+    first_date = min(earliest_dates, default=request.current_date)
+    last_date = max(earliest_dates, default=request.current_date) + timedelta(days=request.search_horizon_days)
+    engine = MatchingEngine(first_date, (last_date - first_date).days + 1)
+
+    employee_matrices = []
+    for employee, (calendar, earliest_date, _) in zip(request.employees, employee_windows):
+        if earliest_date is None:
+            # Never available: keeps matrix positions aligned with employees
+            employee_matrices.append(engine.employee_matrix(
+                employee.config, calendar, None, last_date + timedelta(days=1), last_date
+            ))
+        else:
+            employee_matrices.append(engine.employee_matrix(
+                employee.config, calendar, employee.schedule, earliest_date,
+                earliest_date + timedelta(days=request.search_horizon_days)
+            ))
+    lawyer_matrices = [engine.lawyer_matrix(lawyer.config, lawyer.schedule) for lawyer in request.lawyers]
+
+    matches = []
+    for employee, (_, _, error), match in zip(request.employees, employee_windows,
+                                              engine.match(employee_matrices, lawyer_matrices)):
+        if match is None:
+            matches.append(EmployeeMatch(
+                employee_id=employee.id,
+                is_schedulable=False,
+                reason=error or f"No lawyer available in the next {request.search_horizon_days} days"
+            ))
+            continue
+
+        lawyer_index, appointment_date, appointment_time = match
+        matches.append(EmployeeMatch(
+            employee_id=employee.id,
+            lawyer_id=request.lawyers[lawyer_index].id,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            is_schedulable=True
+        ))
+
+    return MatchResponse(matches=matches)
+
+
+def process_date_table_request(request: DateTableRequest) -> List[DateTableRow]:
+    """
+    Builds the appointment date table of an employee work pattern for a range of current dates.
+
+    Raises:
+        ValueError: If the range is invalid or the employee has no work days
+    """
+    return build_appointment_date_table(
+        request.start_date,
+        request.end_date,
+        request.employee.work_days,
+        request.holiday_dates,
+        request.employee.works_holidays,
+        request.lead_time_days,
+        request.time_variants
+    )
@@ -1,27 +1,98 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from datetime import time
+# Imported first: the startup profile measures the imports below from here
+from utils.startup import start_warmup, startup_profile
+
+from fastapi import FastAPI, Header, HTTPException, Response
+from typing import Literal, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
 import logging
+import os
 
-from models import AppointmentRequest, AppointmentResponse
-from utils.date_calculator import (
-    calculate_notification_date,
-    calculate_counting_start_date,
-    calculate_compatible_appointment_date
+from models import (
+    AppointmentRequest,
+    AppointmentResponse,
+    BatchAppointmentRequest,
+    BatchAppointmentResponse,
+    BookingResponse,
+    DateTableRequest,
+    DateTableResponse,
+    MatchRequest,
+    MatchResponse,
+    MeetingChanges,
+    RegisteredEmployee,
+    RegisteredLawyer,
+    RegisteredPersonResponse
+)
+from appointment_service import (
+    BOOKING_MAX_ATTEMPTS,
+    lookup_cached_appointment,
+    process_appointment,
+    prepare_batch_item,
+    process_appointment_batch,
+    process_date_table_request,
+    process_match_request,
+    replay_warmup_snapshot,
+    reserve_appointment,
+    resolve_booking_people,
+    resolve_registered_people,
+    response_cache,
+    store_cached_appointment,
+    warmup_snapshot
 )
-from utils.schedule_validator import validate_full_compatibility, validate_compatibility_with_schedules
-from utils.holiday_handler import filter_holidays_for_employee
+from utils.date_table import date_table_to_parquet, iter_csv_lines
+from utils.log_pipeline import configure_logging
+from utils.execution import estimate_appointment_cost, estimate_match_cost, execution_layer_from_environment
+from utils.metrics import RequestTimingMiddleware, metrics
+from utils.person_registry import BookingConflict, PersonNotFound, get_person_registry
+from utils.sharding import serve_shard, start_shard_processes
+from utils.shared_calendar import current_shared_snapshot
+
+startup_profile.mark("imports")
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (non-blocking queue pipeline, see utils/log_pipeline.py)
+log_pipeline = configure_logging()
 logger = logging.getLogger(__name__)
 
+# Costly requests run in a worker pool instead of the event loop
+execution_layer = execution_layer_from_environment()
+
 app = FastAPI(
     title="Appointment Scheduling API",
     description="API for calculating scheduling dates according to specific business rules",
     version="1.0.0"
 )
 
+# Request durations (parsing, processing and serialization) of the scheduling endpoints
+app.add_middleware(RequestTimingMiddleware, paths=(
+    "/schedule-appointment", "/schedule-appointments/batch", "/book-appointment", "/match-appointments",
+    "/appointment-date-table"
+))
+
+
+def collect_component_metrics():
+    """
+    Response cache, worker pool and logging pipeline state for /metrics.
+    """
+    cache = response_cache.stats()
+    execution = execution_layer.stats()
+    return [
+        ("scheduler_response_cache_entries", "gauge", "Entries in the response cache.", [({}, cache["entries"])]),
+        ("scheduler_response_cache_bytes", "gauge", "Size of the response cache in bytes.", [({}, cache["bytes"])]),
+        ("scheduler_response_cache_requests_total", "counter", "Response cache lookups by result.",
+         [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+        ("scheduler_response_cache_evictions_total", "counter", "Entries evicted from the response cache.",
+         [({}, cache["evictions"])]),
+        ("scheduler_execution_requests_total", "counter", "Requests run inline or offloaded to the worker pool.",
+         [({"mode": "inline"}, execution["inline"]), ({"mode": "pool"}, execution["submitted"])]),
+        ("scheduler_execution_pending", "gauge", "Offloaded requests queued or running.",
+         [({}, execution["pending"])]),
+        ("scheduler_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.",
+         [({}, log_pipeline.dropped)]),
+    ]
+
+
+metrics.add_collector(collect_component_metrics)
+
 
 @app.get("/")
 async def root():
@@ -29,7 +100,8 @@ async def root():
 
 
 @app.post("/schedule-appointment", response_model=AppointmentResponse)
-async def schedule_appointment(request: AppointmentRequest):
+async def schedule_appointment(request: AppointmentRequest, response: Response,
+                               cache_control: Optional[str] = Header(default=None)):
     """
     Main endpoint for scheduling an appointment according to business rules.
 
@@ -39,134 +111,293 @@ async def schedule_appointment(request: AppointmentRequest):
     - Appointment date
     - Appointment time (within overlap hours)
     - Compatibility validations
+
+    Identical requests are answered from a response cache unless the request
+    sends `Cache-Control: no-cache` (or `no-store`). Requests with large busy
+    schedules or long searches are computed in the worker pool.
+
+    Registered people can be referenced with `employee_id`/`lawyer_id` instead
+    of sending their config and schedule.
     """
     try:
-        # Filter holidays according to whether employee works holidays
-        effective_holiday_dates = filter_holidays_for_employee(
-            request.holiday_dates,
-            request.employee.works_holidays
-        )
-
-        logger.info(f"Processing appointment for current date: {request.current_date}")
-
-        # 1. Calculate notification date
-        notification_date = calculate_notification_date(
-            request.current_date,
-            request.current_time,
-            request.employee.work_days,
-            effective_holiday_dates,
-            request.employee.works_holidays,
-            request.employee.start_time,
-            request.employee.end_time
-        )
-
-        logger.info(f"Calculated notification date: {notification_date}")
-
-        # 2. Calculate counting start date
-        counting_start_date = calculate_counting_start_date(
-            notification_date,
-            request.employee.work_days,
-            effective_holiday_dates,
-            request.employee.works_holidays
-        )
-
-        logger.info(f"Counting start date: {counting_start_date}")
-
-        # 3. Calculate appointment date (considering compatibility)
-        try:
-            appointment_date = calculate_compatible_appointment_date(
-                counting_start_date,
-                request.employee.work_days,
-                request.lawyer.work_days,
-                effective_holiday_dates,
-                request.employee.works_holidays
-            )
-            logger.info(f"Calculated appointment date: {appointment_date}")
-
-            # 4. Validate schedule compatibility between employee and lawyer considering schedules
-            if request.employee_schedule or request.lawyer_schedule:
-                # Use validation with schedules if provided
-                is_compatible, incompatibility_reason, schedule_overlap = validate_compatibility_with_schedules(
-                    request.employee.work_days,
-                    request.lawyer.work_days,
-                    request.employee.start_time,
-                    request.employee.end_time,
-                    request.lawyer.start_time,
-                    request.lawyer.end_time,
-                    appointment_date,
-                    request.employee_schedule,
-                    request.lawyer_schedule
-                )
-            else:
-                # Use traditional validation if no schedules provided
-                is_compatible, incompatibility_reason, schedule_overlap = validate_full_compatibility(
-                    request.employee.work_days,
-                    request.lawyer.work_days,
-                    request.employee.start_time,
-                    request.employee.end_time,
-                    request.lawyer.start_time,
-                    request.lawyer.end_time,
-                    appointment_date
-                )
-
-            if not is_compatible:
-                logger.warning(f"Appointment not schedulable: {incompatibility_reason}")
-                return AppointmentResponse(
-                    current_date=request.current_date,
-                    notification_date=notification_date,
-                    counting_start_date=counting_start_date,
-                    appointment_date=appointment_date,
-                    appointment_time=time(0, 0),  # Default time when not schedulable
-                    is_schedulable=False,
-                    reason=incompatibility_reason
-                )
-
-        except ValueError as ve:
-            # Could not find compatible date
-            logger.warning(f"Could not find compatible date: {str(ve)}")
-            from utils.date_calculator import calculate_appointment_date
-            # Calculate date based only on employee for response purposes
-            appointment_date = calculate_appointment_date(
-                counting_start_date,
-                request.employee.work_days,
-                effective_holiday_dates,
-                request.employee.works_holidays
-            )
-
-            return AppointmentResponse(
-                current_date=request.current_date,
-                notification_date=notification_date,
-                counting_start_date=counting_start_date,
-                appointment_date=appointment_date,
-                appointment_time=time(0, 0),  # Default time when not schedulable
-                is_schedulable=False,
-                reason="No common work days between employee and lawyer"
-            )
-
-        # 5. Determine appointment time (start of schedule overlap)
-        appointment_time = schedule_overlap[0]
-
-        logger.info(f"Appointment successfully scheduled for {appointment_date} at {appointment_time}")
-
-        return AppointmentResponse(
-            current_date=request.current_date,
-            notification_date=notification_date,
-            counting_start_date=counting_start_date,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            is_schedulable=True,
-            reason=None
-        )
+        resolved = resolve_registered_people(request)
+        use_cache = not (cache_control and ("no-cache" in cache_control or "no-store" in cache_control))
+        if use_cache:
+            cache_key, cached = lookup_cached_appointment(resolved)
+            if cached is not None:
+                response.headers["X-Cache"] = "HIT"
+                return cached
+
+        result = await execution_layer.run(estimate_appointment_cost(resolved), process_appointment, resolved)
+
+        if use_cache:
+            store_cached_appointment(cache_key, result, request)
+        response.headers["X-Cache"] = "MISS" if use_cache else "BYPASS"
+        return result
+
+    except ValueError as ve:
+        logger.error("Validation error: %s", ve)
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/schedule-appointments/batch", response_model=BatchAppointmentResponse)
+async def schedule_appointments_batch(request: BatchAppointmentRequest):
+    """
+    Schedules many appointments in a single call.
+
+    Holiday sets and compatibility results are shared across items and
+    responses are returned in the same order as the requests. An invalid item
+    gets `{"index": i, "error": "..."}` in its slot; the other items are still scheduled.
+    """
+    try:
+        logger.info("Processing appointment batch of %d requests", len(request.requests))
+        # Registered people are resolved here so worker processes get their current schedules
+        items = [prepare_batch_item(index, item) for index, item in enumerate(request.requests)]
+
+        cost = sum(estimate_appointment_cost(item) for item in items if isinstance(item, AppointmentRequest))
+        responses = await execution_layer.run(cost, process_appointment_batch, items)
+        return BatchAppointmentResponse(responses=responses)
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/book-appointment", response_model=BookingResponse)
+async def book_appointment(request: AppointmentRequest):
+    """
+    Schedules an appointment between a registered employee and lawyer and
+    reserves its 60-minute window in both schedules.
+
+    Windows are computed without locks and reserved only if neither schedule
+    changed on that day meanwhile; otherwise the appointment is recomputed
+    against the updated schedules, moving on to the next free window.
+    """
+    try:
+        for attempt in range(1, BOOKING_MAX_ATTEMPTS + 1):
+            resolved, people = resolve_booking_people(request)
+            result = await execution_layer.run(estimate_appointment_cost(resolved), process_appointment, resolved)
+            if not result.is_schedulable:
+                return BookingResponse(**result.model_dump(), attempts=attempt)
+
+            try:
+                end_time = reserve_appointment(result, people)
+            except BookingConflict as conflict:
+                logger.info("Booking attempt %d conflicted: %s", attempt, conflict)
+                continue
+            return BookingResponse(**result.model_dump(), booked=True, appointment_end_time=end_time,
+                                   attempts=attempt)
+
+    except ValueError as ve:
+        logger.error("Validation error: %s", ve)
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    logger.warning("Booking gave up after %d conflicting attempts", BOOKING_MAX_ATTEMPTS)
+    raise HTTPException(status_code=409,
+                        detail=f"Schedules kept changing; no window reserved after {BOOKING_MAX_ATTEMPTS} attempts")
+
+
+@app.post("/match-appointments", response_model=MatchResponse)
+async def match_appointments(request: MatchRequest):
+    """
+    Finds, for each employee, the lawyer who can see them soonest.
+
+    Availability of every person is built as a (days x 15-minute slots) matrix
+    and all employee/lawyer pairs are evaluated with vectorized operations.
+    """
+    try:
+        logger.info("Matching %d employees with %d lawyers", len(request.employees), len(request.lawyers))
+        return await execution_layer.run(estimate_match_cost(request), process_match_request, request)
+
+    except ValueError as ve:
+        logger.error("Validation error: %s", ve)
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/appointment-date-table", response_model=DateTableResponse)
+async def appointment_date_table(request: DateTableRequest):
+    """
+    Returns notification, counting start and appointment dates for every current
+    date of a range (one row per date and time variant).
+
+    The table is returned as JSON, CSV or Parquet according to `format`.
+    """
+    try:
+        logger.info("Building appointment date table from %s to %s", request.start_date, request.end_date)
+        rows = process_date_table_request(request)
+
+        if request.format == "csv":
+            return StreamingResponse(iter_csv_lines(rows), media_type="text/csv")
+        if request.format == "parquet":
+            return Response(content=date_table_to_parquet(rows), media_type="application/vnd.apache.parquet")
+        return DateTableResponse(rows=[row._asdict() for row in rows])
+
+    except ValueError as ve:
+        logger.error("Validation error: %s", ve)
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def registered_person_response(person) -> RegisteredPersonResponse:
+    return RegisteredPersonResponse(
+        role=person.role,
+        person_id=person.person_id,
+        meeting_count=person.schedule.meeting_count,
+        schedule_version=person.schedule.version
+    )
+
+
+def handle_registry_call(function, *args) -> RegisteredPersonResponse:
+    try:
+        return registered_person_response(function(*args))
+
+    except PersonNotFound as not_found:
+        logger.error("Not found: %s", not_found)
+        raise HTTPException(status_code=404, detail=str(not_found))
 
     except ValueError as ve:
-        logger.error(f"Validation error: {str(ve)}")
+        logger.error("Validation error: %s", ve)
         raise HTTPException(status_code=400, detail=str(ve))
 
     except Exception as e:
-        logger.error(f"Internal server error: {str(e)}")
+        logger.error("Internal server error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.put("/registry/employees/{person_id}", response_model=RegisteredPersonResponse)
+async def register_employee(person_id: str, request: RegisteredEmployee):
+    """
+    Registers or updates an employee. A given schedule replaces the stored one.
+    """
+    meetings = request.schedule.meetings if request.schedule is not None else None
+    return handle_registry_call(get_person_registry().put, "employee", person_id, request.config, meetings)
+
+
+@app.put("/registry/lawyers/{person_id}", response_model=RegisteredPersonResponse)
+async def register_lawyer(person_id: str, request: RegisteredLawyer):
+    """
+    Registers or updates a lawyer. A given schedule replaces the stored one.
+    """
+    meetings = request.schedule.meetings if request.schedule is not None else None
+    return handle_registry_call(get_person_registry().put, "lawyer", person_id, request.config, meetings)
+
+
+# Path segment of each registry role
+RegistryRole = Literal["employees", "lawyers"]
+
+
+@app.get("/registry/{role}/{person_id}", response_model=RegisteredPersonResponse)
+async def get_registered_person(role: RegistryRole, person_id: str):
+    """
+    Returns the meeting count and schedule version of a registered person.
+    """
+    return handle_registry_call(get_person_registry().get, role[:-1], person_id)
+
+
+@app.post("/registry/{role}/{person_id}/meetings", response_model=RegisteredPersonResponse)
+async def update_registered_meetings(role: RegistryRole, person_id: str, changes: MeetingChanges):
+    """
+    Removes and adds meetings of a registered person's schedule (all or nothing).
+    Only the days touched are re-indexed.
+    """
+    return handle_registry_call(get_person_registry().update_meetings, role[:-1], person_id,
+                                changes.add, changes.remove)
+
+
+@app.delete("/registry/{role}/{person_id}", status_code=204)
+async def delete_registered_person(role: RegistryRole, person_id: str):
+    """
+    Removes a registered person and their schedule.
+    """
+    try:
+        get_person_registry().delete(role[:-1], person_id)
+        return Response(status_code=204)
+
+    except PersonNotFound as not_found:
+        logger.error("Not found: %s", not_found)
+        raise HTTPException(status_code=404, detail=str(not_found))
+
+    except ValueError as ve:
+        logger.error("Validation error: %s", ve)
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except Exception as e:
+        logger.error("Internal server error: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Returns entry count, size in bytes and hit/miss/eviction counters of the response cache.
+    """
+    return response_cache.stats()
+
+
+@app.get("/execution/stats")
+async def execution_stats():
+    """
+    Returns the worker pool configuration and its inline/pending/queued/completed request counts.
+    """
+    return execution_layer.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Returns step durations, outcomes by reason and component state in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once warmup is done, 503 before. Both report the startup
+    profile (seconds per phase and until ready).
+    """
+    return JSONResponse(status_code=200 if startup_profile.is_ready() else 503, content=startup_profile.report())
+
+
+@app.on_event("startup")
+async def start_warming_up():
+    # The server accepts requests meanwhile; /ready tells when it's warm
+    start_warmup([
+        ("registry", get_person_registry),
+        ("shared_calendar", current_shared_snapshot),
+        ("warmup_snapshot", replay_warmup_snapshot),
+    ])
+
+
+@app.on_event("shutdown")
+async def shutdown_execution_layer():
+    execution_layer.shutdown()
+
+
+@app.on_event("shutdown")
+async def save_warmup_snapshot():
+    if warmup_snapshot is not None:
+        try:
+            logger.info("Saved %d requests to the warmup snapshot", warmup_snapshot.save())
+        except OSError as e:
+            logger.error("Couldn't save the warmup snapshot: %s", e)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
     return JSONResponse(
@@ -175,6 +406,27 @@ async def http_exception_handler(request, exc: HTTPException):
     )
 
 
+def run_shard(socket_path: str):
+    """
+    Entry point of a shard process: serves this app to the router (see utils/sharding.py).
+    """
+    asyncio.run(serve_shard(app, socket_path))
+
+
+startup_profile.mark("app")
+
+
 if __name__ == "__main__":
+    # Only the server entry point needs uvicorn (not shard or worker processes importing this module)
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    shard_count = int(os.environ.get("SHARD_COUNT", 1))
+    # Without its own log config uvicorn's loggers propagate to the queue pipeline
+    if shard_count > 1:
+        router, shard_processes = start_shard_processes(shard_count, run_shard)
+        try:
+            uvicorn.run(router, host="0.0.0.0", port=8000, log_config=None)
+        finally:
+            for process in shard_processes:
+                process.terminate()
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
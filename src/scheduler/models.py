@@ -1,7 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, PlainSerializer, PlainValidator, PrivateAttr, WithJsonSchema, model_validator
+from typing import Annotated, Any, Dict, List, Literal, Optional, Tuple, Union
 from datetime import date, time
 
+from utils.compact_schedule import Meeting, MeetingIndex, columns_to_meetings, parse_meetings, serialize_meetings
+from utils.slot_bitmap import DEFAULT_SLOT_MINUTES, decode_mask, mask_to_intervals
+
 
 class BusyMeeting(BaseModel):
     date: date
@@ -9,8 +12,117 @@ class BusyMeeting(BaseModel):
     end_time: time
 
 
+# JSON schema of the accepted meeting shapes: an object or a [date, start_time, end_time] array
+_MEETING_JSON_SCHEMA = {
+    "type": "array",
+    "items": {
+        "anyOf": [
+            {
+                "type": "object",
+                "properties": {
+                    "date": {"type": "string", "format": "date"},
+                    "start_time": {"type": "string", "format": "time"},
+                    "end_time": {"type": "string", "format": "time"}
+                },
+                "required": ["date", "start_time", "end_time"]
+            },
+            {
+                "type": "array",
+                "prefixItems": [
+                    {"type": "string", "format": "date"},
+                    {"type": "string", "format": "time"},
+                    {"type": "string", "format": "time"}
+                ],
+                "minItems": 3,
+                "maxItems": 3
+            }
+        ]
+    }
+}
+
+# Meetings are validated in bulk straight into compact Meeting tuples
+MeetingList = Annotated[
+    List[Meeting],
+    PlainValidator(parse_meetings),
+    PlainSerializer(serialize_meetings),
+    WithJsonSchema(_MEETING_JSON_SCHEMA)
+]
+
+
+class ScheduleColumns(BaseModel):
+    """
+    Columnar encoding of meetings: entry i of each list describes meeting i.
+    """
+    start_date: date
+    day_offsets: List[int]  # days after start_date
+    start_minutes: List[int]
+    end_minutes: List[int]
+
+
+class ScheduleBitmaps(BaseModel):
+    """
+    Busy slots of each day as base64 of a little-endian bitmap (bit i is the slot
+    starting at minute i * slot_minutes), like the rows of the CSV grids.
+    """
+    slot_minutes: int = Field(default=DEFAULT_SLOT_MINUTES, ge=1)
+    days: Dict[date, str]
+
+
 class BusySchedule(BaseModel):
-    meetings: List[BusyMeeting]
+    meetings: MeetingList = []
+    # Compact alternatives to meetings, decoded into them during validation
+    columns: Optional[ScheduleColumns] = Field(default=None, exclude=True)
+    day_bitmaps: Optional[ScheduleBitmaps] = Field(default=None, exclude=True)
+
+    # Lazily built day ordinal -> sorted (start_minute, end_minute) intervals
+    _meeting_index: Optional[MeetingIndex] = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def _decode_compact_encodings(self) -> "BusySchedule":
+        if not self.model_fields_set & {"meetings", "columns", "day_bitmaps"}:
+            raise ValueError("A busy schedule needs meetings, columns or day_bitmaps")
+
+        decoded: List[Meeting] = []
+        if self.columns is not None:
+            columns = self.columns
+            decoded.extend(columns_to_meetings(
+                columns.start_date, columns.day_offsets, columns.start_minutes, columns.end_minutes
+            ))
+            self.columns = None
+        if self.day_bitmaps is not None:
+            slot_minutes = self.day_bitmaps.slot_minutes
+            for day, encoded in sorted(self.day_bitmaps.days.items()):
+                ordinal = day.toordinal()
+                decoded.extend(Meeting(ordinal, start, end)
+                               for start, end in mask_to_intervals(decode_mask(encoded, slot_minutes), slot_minutes))
+            self.day_bitmaps = None
+        if decoded:
+            self.meetings = self.meetings + decoded
+        return self
+
+    def busy_intervals(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the meetings of a day as (start_minute, end_minute) pairs sorted by start.
+        Partial minutes are rounded outwards. The index is built on first use.
+        """
+        return self._get_index().busy_intervals(day)
+
+    def busy_days(self) -> List[date]:
+        """
+        Days with at least one meeting, in order.
+        """
+        return self._get_index().days()
+
+    def digest(self) -> str:
+        """
+        Content hash of the busy intervals, independent of meeting order.
+        """
+        return self._get_index().digest()
+
+    def _get_index(self) -> MeetingIndex:
+        if self._meeting_index is None:
+            self._meeting_index = MeetingIndex(self.meetings)
+        return self._meeting_index
 
 
 class EmployeeConfig(BaseModel):
@@ -30,11 +142,31 @@ class LawyerConfig(BaseModel):
 class AppointmentRequest(BaseModel):
     current_date: date
     current_time: time
-    employee: EmployeeConfig
-    lawyer: LawyerConfig
+    # Either the config or the id of a registered person (see /registry endpoints)
+    employee: Optional[EmployeeConfig] = None
+    lawyer: Optional[LawyerConfig] = None
+    employee_id: Optional[str] = None
+    lawyer_id: Optional[str] = None
     holiday_dates: List[date]
     employee_schedule: Optional[BusySchedule] = None
     lawyer_schedule: Optional[BusySchedule] = None
+    # Person ids of schedules in the schedule store, alternative to inline schedules
+    employee_schedule_ref: Optional[str] = None
+    lawyer_schedule_ref: Optional[str] = None
+    # Search forward across dates for the first free slot instead of validating a single date
+    search_free_slot: bool = False
+    search_horizon_days: int = Field(default=30, ge=1, le=366)
+    # Work days between the counting start date and the appointment date
+    lead_time_days: int = Field(default=5, ge=1, le=1000)
+
+    @model_validator(mode="after")
+    def _check_people(self) -> "AppointmentRequest":
+        for role in ("employee", "lawyer"):
+            given_config = getattr(self, role) is not None
+            given_id = getattr(self, f"{role}_id") is not None
+            if given_config == given_id:
+                raise ValueError(f"Provide either {role} or {role}_id")
+        return self
 
 
 class AppointmentResponse(BaseModel):
@@ -44,4 +176,107 @@ class AppointmentResponse(BaseModel):
     appointment_date: date
     appointment_time: time
     is_schedulable: bool
-    reason: Optional[str] = None
\ No newline at end of file
+    reason: Optional[str] = None
+
+
+class BookingResponse(AppointmentResponse):
+    booked: bool = False
+    appointment_end_time: Optional[time] = None
+    attempts: int = 1
+
+
+class BatchAppointmentRequest(BaseModel):
+    # AppointmentRequest objects, validated one by one so an invalid item only fails its own slot
+    requests: List[Dict[str, Any]]
+
+
+class BatchItemError(BaseModel):
+    index: int
+    error: str
+
+
+class BatchAppointmentResponse(BaseModel):
+    # Each item's response, or its error if it couldn't be scheduled
+    responses: List[Union[AppointmentResponse, BatchItemError]]
+
+
+class MatchEmployee(BaseModel):
+    id: str
+    config: EmployeeConfig
+    schedule: Optional[BusySchedule] = None
+
+
+class MatchLawyer(BaseModel):
+    id: str
+    config: LawyerConfig
+    schedule: Optional[BusySchedule] = None
+
+
+class MatchRequest(BaseModel):
+    current_date: date
+    current_time: time
+    employees: List[MatchEmployee]
+    lawyers: List[MatchLawyer]
+    holiday_dates: List[date]
+    search_horizon_days: int = Field(default=30, ge=1, le=366)
+    lead_time_days: int = Field(default=5, ge=1, le=1000)
+
+
+class EmployeeMatch(BaseModel):
+    employee_id: str
+    lawyer_id: Optional[str] = None
+    appointment_date: Optional[date] = None
+    appointment_time: Optional[time] = None
+    is_schedulable: bool
+    reason: Optional[str] = None
+
+
+class MatchResponse(BaseModel):
+    matches: List[EmployeeMatch]
+
+
+class DateTableRequest(BaseModel):
+    start_date: date
+    end_date: date
+    employee: EmployeeConfig
+    holiday_dates: List[date] = []
+    lead_time_days: int = Field(default=5, ge=1, le=1000)
+    time_variants: List[Literal["before_hours", "within_hours", "after_hours"]] = [
+        "before_hours", "within_hours", "after_hours"
+    ]
+    format: Literal["json", "csv", "parquet"] = "json"
+
+
+class DateTableEntry(BaseModel):
+    current_date: date
+    time_variant: str
+    notification_date: date
+    counting_start_date: date
+    appointment_date: date
+
+
+class DateTableResponse(BaseModel):
+    rows: List[DateTableEntry]
+
+
+class RegisteredEmployee(BaseModel):
+    config: EmployeeConfig
+    # Replaces the stored schedule when given
+    schedule: Optional[BusySchedule] = None
+
+
+class RegisteredLawyer(BaseModel):
+    config: LawyerConfig
+    schedule: Optional[BusySchedule] = None
+
+
+class MeetingChanges(BaseModel):
+    add: MeetingList = []
+    remove: MeetingList = []
+
+
+class RegisteredPersonResponse(BaseModel):
+    role: str
+    person_id: str
+    meeting_count: int
+    schedule_version: int
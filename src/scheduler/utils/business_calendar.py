@@ -0,0 +1,322 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+from threading import Lock
+from typing import FrozenSet, Iterable, List, Optional
+import os
+
+from utils.holiday_handler import EMPTY_HOLIDAYS, HolidaySet
+
+
+# Days indexed ahead of a query every time the calendar needs to grow
+DEFAULT_HORIZON_DAYS = 730
+
+# "weekly" (closed-form, WeeklyCalendar), "index" (BusinessCalendar) or
+# "shared" (SharedCalendar, counts published in shared memory)
+CALENDAR_ENGINE = os.environ.get("CALENDAR_ENGINE", "weekly")
+
+
+class BusinessCalendar:
+    """
+    Work-day index for one (work weekdays, holidays, works_holidays) combination.
+
+    Keeps the sorted ordinals of every work day in the indexed range, so the
+    position of a date in that list is the number of work days before it.
+    "Next work day" and "Nth work day after" are then answered with bisect.
+    The indexed range grows by `horizon_days` whenever a query falls outside it.
+    """
+
+    def __init__(self, work_weekdays: Iterable[int], holiday_dates: Iterable[date],
+                 works_holidays: bool, horizon_days: int = DEFAULT_HORIZON_DAYS):
+        if horizon_days <= 0:
+            raise ValueError("Calendar horizon must be a positive number of days")
+
+        self.work_weekdays: FrozenSet[int] = frozenset(work_weekdays)
+        self.works_holidays = works_holidays
+        # Holidays only remove work days for employees who don't work them
+        self.holiday_ordinals: FrozenSet[int] = (
+            frozenset() if works_holidays else frozenset(d.toordinal() for d in holiday_dates)
+        )
+        self.horizon_days = horizon_days
+
+        self._start: Optional[int] = None  # First indexed ordinal
+        self._end: Optional[int] = None  # Ordinal after the last indexed one
+        self._ordinals: List[int] = []
+        self._lock = Lock()
+
+    def is_work_day(self, date_to_check: date) -> bool:
+        """
+        Determines if a date is a work day in this calendar.
+        """
+        return (date_to_check.weekday() in self.work_weekdays and
+                date_to_check.toordinal() not in self.holiday_ordinals)
+
+    def next_work_day(self, from_date: date) -> date:
+        """
+        Returns the first work day on or after from_date.
+        """
+        self._check_has_work_days()
+        from_ordinal = from_date.toordinal()
+        self._ensure_range(from_ordinal, from_ordinal + self.horizon_days)
+
+        while True:
+            ordinals = self._ordinals
+            index = bisect_left(ordinals, from_ordinal)
+            if index < len(ordinals):
+                return date.fromordinal(ordinals[index])
+            self._extend()
+
+    def nth_work_day_after(self, from_date: date, work_days: int) -> date:
+        """
+        Returns the Nth work day strictly after from_date.
+        """
+        if work_days < 1:
+            raise ValueError("Number of work days must be at least 1")
+        self._check_has_work_days()
+        from_ordinal = from_date.toordinal()
+        self._ensure_range(from_ordinal, from_ordinal + self.horizon_days)
+
+        while True:
+            ordinals = self._ordinals
+            index = bisect_right(ordinals, from_ordinal) + work_days - 1
+            if index < len(ordinals):
+                return date.fromordinal(ordinals[index])
+            self._extend()
+
+    def count_work_days(self, start_date: date, end_date: date) -> int:
+        """
+        Counts the work days between two dates (both inclusive).
+        """
+        if end_date < start_date:
+            return 0
+        start_ordinal = start_date.toordinal()
+        end_ordinal = end_date.toordinal()
+        self._ensure_range(start_ordinal, end_ordinal + 1)
+
+        ordinals = self._ordinals
+        return bisect_right(ordinals, end_ordinal) - bisect_left(ordinals, start_ordinal)
+
+    def _check_has_work_days(self):
+        if not self.work_weekdays:
+            raise ValueError("Could not find a work day: employee has no work days")
+
+    def _build(self, start_ordinal: int, end_ordinal: int) -> List[int]:
+        first_weekday = date.fromordinal(start_ordinal).weekday()
+        return [
+            ordinal for offset, ordinal in enumerate(range(start_ordinal, end_ordinal))
+            if (first_weekday + offset) % 7 in self.work_weekdays and ordinal not in self.holiday_ordinals
+        ]
+
+    def _ensure_range(self, start_ordinal: int, end_ordinal: int):
+        """
+        Makes sure [start_ordinal, end_ordinal) is indexed, growing by whole horizons.
+        """
+        if self._start is not None and self._start <= start_ordinal and end_ordinal <= self._end:
+            return
+
+        with self._lock:
+            if self._start is None:
+                self._ordinals = self._build(start_ordinal, end_ordinal)
+                self._start, self._end = start_ordinal, end_ordinal
+                return
+
+            if start_ordinal < self._start:
+                new_start = min(start_ordinal, self._start - self.horizon_days)
+                self._ordinals = self._build(new_start, self._start) + self._ordinals
+                self._start = new_start
+
+            if end_ordinal > self._end:
+                new_end = max(end_ordinal, self._end + self.horizon_days)
+                self._ordinals = self._ordinals + self._build(self._end, new_end)
+                self._end = new_end
+
+    def _extend(self):
+        """
+        Indexes one more horizon after the current range.
+        """
+        end = self._end
+        self._ensure_range(end, end + self.horizon_days)
+
+
+class WeeklyCalendar(BusinessCalendar):
+    """
+    Same queries as BusinessCalendar, answered in closed form without an index.
+
+    Work weekdays repeat every week, so the number of work days before a date is
+    full weeks x work days per week plus the work weekdays of the partial week,
+    minus the holidays (on work weekdays) before it. "Nth work day" inverts that
+    count, which costs the same for a lead time of 5 or 500 work days.
+    Ordinals are shifted by one so that 0 is a Monday.
+    """
+
+    def __init__(self, work_weekdays: Iterable[int], holiday_dates: Iterable[date],
+                 works_holidays: bool, horizon_days: int = DEFAULT_HORIZON_DAYS):
+        super().__init__(work_weekdays, holiday_dates, works_holidays, horizon_days)
+        self._week_days = sorted(self.work_weekdays)
+        # Work weekdays before each weekday of a week
+        self._weekday_prefix = [sum(1 for weekday in self._week_days if weekday < position) for position in range(8)]
+        # Only holidays on work weekdays remove work days
+        self._holidays = sorted(ordinal - 1 for ordinal in self.holiday_ordinals
+                                if (ordinal - 1) % 7 in self.work_weekdays)
+
+    def next_work_day(self, from_date: date) -> date:
+        """
+        Returns the first work day on or after from_date.
+        """
+        self._check_has_work_days()
+        return self._work_day_at(self._work_days_before(from_date.toordinal() - 1))
+
+    def nth_work_day_after(self, from_date: date, work_days: int) -> date:
+        """
+        Returns the Nth work day strictly after from_date.
+        """
+        if work_days < 1:
+            raise ValueError("Number of work days must be at least 1")
+        self._check_has_work_days()
+        return self._work_day_at(self._work_days_before(from_date.toordinal()) + work_days - 1)
+
+    def count_work_days(self, start_date: date, end_date: date) -> int:
+        """
+        Counts the work days between two dates (both inclusive).
+        """
+        if end_date < start_date:
+            return 0
+        return self._work_days_before(end_date.toordinal()) - self._work_days_before(start_date.toordinal() - 1)
+
+    def _weekdays_before(self, day: int) -> int:
+        """
+        Work weekdays in shifted days [0, day), ignoring holidays.
+        """
+        weeks, weekday = divmod(day, 7)
+        return weeks * len(self._week_days) + self._weekday_prefix[weekday]
+
+    def _work_days_before(self, day: int) -> int:
+        """
+        Work days in shifted days [0, day).
+        """
+        return self._weekdays_before(day) - bisect_left(self._holidays, day)
+
+    def _work_day_at(self, index: int) -> date:
+        """
+        Returns the work day with the given 0-based position, counting from shifted day 0.
+        """
+        holidays_skipped = 0
+        while True:
+            weeks, position = divmod(index + holidays_skipped, len(self._week_days))
+            day = weeks * 7 + self._week_days[position]
+            # Each holiday up to the candidate pushes the answer one work weekday later
+            holidays_up_to = bisect_right(self._holidays, day)
+            if holidays_up_to == holidays_skipped:
+                return date.fromordinal(day + 1)
+            holidays_skipped = holidays_up_to
+
+
+class SharedCalendar(WeeklyCalendar):
+    """
+    Same queries answered from the work-day counts published in shared memory
+    (see utils/shared_calendar.py), so worker processes don't each build an index.
+    Dates outside the published range, other holiday sets or an unpublished
+    segment fall back to the closed form of WeeklyCalendar.
+    """
+
+    def __init__(self, work_weekdays: Iterable[int], holiday_dates: HolidaySet,
+                 works_holidays: bool, horizon_days: int = DEFAULT_HORIZON_DAYS):
+        # Imported here: only CALENDAR_ENGINE=shared needs the shared memory reader
+        from utils.shared_calendar import current_shared_snapshot, weekday_pattern
+
+        super().__init__(work_weekdays, holiday_dates, works_holidays, horizon_days)
+        self._current_snapshot = current_shared_snapshot
+        self._pattern = weekday_pattern(self.work_weekdays)
+        self._holiday_digest = holiday_dates.digest
+        # (snapshot, first ordinal, counts row) of the last snapshot seen
+        self._shared = (None, 0, None)
+
+    def _counts(self):
+        """
+        Returns (first ordinal, work days before each published day) or None if
+        the published snapshot doesn't apply to this calendar.
+        """
+        snapshot = self._current_snapshot()
+        if snapshot is None:
+            return None
+        cached_snapshot, first_ordinal, counts = self._shared
+        if snapshot is not cached_snapshot:
+            first_ordinal = snapshot.first_ordinal
+            if self.works_holidays:
+                counts = snapshot.work_day_counts[1, self._pattern]
+            elif snapshot.holiday_digest == self._holiday_digest:
+                counts = snapshot.work_day_counts[0, self._pattern]
+            else:
+                counts = None
+            # Indexing a memoryview is much cheaper than a NumPy scalar lookup
+            counts = memoryview(counts) if counts is not None else None
+            self._shared = (snapshot, first_ordinal, counts)
+        if counts is None:
+            return None
+        return first_ordinal, counts
+
+    def next_work_day(self, from_date: date) -> date:
+        """
+        Returns the first work day on or after from_date.
+        """
+        shared = self._counts()
+        if shared is not None:
+            first_ordinal, counts = shared
+            day = from_date.toordinal() - first_ordinal
+            if 0 <= day < len(counts) - 1:
+                # Day j is the answer when counts[j + 1] first exceeds the work days before from_date
+                found = bisect_left(counts, counts[day] + 1) - 1
+                if found < len(counts) - 1:
+                    return date.fromordinal(first_ordinal + found)
+        return super().next_work_day(from_date)
+
+    def nth_work_day_after(self, from_date: date, work_days: int) -> date:
+        """
+        Returns the Nth work day strictly after from_date.
+        """
+        shared = self._counts()
+        if shared is not None and work_days >= 1:
+            first_ordinal, counts = shared
+            day = from_date.toordinal() - first_ordinal
+            if 0 <= day < len(counts) - 1:
+                found = bisect_left(counts, counts[day + 1] + work_days) - 1
+                if found < len(counts) - 1:
+                    return date.fromordinal(first_ordinal + found)
+        return super().nth_work_day_after(from_date, work_days)
+
+    def count_work_days(self, start_date: date, end_date: date) -> int:
+        """
+        Counts the work days between two dates (both inclusive).
+        """
+        shared = self._counts()
+        if shared is not None and start_date <= end_date:
+            first_ordinal, counts = shared
+            start = start_date.toordinal() - first_ordinal
+            end = end_date.toordinal() - first_ordinal
+            if 0 <= start and end < len(counts) - 1:
+                return counts[end + 1] - counts[start]
+        return super().count_work_days(start_date, end_date)
+
+
+def get_business_calendar(work_weekdays: FrozenSet[int], holiday_dates: HolidaySet,
+                          works_holidays: bool,
+                          horizon_days: int = DEFAULT_HORIZON_DAYS) -> BusinessCalendar:
+    """
+    Returns the shared calendar for a (work weekdays, holidays, works_holidays) key,
+    using the engine selected by CALENDAR_ENGINE.
+    """
+    if works_holidays:
+        holiday_dates = EMPTY_HOLIDAYS
+    return _get_calendar(work_weekdays, holiday_dates, works_holidays, horizon_days, CALENDAR_ENGINE)
+
+
+@lru_cache(maxsize=256)
+def _get_calendar(work_weekdays: FrozenSet[int], holiday_dates: HolidaySet,
+                  works_holidays: bool, horizon_days: int, engine: str) -> BusinessCalendar:
+    if engine == "index":
+        return BusinessCalendar(work_weekdays, holiday_dates, works_holidays, horizon_days)
+    if engine == "weekly":
+        return WeeklyCalendar(work_weekdays, holiday_dates, works_holidays, horizon_days)
+    if engine == "shared":
+        return SharedCalendar(work_weekdays, holiday_dates, works_holidays, horizon_days)
+    raise ValueError(f"Unknown calendar engine '{engine}'")
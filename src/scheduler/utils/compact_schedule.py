@@ -0,0 +1,196 @@
+"""
+Compact internal schedule types: busy meetings as (day ordinal, start minute,
+end minute) tuples, indexed by day.
+
+API input is converted in bulk without building a pydantic model per meeting;
+date and time strings repeat a lot within a schedule, so each distinct value is
+validated once and its converted value reused.
+"""
+import hashlib
+from datetime import date, time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class Meeting(NamedTuple):
+    day: int    # date.toordinal()
+    start: int  # minutes since midnight
+    end: int    # minutes since midnight, partial minutes rounded up (up to 1440)
+
+
+def start_minute(value: time) -> int:
+    """
+    Minutes since midnight of a start time (seconds are dropped).
+    """
+    return value.hour * 60 + value.minute
+
+
+def end_minute(value: time) -> int:
+    """
+    Minutes since midnight of an end time, rounding partial minutes up.
+    """
+    minute = value.hour * 60 + value.minute
+    return minute + 1 if value.second or value.microsecond else minute
+
+
+def end_minute_to_time(minute: int) -> time:
+    """
+    Inverse of end_minute(); the end of the day is represented as 23:59:59.
+    """
+    if minute >= MINUTES_PER_DAY:
+        return time(23, 59, 59)
+    return time(minute // 60, minute % 60)
+
+
+_DATE_ADAPTER = TypeAdapter(date)
+_TIME_ADAPTER = TypeAdapter(time)
+_new_meeting = tuple.__new__
+
+
+def _fields(index: int, row: Any) -> Tuple[Any, Any, Any]:
+    if isinstance(row, dict):
+        if "date" not in row or "start_time" not in row or "end_time" not in row:
+            raise ValueError(f"meeting {index} must have date, start_time and end_time")
+        return row["date"], row["start_time"], row["end_time"]
+    if isinstance(row, (list, tuple)):
+        if len(row) != 3:
+            raise ValueError(f"meeting {index} must have 3 values (date, start_time, end_time)")
+        return row[0], row[1], row[2]
+    if all(hasattr(row, name) for name in ("date", "start_time", "end_time")):
+        return row.date, row.start_time, row.end_time
+    raise ValueError(f"meeting {index} must be an object or a [date, start_time, end_time] array")
+
+
+def _parse(adapter: TypeAdapter, convert: Callable[[Any], int], index: int, value: Any) -> int:
+    try:
+        return convert(adapter.validate_python(value))
+    except ValidationError as error:
+        raise ValueError(f"meeting {index}: {error.errors()[0]['msg']}")
+
+
+def parse_meetings(rows: Any) -> List[Meeting]:
+    """
+    Converts API meetings to Meeting tuples. Each row is a {"date", "start_time",
+    "end_time"} object, a [date, start_time, end_time] array, an object with
+    those attributes or already a Meeting.
+
+    Raises:
+        ValueError: If rows isn't a list or a meeting is incomplete or invalid
+    """
+    if not isinstance(rows, (list, tuple)):
+        raise ValueError("meetings must be a list")
+
+    # Converted value of each distinct (hashable) date/time seen in this list
+    days: Dict[Any, int] = {}
+    starts: Dict[Any, int] = {}
+    ends: Dict[Any, int] = {}
+    meetings = []
+    append = meetings.append
+    for index, row in enumerate(rows):
+        if row.__class__ is Meeting:
+            append(row)
+            continue
+        if row.__class__ is dict and len(row) == 3 and "date" in row and "start_time" in row and "end_time" in row:
+            day, start, end = row["date"], row["start_time"], row["end_time"]
+        elif row.__class__ is list and len(row) == 3:
+            day, start, end = row
+        else:
+            day, start, end = _fields(index, row)
+
+        try:
+            day_value = days.get(day)
+            start_value = starts.get(start)
+            end_value = ends.get(end)
+        except TypeError:
+            # Unhashable values can't be valid dates or times: validation below rejects them
+            day_value = start_value = end_value = None
+        if day_value is None:
+            day_value = _parse(_DATE_ADAPTER, date.toordinal, index, day)
+            days[day] = day_value
+        if start_value is None:
+            start_value = _parse(_TIME_ADAPTER, start_minute, index, start)
+            starts[start] = start_value
+        if end_value is None:
+            end_value = _parse(_TIME_ADAPTER, end_minute, index, end)
+            ends[end] = end_value
+        append(_new_meeting(Meeting, (day_value, start_value, end_value)))
+    return meetings
+
+
+def columns_to_meetings(start_date: date, day_offsets: List[int], start_minutes: List[int],
+                        end_minutes: List[int]) -> List[Meeting]:
+    """
+    Converts the columnar encoding (one entry per meeting in each list, days as
+    offsets from start_date) to Meeting tuples.
+
+    Raises:
+        ValueError: If the columns differ in length or hold out-of-range values
+    """
+    if not len(day_offsets) == len(start_minutes) == len(end_minutes):
+        raise ValueError("day_offsets, start_minutes and end_minutes must have the same length")
+    if not day_offsets:
+        return []
+    first_day = start_date.toordinal()
+    if min(day_offsets) < 0 or first_day + max(day_offsets) > date.max.toordinal():
+        raise ValueError("day_offsets must be non-negative and within the calendar")
+    if min(start_minutes) < 0 or min(end_minutes) < 0 or max(start_minutes) >= MINUTES_PER_DAY \
+            or max(end_minutes) > MINUTES_PER_DAY:
+        raise ValueError(f"Minutes must be between 0 and {MINUTES_PER_DAY}")
+
+    return [_new_meeting(Meeting, (first_day + offset, start, end))
+            for offset, start, end in zip(day_offsets, start_minutes, end_minutes)]
+
+
+def serialize_meetings(meetings: List[Meeting]) -> List[Dict[str, Any]]:
+    """
+    Converts Meeting tuples back to API meeting objects.
+    """
+    return [
+        {
+            "date": date.fromordinal(meeting.day),
+            "start_time": time(meeting.start // 60, meeting.start % 60),
+            "end_time": end_minute_to_time(meeting.end)
+        }
+        for meeting in meetings
+    ]
+
+
+class MeetingIndex:
+    """
+    Busy (start_minute, end_minute) intervals of each day, sorted by start.
+    """
+
+    __slots__ = ("_intervals", "_digest")
+
+    def __init__(self, meetings: Iterable[Meeting]):
+        intervals_by_day: Dict[int, List[Tuple[int, int]]] = {}
+        for day, start, end in meetings:
+            intervals = intervals_by_day.get(day)
+            if intervals is None:
+                intervals_by_day[day] = [(start, end)]
+            else:
+                intervals.append((start, end))
+        self._intervals = {day: tuple(sorted(intervals)) for day, intervals in intervals_by_day.items()}
+        self._digest = None
+
+    def busy_intervals(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        return self._intervals.get(day.toordinal(), ())
+
+    def days(self) -> List[date]:
+        """
+        Days with at least one meeting, in order.
+        """
+        return [date.fromordinal(ordinal) for ordinal in sorted(self._intervals)]
+
+    def digest(self) -> str:
+        """
+        Content hash of the busy intervals, independent of meeting order.
+        """
+        if self._digest is None:
+            content = ";".join(f"{date.fromordinal(day).isoformat()}={intervals}"
+                               for day, intervals in sorted(self._intervals.items()))
+            self._digest = hashlib.sha1(content.encode()).hexdigest()
+        return self._digest
@@ -0,0 +1,135 @@
+from datetime import date, time
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Tuple, TYPE_CHECKING
+
+from utils.date_calculator import WEEK_DAYS
+from utils.schedule_validator import (
+    calculate_schedule_overlap,
+    exclude_lunch_hours,
+    find_valid_appointment_time,
+    busy_minute_masks,
+    segments_minute_mask
+)
+from utils.slot_bitmap import MINUTE_SLOTS, first_free_window, minutes_to_time
+
+if TYPE_CHECKING:
+    from models import BusySchedule
+
+CompatibilityResult = Tuple[bool, Optional[str], Optional[Tuple[time, time]]]
+
+
+class CompatibilityProfile:
+    """
+    Everything about an employee/lawyer pair that doesn't depend on the date,
+    precomputed for the 7 weekdays: common days, schedule overlap, segments
+    outside lunch hours and the first valid appointment window.
+
+    full_compatibility() returns the same results as validate_full_compatibility
+    and compatibility_with_schedules() the same as validate_compatibility_with_schedules.
+    """
+
+    __slots__ = ("has_common_days", "overlap", "segments", "segments_minutes", "segments_mask",
+                 "first_valid_segment", "employee_weekdays", "lawyer_weekdays",
+                 "_day_failures", "_full_results")
+
+    def __init__(self, employee_work_days: FrozenSet[str], employee_start_time: time, employee_end_time: time,
+                 lawyer_work_days: FrozenSet[str], lawyer_start_time: time, lawyer_end_time: time):
+        self.has_common_days = bool(employee_work_days & lawyer_work_days)
+        self.employee_weekdays = frozenset(i for i, day_name in enumerate(WEEK_DAYS) if day_name in employee_work_days)
+        self.lawyer_weekdays = frozenset(i for i, day_name in enumerate(WEEK_DAYS) if day_name in lawyer_work_days)
+
+        self.overlap = calculate_schedule_overlap(employee_start_time, employee_end_time,
+                                                  lawyer_start_time, lawyer_end_time)
+        self.segments: List[Tuple[time, time]] = exclude_lunch_hours(self.overlap) if self.overlap else []
+        self.segments_minutes = [(start.hour * 60 + start.minute, end.hour * 60 + end.minute)
+                                 for start, end in self.segments]
+        self.segments_mask = segments_minute_mask(self.segments_minutes)
+
+        valid_appointment_time = find_valid_appointment_time(self.segments)
+        self.first_valid_segment = next((seg for seg in self.segments if seg[0] == valid_appointment_time), None) \
+            if valid_appointment_time is not None else None
+
+        # Reason why a weekday can't be scheduled before looking at busy schedules (None if it can)
+        self._day_failures = tuple(self._day_failure(weekday) for weekday in range(7))
+        self._full_results = tuple(self._full_result(weekday) for weekday in range(7))
+
+    def _day_failure(self, weekday: int) -> Optional[str]:
+        if not self.has_common_days:
+            return "No common work days between employee and lawyer"
+        if weekday not in self.employee_weekdays:
+            return f"Employee doesn't work on {WEEK_DAYS[weekday]}"
+        if weekday not in self.lawyer_weekdays:
+            return f"Lawyer doesn't work on {WEEK_DAYS[weekday]}"
+        if self.overlap is None:
+            return "No schedule overlap between employee and lawyer"
+        return None
+
+    def _full_result(self, weekday: int) -> CompatibilityResult:
+        failure = self._day_failures[weekday]
+        if failure is not None:
+            return False, failure, None
+        if self.first_valid_segment is None:
+            return False, "No available times outside lunch hours (12:00-14:00)", None
+        return True, None, self.first_valid_segment
+
+    def full_compatibility(self, appointment_date: date) -> CompatibilityResult:
+        """
+        Compatibility of the pair on a date, without busy schedules (table lookup).
+        """
+        return self._full_results[appointment_date.weekday()]
+
+    def compatibility_with_schedules(self, appointment_date: date,
+                                     employee_schedule: Optional['BusySchedule'] = None,
+                                     lawyer_schedule: Optional['BusySchedule'] = None,
+                                     minimum_duration_minutes: int = 60) -> CompatibilityResult:
+        """
+        Compatibility of the pair on a date, subtracting the busy schedules of both parties.
+        """
+        failure = self._day_failures[appointment_date.weekday()]
+        if failure is not None:
+            return False, failure, None
+        if not self.segments:
+            return False, "No available times outside lunch hours (12:00-14:00)", None
+
+        free_window = self.first_free_window(appointment_date, employee_schedule, lawyer_schedule,
+                                             minimum_duration_minutes)
+        if free_window is None:
+            return False, "No available times considering busy schedules", None
+        return True, None, free_window
+
+    def first_free_window(self, appointment_date: date,
+                          employee_schedule: Optional['BusySchedule'] = None,
+                          lawyer_schedule: Optional['BusySchedule'] = None,
+                          minimum_duration_minutes: int = 60) -> Optional[Tuple[time, time]]:
+        """
+        Returns the first segment of the date free of busy periods that lasts the
+        minimum duration, ignoring whether the date is a common work day.
+        """
+        busy, breaks = busy_minute_masks([employee_schedule, lawyer_schedule], appointment_date)
+        window = first_free_window(self.segments_mask & ~busy, minimum_duration_minutes, MINUTE_SLOTS, breaks)
+        if window is None:
+            return None
+        return minutes_to_time(window[0]), minutes_to_time(window[1])
+
+
+def get_compatibility_profile(employee_work_days: List[str], employee_start_time: time, employee_end_time: time,
+                              lawyer_work_days: List[str], lawyer_start_time: time,
+                              lawyer_end_time: time) -> CompatibilityProfile:
+    """
+    Returns the shared profile for a pair of configurations.
+    The fingerprint ignores work day order and the seconds of the times, which no rule uses.
+    """
+    return _get_profile(
+        frozenset(employee_work_days), employee_start_time.replace(second=0, microsecond=0),
+        employee_end_time.replace(second=0, microsecond=0),
+        frozenset(lawyer_work_days), lawyer_start_time.replace(second=0, microsecond=0),
+        lawyer_end_time.replace(second=0, microsecond=0)
+    )
+
+
+@lru_cache(maxsize=4096)
+def _get_profile(employee_work_days: FrozenSet[str], employee_start_time: time, employee_end_time: time,
+                 lawyer_work_days: FrozenSet[str], lawyer_start_time: time,
+                 lawyer_end_time: time) -> CompatibilityProfile:
+    return CompatibilityProfile(employee_work_days, employee_start_time, employee_end_time,
+                                lawyer_work_days, lawyer_start_time, lawyer_end_time)
@@ -1,18 +1,22 @@
 from datetime import date, timedelta, time
-from typing import List
+from typing import List, Optional
+
+from utils.business_calendar import BusinessCalendar, get_business_calendar
+from utils.holiday_handler import normalize_holiday_dates
+
+
+# Day names indexed by date.weekday() (keeping original Spanish names for compatibility)
+WEEK_DAYS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+# Work days between the counting start date and the appointment date
+DEFAULT_LEAD_TIME_DAYS = 5
 
 
 def is_employee_work_day(date_to_check: date, work_days: List[str], holiday_dates: List[date], works_holidays: bool) -> bool:
     """
     Determines if a date is a work day for the employee.
     """
-    # Convert date to day name in Spanish (keeping original day names for compatibility)
-    week_days = {
-        0: "lunes", 1: "martes", 2: "miércoles", 3: "jueves",
-        4: "viernes", 5: "sábado", 6: "domingo"
-    }
-
-    day_name = week_days[date_to_check.weekday()]
+    day_name = WEEK_DAYS[date_to_check.weekday()]
 
     # Check if employee works this day of the week
     if day_name not in work_days:
@@ -25,90 +29,77 @@ def is_employee_work_day(date_to_check: date, work_days: List[str], holiday_date
     return True
 
 
+def get_employee_calendar(work_days: List[str], holiday_dates: List[date],
+                          works_holidays: bool) -> BusinessCalendar:
+    """
+    Returns the shared business-day calendar for an employee's work rules.
+    """
+    work_weekdays = frozenset(index for index, day_name in enumerate(WEEK_DAYS) if day_name in work_days)
+    return get_business_calendar(work_weekdays, normalize_holiday_dates(holiday_dates), works_holidays)
+
+
 def calculate_notification_date(current_date: date, current_time: time, work_days: List[str],
                                holiday_dates: List[date], works_holidays: bool,
-                               start_time: time, end_time: time) -> date:
+                               start_time: time, end_time: time,
+                               calendar: Optional[BusinessCalendar] = None) -> date:
     """
     Calculates notification date according to business rules.
     Considers both work day and employee's work hours.
     """
+    if calendar is None:
+        calendar = get_employee_calendar(work_days, holiday_dates, works_holidays)
+
     # If today is a work day and we're within work hours, notification is today
-    if (is_employee_work_day(current_date, work_days, holiday_dates, works_holidays) and
-        start_time <= current_time <= end_time):
+    if calendar.is_work_day(current_date) and start_time <= current_time <= end_time:
         return current_date
 
     # If not a work day or work hours have passed, find next work day
-    candidate_date = current_date + timedelta(days=1)
-
-    while not is_employee_work_day(candidate_date, work_days, holiday_dates, works_holidays):
-        candidate_date += timedelta(days=1)
-
-        # Avoid infinite loop (maximum 30 days search)
-        if (candidate_date - current_date).days > 30:
-            raise ValueError("Could not find a work day in the next 30 days")
-
-    return candidate_date
+    return calendar.next_work_day(current_date + timedelta(days=1))
 
 
 def calculate_counting_start_date(notification_date: date, work_days: List[str],
-                                 holiday_dates: List[date], works_holidays: bool) -> date:
+                                 holiday_dates: List[date], works_holidays: bool,
+                                 calendar: Optional[BusinessCalendar] = None) -> date:
     """
     Calculates counting start date (notification date + 1 work day).
     """
-    candidate_date = notification_date + timedelta(days=1)
-
-    while not is_employee_work_day(candidate_date, work_days, holiday_dates, works_holidays):
-        candidate_date += timedelta(days=1)
-
-        # Avoid infinite loop
-        if (candidate_date - notification_date).days > 30:
-            raise ValueError("Could not find counting start date in the next 30 days")
+    if calendar is None:
+        calendar = get_employee_calendar(work_days, holiday_dates, works_holidays)
 
-    return candidate_date
+    return calendar.nth_work_day_after(notification_date, 1)
 
 
 def calculate_appointment_date(counting_start_date: date, work_days: List[str],
-                              holiday_dates: List[date], works_holidays: bool) -> date:
+                              holiday_dates: List[date], works_holidays: bool,
+                              calendar: Optional[BusinessCalendar] = None,
+                              lead_time_days: int = DEFAULT_LEAD_TIME_DAYS) -> date:
     """
-    Calculates appointment date (5 work days after counting start date).
+    Calculates appointment date (lead_time_days work days after counting start date, 5 by default).
     """
-    work_days_counted = 0
-    candidate_date = counting_start_date + timedelta(days=1)  # Start the day after
+    if calendar is None:
+        calendar = get_employee_calendar(work_days, holiday_dates, works_holidays)
 
-    while work_days_counted < 5:
-        if is_employee_work_day(candidate_date, work_days, holiday_dates, works_holidays):
-            work_days_counted += 1
-            if work_days_counted == 5:
-                break
-
-        candidate_date += timedelta(days=1)
-
-        # Avoid infinite loop
-        if (candidate_date - counting_start_date).days > 60:
-            raise ValueError("Could not calculate appointment date in the next 60 days")
-
-    return candidate_date
+    return calendar.nth_work_day_after(counting_start_date, lead_time_days)
 
 
 def find_next_compatible_date(start_date: date, employee_work_days: List[str],
                              lawyer_work_days: List[str], holiday_dates: List[date],
-                             works_holidays: bool, max_days: int = 30) -> date:
+                             works_holidays: bool, max_days: int = 30,
+                             calendar: Optional[BusinessCalendar] = None) -> date:
     """
     Finds the next date when both employee and lawyer can work.
     """
-    week_days = {
-        0: "lunes", 1: "martes", 2: "miércoles", 3: "jueves",
-        4: "viernes", 5: "sábado", 6: "domingo"
-    }
+    if calendar is None:
+        calendar = get_employee_calendar(employee_work_days, holiday_dates, works_holidays)
 
     candidate_date = start_date
     days_searched = 0
 
     while days_searched < max_days:
-        day_name = week_days[candidate_date.weekday()]
+        day_name = WEEK_DAYS[candidate_date.weekday()]
 
         # Check if employee can work this day
-        employee_can_work = is_employee_work_day(candidate_date, employee_work_days, holiday_dates, works_holidays)
+        employee_can_work = calendar.is_work_day(candidate_date)
 
         # Check if lawyer can work this day
         lawyer_can_work = day_name in lawyer_work_days
@@ -124,21 +115,19 @@ def find_next_compatible_date(start_date: date, employee_work_days: List[str],
 
 def calculate_compatible_appointment_date(counting_start_date: date, employee_work_days: List[str],
                                          lawyer_work_days: List[str], holiday_dates: List[date],
-                                         works_holidays: bool) -> date:
+                                         works_holidays: bool,
+                                         calendar: Optional[BusinessCalendar] = None,
+                                         lead_time_days: int = DEFAULT_LEAD_TIME_DAYS) -> date:
     """
     Calculates appointment date considering compatibility between employee and lawyer.
-    First counts 5 employee work days, then finds compatible date if necessary.
+    First counts lead_time_days employee work days, then finds compatible date if necessary.
     """
     # First calculate ideal date based on employee
-    ideal_date = calculate_appointment_date(counting_start_date, employee_work_days, holiday_dates, works_holidays)
+    ideal_date = calculate_appointment_date(counting_start_date, employee_work_days, holiday_dates,
+                                            works_holidays, calendar, lead_time_days)
 
     # Check if lawyer can work on that date
-    week_days = {
-        0: "lunes", 1: "martes", 2: "miércoles", 3: "jueves",
-        4: "viernes", 5: "sábado", 6: "domingo"
-    }
-
-    ideal_day = week_days[ideal_date.weekday()]
+    ideal_day = WEEK_DAYS[ideal_date.weekday()]
 
     # If lawyer can also work that date, use that date
     if ideal_day in lawyer_work_days:
@@ -146,4 +135,4 @@ def calculate_compatible_appointment_date(counting_start_date: date, employee_wo
 
     # If not, find next compatible date
     return find_next_compatible_date(ideal_date, employee_work_days, lawyer_work_days,
-                                   holiday_dates, works_holidays)
\ No newline at end of file
+                                   holiday_dates, works_holidays, calendar=calendar)
\ No newline at end of file
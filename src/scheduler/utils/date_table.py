@@ -0,0 +1,174 @@
+"""
+Appointment date tables: the dates of the scheduling process for every
+current_date of a range, computed in a single pass over the work days.
+"""
+import argparse
+import csv
+import io
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, NamedTuple, Sequence
+
+from utils.date_calculator import DEFAULT_LEAD_TIME_DAYS, WEEK_DAYS, get_employee_calendar
+from utils.holiday_handler import filter_holidays_for_employee
+
+# When the request arrives relative to the employee's work hours. Only requests
+# within work hours are notified the same day, so before and after hours give
+# the same dates; both are kept so tables can be joined on either variant.
+TIME_VARIANTS = ("before_hours", "within_hours", "after_hours")
+
+# Largest range of current dates accepted in one table
+MAX_TABLE_DAYS = 3660
+
+TABLE_COLUMNS = ("current_date", "time_variant", "notification_date", "counting_start_date", "appointment_date")
+
+
+class DateTableRow(NamedTuple):
+    current_date: date
+    time_variant: str
+    notification_date: date
+    counting_start_date: date
+    appointment_date: date
+
+
+def build_appointment_date_table(start_date: date, end_date: date, work_days: List[str],
+                                 holiday_dates: List[date], works_holidays: bool,
+                                 lead_time_days: int = DEFAULT_LEAD_TIME_DAYS,
+                                 time_variants: Sequence[str] = TIME_VARIANTS) -> List[DateTableRow]:
+    """
+    Computes (notification, counting start, appointment) dates for every current date
+    in [start_date, end_date] and every time variant.
+
+    The employee's work days are listed once, from start_date up to the last appointment
+    date, and a pointer to the first work day on or after the current date slides
+    forward; each date is then a constant number of positions from that pointer.
+
+    Raises:
+        ValueError: If the range or variants are invalid or the employee has no work days
+    """
+    if end_date < start_date:
+        raise ValueError("Table end date must not be before its start date")
+    if (end_date - start_date).days + 1 > MAX_TABLE_DAYS:
+        raise ValueError(f"Table range can cover at most {MAX_TABLE_DAYS} days")
+    if lead_time_days < 1:
+        raise ValueError("Lead time must be at least 1 work day")
+    unknown_variants = [variant for variant in time_variants if variant not in TIME_VARIANTS]
+    if unknown_variants:
+        raise ValueError(f"Unknown time variants: {', '.join(unknown_variants)}")
+
+    calendar = get_employee_calendar(
+        work_days, filter_holidays_for_employee(holiday_dates, works_holidays), works_holidays
+    )
+
+    # Work days needed: up to the first one after end_date, then counting start + lead time
+    work_day_ordinals = []
+    day = calendar.next_work_day(start_date)
+    while day <= end_date:
+        work_day_ordinals.append(day.toordinal())
+        day = calendar.next_work_day(day + timedelta(days=1))
+    for _ in range(lead_time_days + 2):
+        work_day_ordinals.append(day.toordinal())
+        day = calendar.next_work_day(day + timedelta(days=1))
+
+    rows = []
+    pointer = 0
+    for ordinal in range(start_date.toordinal(), end_date.toordinal() + 1):
+        # First work day on or after the current date
+        while work_day_ordinals[pointer] < ordinal:
+            pointer += 1
+        is_work_day = work_day_ordinals[pointer] == ordinal
+        current_date = date.fromordinal(ordinal)
+
+        for variant in time_variants:
+            notification_index = pointer if is_work_day and variant == "within_hours" else \
+                pointer + 1 if is_work_day else pointer
+            rows.append(DateTableRow(
+                current_date,
+                variant,
+                date.fromordinal(work_day_ordinals[notification_index]),
+                date.fromordinal(work_day_ordinals[notification_index + 1]),
+                date.fromordinal(work_day_ordinals[notification_index + 1 + lead_time_days])
+            ))
+
+    return rows
+
+
+def iter_csv_lines(rows: Iterable[DateTableRow]) -> Iterator[str]:
+    """
+    Yields the table as CSV text lines, header first.
+    """
+    yield ",".join(TABLE_COLUMNS) + "\n"
+    for row in rows:
+        yield f"{row.current_date},{row.time_variant},{row.notification_date},{row.counting_start_date},{row.appointment_date}\n"
+
+
+def table_to_dataframe(rows: List[DateTableRow]):
+    """
+    Converts the table to a pandas DataFrame with datetime64 date columns.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows, columns=TABLE_COLUMNS)
+    for column in ("current_date", "notification_date", "counting_start_date", "appointment_date"):
+        frame[column] = pd.to_datetime(frame[column])
+    return frame
+
+
+def date_table_to_parquet(rows: List[DateTableRow]) -> bytes:
+    """
+    Serializes the table as Parquet.
+
+    Raises:
+        ValueError: If no Parquet engine (pyarrow or fastparquet) is installed
+    """
+    buffer = io.BytesIO()
+    try:
+        table_to_dataframe(rows).to_parquet(buffer, index=False)
+    except ImportError as ie:
+        raise ValueError("Parquet output requires pyarrow or fastparquet to be installed") from ie
+    return buffer.getvalue()
+
+
+def write_date_table(rows: List[DateTableRow], file_path: str, output_format: str = "csv"):
+    """
+    Writes the table as CSV or Parquet (Parquet requires pyarrow or fastparquet).
+    """
+    if output_format == "csv":
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(TABLE_COLUMNS)
+            writer.writerows(rows)
+    elif output_format == "parquet":
+        content = date_table_to_parquet(rows)
+        with open(file_path, 'wb') as file:
+            file.write(content)
+    else:
+        raise ValueError(f"Unsupported table format '{output_format}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the appointment date table for a range of current dates")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="First current date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="Last current date (YYYY-MM-DD)")
+    parser.add_argument("--work-days", required=True,
+                        help=f"Comma-separated employee work days ({', '.join(WEEK_DAYS)})")
+    parser.add_argument("--holidays", default="", help="Comma-separated holiday dates (YYYY-MM-DD)")
+    parser.add_argument("--works-holidays", action="store_true", help="Employee works on holidays")
+    parser.add_argument("--lead-time-days", type=int, default=DEFAULT_LEAD_TIME_DAYS)
+    parser.add_argument("--variants", default=",".join(TIME_VARIANTS),
+                        help="Comma-separated time variants to include")
+    parser.add_argument("--output", required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None,
+                        help="Output format (defaults to the output file extension)")
+    args = parser.parse_args()
+
+    table = build_appointment_date_table(
+        args.start, args.end,
+        [day_name.strip() for day_name in args.work_days.split(",") if day_name.strip()],
+        [date.fromisoformat(value.strip()) for value in args.holidays.split(",") if value.strip()],
+        args.works_holidays,
+        args.lead_time_days,
+        [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    )
+    table_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    write_date_table(table, args.output, table_format)
+    print(f"Wrote {len(table)} rows to {args.output}")
@@ -0,0 +1,162 @@
+"""
+Execution layer: cheap requests run inline in the event loop, costly ones in a
+worker pool so they don't stall other requests.
+
+Configured per deployment with environment variables:
+- EXECUTION_POOL: "auto" (default), "process", "thread" or "inline"
+  ("auto" uses threads on free-threaded builds and processes otherwise)
+- EXECUTION_MAX_WORKERS: pool size (default: CPU count)
+- EXECUTION_COST_THRESHOLD: estimated cost from which requests are offloaded (default 20000)
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import sysconfig
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from models import AppointmentRequest, MatchRequest
+from utils.metrics import call_collecting_metrics, metrics
+
+
+def is_free_threaded() -> bool:
+    """
+    True when running on a free-threaded (no GIL) Python build with the GIL disabled.
+    """
+    if not sysconfig.get_config_var("Py_GIL_DISABLED"):
+        return False
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is None or not is_gil_enabled()
+
+
+def schedule_size(schedule: Any) -> int:
+    """
+    Number of meetings of an inline or registered schedule, or of stored days for a schedule reference.
+    """
+    if schedule is None:
+        return 0
+    meetings = getattr(schedule, "meetings", None)
+    if meetings is not None:
+        return len(meetings)
+    return getattr(schedule, "meeting_count", None) or getattr(schedule, "day_count", 0)
+
+
+def estimate_appointment_cost(request: AppointmentRequest) -> int:
+    """
+    Estimated work of a request: busy meetings x dates searched.
+    Stored schedules are read per day, so references only add a day's worth.
+    """
+    meetings = schedule_size(request.employee_schedule) + schedule_size(request.lawyer_schedule)
+    meetings += (request.employee_schedule_ref is not None) + (request.lawyer_schedule_ref is not None)
+    search_days = request.search_horizon_days if request.search_free_slot else 1
+    return (meetings + 1) * search_days
+
+
+def estimate_match_cost(request: MatchRequest) -> int:
+    """
+    Estimated work of a match request: employee/lawyer pairs x days, plus their meetings.
+    """
+    meetings = sum(schedule_size(person.schedule) for person in list(request.employees) + list(request.lawyers))
+    return len(request.employees) * len(request.lawyers) * request.search_horizon_days + meetings
+
+
+class ExecutionLayer:
+    """
+    Runs functions inline or in a lazily created pool depending on their estimated cost.
+    Functions sent to a process pool and their arguments must be picklable; the
+    metrics they record in the worker are merged back into this process.
+    """
+
+    def __init__(self, pool_kind: str = "auto", max_workers: Optional[int] = None,
+                 cost_threshold: int = 20000):
+        if pool_kind == "auto":
+            pool_kind = "thread" if is_free_threaded() else "process"
+        if pool_kind not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown execution pool '{pool_kind}'")
+
+        self.pool_kind = pool_kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cost_threshold = cost_threshold
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+        self.inline_count = 0
+        self.submitted_count = 0
+        self.completed_count = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.pool_kind == "process":
+                    # spawn: workers don't inherit the server's threads (logging listener, event loop)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="scheduler-worker")
+            return self._executor
+
+    async def run(self, cost: int, function: Callable, *args) -> Any:
+        """
+        Runs function(*args) inline when cost is below the threshold, otherwise in the pool.
+        """
+        if self.pool_kind == "inline" or cost < self.cost_threshold:
+            self.inline_count += 1
+            return function(*args)
+
+        with self._lock:
+            self.submitted_count += 1
+        collect_metrics = self.pool_kind == "process" and metrics.enabled
+        if collect_metrics:
+            future = self._get_executor().submit(call_collecting_metrics, function, *args)
+        else:
+            future = self._get_executor().submit(function, *args)
+        future.add_done_callback(self._on_done)
+        result = await asyncio.wrap_future(future)
+        if collect_metrics:
+            result, worker_metrics = result
+            metrics.merge(worker_metrics)
+        return result
+
+    def _on_done(self, _future):
+        with self._lock:
+            self.completed_count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Pool kind and size, requests run inline, and offloaded requests pending
+        (queued or running) and completed.
+        """
+        with self._lock:
+            pending = self.submitted_count - self.completed_count
+            return {
+                "pool": self.pool_kind,
+                "max_workers": self.max_workers,
+                "cost_threshold": self.cost_threshold,
+                "inline": self.inline_count,
+                "submitted": self.submitted_count,
+                "completed": self.completed_count,
+                "pending": pending,
+                "queued": max(0, pending - self.max_workers)
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def execution_layer_from_environment() -> ExecutionLayer:
+    """
+    Builds the execution layer described by EXECUTION_POOL, EXECUTION_MAX_WORKERS
+    and EXECUTION_COST_THRESHOLD.
+    """
+    max_workers = os.environ.get("EXECUTION_MAX_WORKERS")
+    return ExecutionLayer(
+        pool_kind=os.environ.get("EXECUTION_POOL", "auto"),
+        max_workers=int(max_workers) if max_workers else None,
+        cost_threshold=int(os.environ.get("EXECUTION_COST_THRESHOLD", 20000))
+    )
@@ -1,18 +1,114 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import date, timedelta
-from typing import List
+from threading import Lock
+from typing import Iterable, Iterator, List, Tuple, Union
+import hashlib
+
+
+class HolidaySet:
+    """
+    Frozen, sorted and hashed collection of holiday dates.
+    Supports `in`, iteration and len(), so it can be used wherever a holiday list is expected.
+    """
+
+    __slots__ = ("dates", "digest", "_members", "_hash")
+
+    def __init__(self, holiday_dates: Iterable[date] = ()):
+        self.dates: Tuple[date, ...] = tuple(sorted(set(holiday_dates)))
+        self._members = frozenset(self.dates)
+        self._hash = hash(self.dates)
+        # Content address of the set, independent of the order the dates arrived in
+        self.digest = hashlib.sha1(",".join(d.isoformat() for d in self.dates).encode()).hexdigest()
+
+    def __contains__(self, date_to_check: object) -> bool:
+        return date_to_check in self._members
+
+    def __iter__(self) -> Iterator[date]:
+        return iter(self.dates)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, HolidaySet) and self.dates == other.dates
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"HolidaySet({len(self.dates)} dates, digest={self.digest[:12]})"
+
+    def in_period(self, start_date: date, end_date: date) -> Tuple[date, ...]:
+        """
+        Returns the holidays between two dates (both inclusive), sorted.
+        """
+        return self.dates[bisect_left(self.dates, start_date):bisect_right(self.dates, end_date)]
+
+
+EMPTY_HOLIDAYS = HolidaySet()
+
+
+class HolidayRegistry:
+    """
+    Bounded LRU cache of normalized holiday sets, keyed on content: lists with
+    the same dates (in any order, with repeats) resolve to the same HolidaySet instance.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._sets: "OrderedDict[Tuple[date, ...], HolidaySet]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, holiday_dates: Iterable[date]) -> HolidaySet:
+        """
+        Returns the normalized holiday set for a list of dates, building it only once.
+        """
+        key = tuple(sorted(set(holiday_dates)))
+        with self._lock:
+            holidays = self._sets.get(key)
+            if holidays is not None:
+                self._sets.move_to_end(key)
+                return holidays
+
+        holidays = HolidaySet(key) if key else EMPTY_HOLIDAYS
+
+        with self._lock:
+            self._sets[key] = holidays
+            if len(self._sets) > self.max_entries:
+                self._sets.popitem(last=False)
+
+        return holidays
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+holiday_registry = HolidayRegistry()
+
+
+def normalize_holiday_dates(holiday_dates: Union[HolidaySet, Iterable[date]]) -> HolidaySet:
+    """
+    Converts a holiday list to a shared HolidaySet (HolidaySets are returned unchanged).
+    """
+    if isinstance(holiday_dates, HolidaySet):
+        return holiday_dates
+    return holiday_registry.get(holiday_dates)
 
 
 def is_holiday(date_to_check: date, holiday_dates: List[date]) -> bool:
     """
     Verifies if a date is a holiday.
     """
-    return date_to_check in holiday_dates
+    return date_to_check in normalize_holiday_dates(holiday_dates)
 
 
 def get_next_non_holiday(start_date: date, holiday_dates: List[date], max_days: int = 30) -> date:
     """
     Finds the next date that is not a holiday.
     """
+    holiday_dates = normalize_holiday_dates(holiday_dates)
     candidate_date = start_date
     days_searched = 0
 
@@ -26,37 +122,28 @@ def get_next_non_holiday(start_date: date, holiday_dates: List[date], max_days:
     return candidate_date
 
 
-def filter_holidays_for_employee(holiday_dates: List[date], works_holidays: bool) -> List[date]:
+def filter_holidays_for_employee(holiday_dates: List[date], works_holidays: bool) -> HolidaySet:
     """
     Filters holiday dates based on whether employee works holidays or not.
 
     Returns:
-        List[date]: List of dates that should be considered as non-work days for the employee
+        HolidaySet: Dates that should be considered as non-work days for the employee
     """
     if works_holidays:
-        return []  # If works holidays, no holiday counts as non-work day
+        return EMPTY_HOLIDAYS  # If works holidays, no holiday counts as non-work day
     else:
-        return holiday_dates  # If doesn't work holidays, all holidays are non-work days
+        return normalize_holiday_dates(holiday_dates)  # If doesn't work holidays, all holidays are non-work days
 
 
 def count_holidays_in_period(start_date: date, end_date: date, holiday_dates: List[date]) -> int:
     """
     Counts how many holidays are in a specific period.
     """
-    count = 0
-    for holiday in holiday_dates:
-        if start_date <= holiday <= end_date:
-            count += 1
-    return count
+    return len(normalize_holiday_dates(holiday_dates).in_period(start_date, end_date))
 
 
 def get_holidays_in_period(start_date: date, end_date: date, holiday_dates: List[date]) -> List[date]:
     """
     Gets all holidays in a specific period.
     """
-    holidays_in_period = []
-    for holiday in holiday_dates:
-        if start_date <= holiday <= end_date:
-            holidays_in_period.append(holiday)
-
-    return sorted(holidays_in_period)
\ No newline at end of file
+    return list(normalize_holiday_dates(holiday_dates).in_period(start_date, end_date))
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Non-blocking logging: request threads only enqueue records, and a background
+QueueListener formats and writes them.
+
+Configured per deployment with environment variables:
+- LOG_LEVEL: root log level (default INFO)
+- LOG_MODE: "queue" (default) or "sync" to write from the calling thread
+- LOG_QUEUE_SIZE: records buffered before new ones are dropped (default 10000)
+- LOG_STEP_SAMPLE_RATE: fraction of requests that log their per-step info (default 1.0)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Optional
+
+LOG_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and leaves formatting to the listener.
+    Records that don't fit in the queue are dropped and counted.
+    """
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in-process, so the record is passed as is and the
+        # message is only merged with its arguments when the listener writes it
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Owns the handler installed on the root logger and, in queue mode, its listener.
+    """
+
+    def __init__(self, mode: str = "queue", level: str = "INFO", queue_size: int = 10000,
+                 step_sample_rate: float = 1.0):
+        if mode not in ("queue", "sync"):
+            raise ValueError(f"Unknown log mode '{mode}'")
+        self.mode = mode
+        self.level = level
+        self.step_sample_rate = min(max(step_sample_rate, 0.0), 1.0)
+        self.output_handler = logging.StreamHandler(sys.stderr)
+        self.output_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        self.queue_handler: Optional[DroppingQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self._started = False
+        if mode == "queue":
+            self.queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+            self.listener = logging.handlers.QueueListener(
+                self.queue_handler.queue, self.output_handler, respect_handler_level=True
+            )
+
+    @property
+    def handler(self) -> logging.Handler:
+        return self.queue_handler if self.queue_handler is not None else self.output_handler
+
+    @property
+    def dropped(self) -> int:
+        return self.queue_handler.dropped if self.queue_handler is not None else 0
+
+    def start(self):
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        if self.listener is not None:
+            self.listener.start()
+        self._started = True
+
+    def stop(self):
+        """
+        Flushes queued records and detaches the handler.
+        """
+        if not self._started:
+            return
+        if self.listener is not None:
+            self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+        self._started = False
+
+    def sample_steps(self) -> bool:
+        """
+        Decides whether the current request logs its per-step info messages.
+        """
+        if self.step_sample_rate >= 1.0:
+            return True
+        return self.step_sample_rate > 0.0 and random.random() < self.step_sample_rate
+
+
+_pipeline: Optional[LogPipeline] = None
+
+
+def configure_logging() -> LogPipeline:
+    """
+    Installs the logging pipeline described by the environment (once per process).
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(
+            mode=os.environ.get("LOG_MODE", "queue"),
+            level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+            queue_size=int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+            step_sample_rate=float(os.environ.get("LOG_STEP_SAMPLE_RATE", 1.0))
+        )
+        _pipeline.start()
+        atexit.register(_pipeline.stop)
+    return _pipeline
+
+
+def should_log_steps(step_logger: logging.Logger) -> bool:
+    """
+    True if this request should emit per-step info logs: INFO is enabled and the
+    request falls within the configured sample.
+    """
+    if not step_logger.isEnabledFor(logging.INFO):
+        return False
+    return _pipeline.sample_steps() if _pipeline is not None else True
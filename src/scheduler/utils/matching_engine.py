@@ -0,0 +1,186 @@
+from datetime import date, time, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from models import BusySchedule, EmployeeConfig, LawyerConfig
+from utils.business_calendar import BusinessCalendar
+from utils.date_calculator import WEEK_DAYS
+from utils.slot_bitmap import (
+    DEFAULT_SLOT_MINUTES,
+    busy_mask,
+    lunch_mask,
+    slots_per_day,
+    working_hours_mask
+)
+
+# Upper bound of booleans materialized at once when pairing employees with lawyers
+MAX_PAIR_MATRIX_CELLS = 32_000_000
+
+
+def mask_to_row(mask: int, slot_count: int) -> np.ndarray:
+    """
+    Converts a slot bitmap to a boolean vector of slot_count entries.
+    """
+    raw = np.frombuffer(mask.to_bytes((slot_count + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder="little")[:slot_count].astype(bool)
+
+
+def build_availability_matrix(first_date: date, day_count: int, day_mask: int,
+                              work_weekdays: List[int], schedule: Optional[BusySchedule],
+                              calendar: Optional[BusinessCalendar] = None,
+                              available_from: Optional[date] = None,
+                              available_until: Optional[date] = None,
+                              slot_minutes: int = DEFAULT_SLOT_MINUTES) -> np.ndarray:
+    """
+    Builds a (days x slots) boolean matrix of free slots for one person.
+
+    Days are free when their weekday is a work day (or the calendar says so),
+    within [available_from, available_until]; slots follow day_mask minus busy time.
+    """
+    slot_count = slots_per_day(slot_minutes)
+    base_row = mask_to_row(day_mask, slot_count)
+    matrix = np.zeros((day_count, slot_count), dtype=bool)
+
+    for offset in range(day_count):
+        day = first_date + timedelta(days=offset)
+        if available_from is not None and day < available_from:
+            continue
+        if available_until is not None and day > available_until:
+            break
+        if calendar is not None:
+            if not calendar.is_work_day(day):
+                continue
+        elif day.weekday() not in work_weekdays:
+            continue
+
+        intervals = schedule.busy_intervals(day) if schedule is not None else ()
+        if intervals:
+            matrix[offset] = mask_to_row(day_mask & ~busy_mask(intervals, slot_minutes), slot_count)
+        else:
+            matrix[offset] = base_row
+
+    return matrix
+
+
+def window_starts(availability: np.ndarray, window_slots: int) -> np.ndarray:
+    """
+    Marks the slots where window_slots consecutive free slots start (last axis is slots).
+    """
+    slot_count = availability.shape[-1]
+    if window_slots > slot_count:
+        return np.zeros(availability.shape[:-1] + (0,), dtype=bool)
+
+    starts = availability[..., :slot_count - window_slots + 1].copy()
+    for shift in range(1, window_slots):
+        starts &= availability[..., shift:slot_count - window_slots + 1 + shift]
+    return starts
+
+
+def earliest_common_windows(employee_matrices: np.ndarray, lawyer_matrices: np.ndarray,
+                            window_slots: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds, for every employee, the lawyer with the earliest common free window.
+
+    Args:
+        employee_matrices: (N, days, slots) availability
+        lawyer_matrices: (M, days, slots) availability
+
+    Returns:
+        Tuple of (lawyer index, flat day/slot start position) per employee;
+        -1 where no common window exists
+    """
+    employee_count, day_count, slot_count = employee_matrices.shape
+    lawyer_count = lawyer_matrices.shape[0]
+
+    best_lawyer = np.full(employee_count, -1, dtype=np.int64)
+    best_position = np.full(employee_count, -1, dtype=np.int64)
+    if employee_count == 0 or lawyer_count == 0:
+        return best_lawyer, best_position
+
+    pair_cells = max(1, lawyer_count * day_count * slot_count)
+    chunk_size = max(1, MAX_PAIR_MATRIX_CELLS // pair_cells)
+
+    for chunk_start in range(0, employee_count, chunk_size):
+        chunk = employee_matrices[chunk_start:chunk_start + chunk_size]
+        # (n, M, days, slots): common free slots for each employee/lawyer pair
+        common = chunk[:, None, :, :] & lawyer_matrices[None, :, :, :]
+        starts = window_starts(common, window_slots)
+        flat = starts.reshape(starts.shape[0], lawyer_count, -1)
+        if flat.shape[-1] == 0:
+            continue
+
+        found = flat.any(axis=2)
+        first = np.where(found, flat.argmax(axis=2), np.iinfo(np.int64).max)
+        lawyer_index = first.argmin(axis=1)
+        has_match = found.any(axis=1)
+
+        rows = np.arange(chunk.shape[0])
+        positions = first[rows, lawyer_index]
+        best_lawyer[chunk_start:chunk_start + chunk.shape[0]] = np.where(has_match, lawyer_index, -1)
+        best_position[chunk_start:chunk_start + chunk.shape[0]] = np.where(has_match, positions, -1)
+
+    # Convert window-start positions back to (day * slots + slot) positions
+    valid_starts = slot_count - window_slots + 1
+    matched = best_position >= 0
+    best_position[matched] = (best_position[matched] // valid_starts) * slot_count + \
+        best_position[matched] % valid_starts
+    return best_lawyer, best_position
+
+
+class MatchingEngine:
+    """
+    Pairs many employees with many lawyers using (days x slots) availability matrices.
+    """
+
+    def __init__(self, first_date: date, day_count: int,
+                 minimum_duration_minutes: int = 60,
+                 slot_minutes: int = DEFAULT_SLOT_MINUTES):
+        self.first_date = first_date
+        self.day_count = day_count
+        self.slot_minutes = slot_minutes
+        self.window_slots = -(-minimum_duration_minutes // slot_minutes)
+        self._lunch = lunch_mask(slot_minutes=slot_minutes)
+
+    def employee_matrix(self, employee: EmployeeConfig, calendar: BusinessCalendar,
+                        schedule: Optional[BusySchedule], available_from: date,
+                        available_until: date) -> np.ndarray:
+        day_mask = working_hours_mask(employee.start_time, employee.end_time, self.slot_minutes) & ~self._lunch
+        return build_availability_matrix(
+            self.first_date, self.day_count, day_mask, [], schedule, calendar,
+            available_from, available_until, self.slot_minutes
+        )
+
+    def lawyer_matrix(self, lawyer: LawyerConfig, schedule: Optional[BusySchedule]) -> np.ndarray:
+        day_mask = working_hours_mask(lawyer.start_time, lawyer.end_time, self.slot_minutes) & ~self._lunch
+        work_weekdays = [index for index, day_name in enumerate(WEEK_DAYS) if day_name in lawyer.work_days]
+        return build_availability_matrix(
+            self.first_date, self.day_count, day_mask, work_weekdays, schedule,
+            slot_minutes=self.slot_minutes
+        )
+
+    def match(self, employee_matrices: List[np.ndarray],
+              lawyer_matrices: List[np.ndarray]) -> List[Optional[Tuple[int, date, time]]]:
+        """
+        Returns, per employee, (lawyer index, appointment date, appointment time) or None.
+        """
+        slot_count = slots_per_day(self.slot_minutes)
+        empty = np.zeros((0, self.day_count, slot_count), dtype=bool)
+        employees = np.stack(employee_matrices) if employee_matrices else empty
+        lawyers = np.stack(lawyer_matrices) if lawyer_matrices else empty
+
+        best_lawyer, best_position = earliest_common_windows(employees, lawyers, self.window_slots)
+
+        matches: List[Optional[Tuple[int, date, time]]] = []
+        for lawyer_index, position in zip(best_lawyer.tolist(), best_position.tolist()):
+            if lawyer_index < 0:
+                matches.append(None)
+                continue
+            day_offset, slot = divmod(position, slot_count)
+            start_minute = slot * self.slot_minutes
+            matches.append((
+                lawyer_index,
+                self.first_date + timedelta(days=day_offset),
+                time(start_minute // 60, start_minute % 60)
+            ))
+        return matches
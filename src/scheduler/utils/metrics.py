@@ -0,0 +1,270 @@
+"""
+Low-overhead metrics: per-step latency histograms, appointment outcome counters
+and the state of other components, exposed in the Prometheus text format.
+
+Configured per deployment with environment variables:
+- METRICS_ENABLED: "1" (default) records metrics, "0" turns instrumentation into a flag check
+"""
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency bucket upper bounds in seconds (the +Inf bucket is implicit)
+DEFAULT_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# (metric name, type, help, [(labels, value), ...]) produced by collectors
+CollectedMetric = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+# Outcome label values by reason prefix, so that reasons with dates, days or
+# horizons in their text don't create a series each
+OUTCOME_CODES = (
+    ("No common work days", "no_common_days"),
+    ("Employee doesn't work on", "no_employee_day"),
+    ("Lawyer doesn't work on", "no_lawyer_day"),
+    ("No schedule overlap", "no_overlap"),
+    ("No available times outside lunch hours", "lunch_only"),
+    ("No available times considering busy schedules", "no_free_slot"),
+)
+
+
+def outcome_code(reason: Optional[str]) -> str:
+    """
+    Returns the outcome label of a not schedulable reason ("scheduled" for None, "other" if unknown).
+    """
+    if reason is None:
+        return "scheduled"
+    return next((code for prefix, code in OUTCOME_CODES if reason.startswith(prefix)), "other")
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with one series per label value.
+    """
+
+    def __init__(self, name: str, help_text: str, label_name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = buckets
+        # label value -> [bucket counts..., sum, count]
+        self._series: Dict[str, List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, label_value: str, value: float):
+        self.observe_many(((label_value, value),))
+
+    def observe_many(self, observations: Iterable[Tuple[str, float]]):
+        """
+        Records (label value, value) pairs taking the lock once.
+        """
+        buckets = self.buckets
+        with self._lock:
+            for label_value, value in observations:
+                series = self._series.get(label_value)
+                if series is None:
+                    series = self._series[label_value] = [0] * (len(buckets) + 1) + [0.0, 0]
+                series[bisect_left(buckets, value)] += 1
+                series[-2] += value
+                series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series_items = [(label, list(series)) for label, series in sorted(self._series.items())]
+        for label_value, series in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels({self.label_name: label_value, 'le': le})} {cumulative}"
+            labels = _format_labels({self.label_name: label_value})
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+    def drain(self) -> Dict[str, List[float]]:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, drained: Dict[str, List[float]]):
+        with self._lock:
+            for label_value, values in drained.items():
+                series = self._series.get(label_value)
+                if series is None:
+                    self._series[label_value] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        series[index] += value
+
+
+class Counter:
+    """
+    Monotonic counter with one series per label value.
+    """
+
+    def __init__(self, name: str, help_text: str, label_name: str):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def inc(self, label_value: str, amount: int = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_value, value in items:
+            yield f"{self.name}{_format_labels({self.label_name: label_value})} {value}"
+
+    def drain(self) -> Dict[str, int]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, drained: Dict[str, int]):
+        with self._lock:
+            for label_value, value in drained.items():
+                self._values[label_value] = self._values.get(label_value, 0) + value
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the process plus collectors that report other components' state.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stage_seconds = Histogram(
+            "scheduler_stage_duration_seconds", "Duration of each scheduling step.", "stage"
+        )
+        self.http_seconds = Histogram(
+            "scheduler_http_request_duration_seconds",
+            "Duration of HTTP requests, including request parsing and response serialization.", "path"
+        )
+        self.outcomes = Counter(
+            "scheduler_appointment_outcomes_total", "Appointment results by reason code (\"scheduled\" if schedulable).",
+            "reason"
+        )
+        self._collectors: List[Callable[[], List[CollectedMetric]]] = []
+
+    def add_collector(self, collector: Callable[[], List[CollectedMetric]]):
+        self._collectors.append(collector)
+
+    def record_outcome(self, reason: Optional[str]):
+        if self.enabled:
+            self.outcomes.inc(outcome_code(reason))
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.http_seconds, self.outcomes):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> Dict[str, Any]:
+        """
+        Takes the recorded samples out of the registry (used by worker processes).
+        """
+        return {
+            "stage_seconds": self.stage_seconds.drain(),
+            "outcomes": self.outcomes.drain()
+        }
+
+    def merge(self, drained: Dict[str, Any]):
+        """
+        Adds samples drained from another process.
+        """
+        self.stage_seconds.merge(drained["stage_seconds"])
+        self.outcomes.merge(drained["outcomes"])
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "no"))
+
+
+class StageTimer:
+    """
+    Marks the end of each step of one request and, when the request finishes,
+    records the step durations and its outcome. Create it only when metrics are
+    enabled, so disabled instrumentation is a None check.
+    """
+
+    __slots__ = ("_marks",)
+
+    def __init__(self):
+        self._marks: List[Tuple[str, float]] = [("", time.perf_counter())]
+
+    def lap(self, stage: str):
+        self._marks.append((stage, time.perf_counter()))
+
+    def finish(self, reason: Optional[str]):
+        marks = self._marks
+        metrics.stage_seconds.observe_many(
+            (stage, end - marks[index][1]) for index, (stage, end) in enumerate(marks[1:])
+        )
+        metrics.record_outcome(reason)
+
+
+def stage_timer() -> Optional[StageTimer]:
+    return StageTimer() if metrics.enabled else None
+
+
+def call_collecting_metrics(function: Callable, *args) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Runs function(*args) and returns its result with the metrics it recorded,
+    so a worker process can hand them back to the server process.
+    """
+    result = function(*args)
+    return result, metrics.drain()
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware recording the duration of requests to the given paths.
+    """
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if not metrics.enabled or scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            metrics.http_seconds.observe(scope["path"], time.perf_counter() - start)
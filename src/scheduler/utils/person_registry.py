@@ -0,0 +1,336 @@
+"""
+Registry of employees and lawyers: configs and busy schedules stored under ids,
+so requests can reference people instead of re-sending them.
+
+Everything is kept in memory and written through to SQLite; meetings are added
+and removed one by one, updating only the affected day of the schedule.
+Bookings are committed optimistically: windows are computed without locks and
+reserved only if still free, re-checking just the days changed meanwhile.
+Changes lock only the people they touch; the shared SQLite connection is held
+just for each write.
+
+Configured per deployment with environment variables:
+- PERSON_REGISTRY_DB: SQLite database file (default ":memory:", not durable)
+"""
+import os
+import sqlite3
+from bisect import insort
+from contextlib import ExitStack
+from datetime import date
+from itertools import count
+from threading import Lock
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from models import EmployeeConfig, LawyerConfig
+from utils.compact_schedule import Meeting
+from utils.schedule_store import PERSON_ID_PATTERN
+
+ROLES = ("employee", "lawyer")
+CONFIG_TYPES = {"employee": EmployeeConfig, "lawyer": LawyerConfig}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    role TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (role, person_id)
+);
+CREATE TABLE IF NOT EXISTS meetings (
+    role TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    start_minute INTEGER NOT NULL,
+    end_minute INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meetings_by_person ON meetings (role, person_id);
+"""
+
+# Schedule versions are unique across the process, so a re-created person never
+# repeats the digest of an earlier schedule
+_versions = count(1)
+
+
+class BookingConflict(Exception):
+    """
+    Raised when a window can't be reserved because a schedule changed after the
+    window was computed.
+    """
+
+
+class PersonNotFound(ValueError):
+    """
+    Raised when a person id isn't registered for the role.
+    """
+
+
+class LiveSchedule:
+    """
+    Mutable busy schedule: sorted intervals per day, updated in place when
+    meetings are added or removed.
+    Provides busy_intervals() and digest() like the other schedules.
+
+    Each day remembers the version that last changed it. Readers don't lock: a
+    day is published before the version that announces it.
+    """
+
+    __slots__ = ("meeting_count", "version", "_intervals", "_day_versions")
+
+    def __init__(self, meetings: Iterable[Meeting] = ()):
+        self.meeting_count = 0
+        self._intervals: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        self._day_versions: Dict[int, int] = {}
+        intervals_by_day: Dict[int, List[Tuple[int, int]]] = {}
+        for day, start, end in meetings:
+            intervals_by_day.setdefault(day, []).append((start, end))
+            self.meeting_count += 1
+        for day, intervals in intervals_by_day.items():
+            self._set_day(day, sorted(intervals))
+        self.version = next(_versions)
+
+    def _set_day(self, day: int, intervals: List[Tuple[int, int]]):
+        if intervals:
+            self._intervals[day] = tuple(intervals)
+        else:
+            self._intervals.pop(day, None)
+
+    def add(self, meeting: Meeting):
+        intervals = list(self._intervals.get(meeting.day, ()))
+        insort(intervals, (meeting.start, meeting.end))
+        self._set_day(meeting.day, intervals)
+        self.meeting_count += 1
+        self._touch(meeting.day)
+
+    def remove(self, meeting: Meeting):
+        """
+        Raises:
+            ValueError: If the schedule has no such meeting
+        """
+        intervals = list(self._intervals.get(meeting.day, ()))
+        try:
+            intervals.remove((meeting.start, meeting.end))
+        except ValueError:
+            raise ValueError(f"No meeting on {date.fromordinal(meeting.day)} from minute "
+                             f"{meeting.start} to {meeting.end}")
+        self._set_day(meeting.day, intervals)
+        self.meeting_count -= 1
+        self._touch(meeting.day)
+
+    def _touch(self, day: int):
+        version = next(_versions)
+        self._day_versions[day] = version
+        self.version = version
+
+    def changed_since(self, day: int, version: int) -> bool:
+        """
+        Whether the day (an ordinal) changed after the schedule had the given version.
+        """
+        return self._day_versions.get(day, 0) > version
+
+    def overlaps(self, meeting: Meeting) -> bool:
+        """
+        Whether the meeting overlaps a busy interval of its day.
+        """
+        return any(start < meeting.end and meeting.start < end
+                   for start, end in self._intervals.get(meeting.day, ()))
+
+    def busy_intervals(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        return self._intervals.get(day.toordinal(), ())
+
+    def digest(self) -> str:
+        return f"live@{self.version}"
+
+
+class RegisteredPerson(NamedTuple):
+    role: str
+    person_id: str
+    config: Union[EmployeeConfig, LawyerConfig]
+    schedule: LiveSchedule
+
+
+class PersonRegistry:
+    """
+    In-memory people and schedules, written through to a SQLite database and
+    loaded from it on start.
+    """
+
+    def __init__(self, database_path: str = ":memory:"):
+        self.database_path = database_path
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        # Each change is one small transaction: WAL avoids rewriting pages twice
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._people: Dict[Tuple[str, str], RegisteredPerson] = {}
+        # Taken after any person locks, only around SQLite writes
+        self._lock = Lock()
+        self._person_locks: Dict[Tuple[str, str], Lock] = {}
+        self._person_locks_guard = Lock()
+        self._load()
+
+    def _load(self):
+        meetings_by_person: Dict[Tuple[str, str], List[Meeting]] = {}
+        for role, person_id, day, start, end in self._connection.execute(
+                "SELECT role, person_id, day, start_minute, end_minute FROM meetings"):
+            meetings_by_person.setdefault((role, person_id), []).append(Meeting(day, start, end))
+
+        for role, person_id, config in self._connection.execute("SELECT role, person_id, config FROM persons"):
+            self._people[(role, person_id)] = RegisteredPerson(
+                role, person_id, CONFIG_TYPES[role].model_validate_json(config),
+                LiveSchedule(meetings_by_person.get((role, person_id), ()))
+            )
+
+    @staticmethod
+    def _check_key(role: str, person_id: str):
+        if role not in ROLES:
+            raise ValueError(f"Unknown role '{role}'")
+        if not PERSON_ID_PATTERN.match(person_id):
+            raise ValueError(f"Invalid person id '{person_id}'")
+
+    def _person_lock(self, role: str, person_id: str) -> Lock:
+        """
+        Lock serializing changes to one person. Several are always taken in sorted key order.
+        """
+        with self._person_locks_guard:
+            return self._person_locks.setdefault((role, person_id), Lock())
+
+    def get(self, role: str, person_id: str) -> RegisteredPerson:
+        """
+        Raises:
+            PersonNotFound: If the person isn't registered
+        """
+        person = self._people.get((role, person_id))
+        if person is None:
+            raise PersonNotFound(f"No registered {role} '{person_id}'")
+        return person
+
+    def put(self, role: str, person_id: str, config: Union[EmployeeConfig, LawyerConfig],
+            meetings: Optional[List[Meeting]] = None) -> RegisteredPerson:
+        """
+        Registers or updates a person. Given meetings replace the schedule;
+        otherwise an existing schedule is kept.
+        """
+        self._check_key(role, person_id)
+        with self._person_lock(role, person_id), self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO persons (role, person_id, config) VALUES (?, ?, ?)",
+                (role, person_id, config.model_dump_json())
+            )
+            existing = self._people.get((role, person_id))
+            if meetings is None and existing is not None:
+                schedule = existing.schedule
+            else:
+                meetings = meetings or []
+                self._connection.execute("DELETE FROM meetings WHERE role = ? AND person_id = ?", (role, person_id))
+                self._insert_meetings(role, person_id, meetings)
+                schedule = LiveSchedule(meetings)
+
+            person = RegisteredPerson(role, person_id, config, schedule)
+            self._people[(role, person_id)] = person
+            return person
+
+    def delete(self, role: str, person_id: str):
+        """
+        Raises:
+            PersonNotFound: If the person isn't registered
+        """
+        with self._person_lock(role, person_id), self._lock, self._connection:
+            self.get(role, person_id)
+            self._connection.execute("DELETE FROM meetings WHERE role = ? AND person_id = ?", (role, person_id))
+            self._connection.execute("DELETE FROM persons WHERE role = ? AND person_id = ?", (role, person_id))
+            del self._people[(role, person_id)]
+
+    def update_meetings(self, role: str, person_id: str, added: List[Meeting],
+                        removed: List[Meeting]) -> RegisteredPerson:
+        """
+        Removes and then adds meetings of a person's schedule, all or nothing.
+
+        Raises:
+            PersonNotFound: If the person isn't registered
+            ValueError: If a removed meeting doesn't exist
+        """
+        with self._person_lock(role, person_id):
+            person = self.get(role, person_id)
+            schedule = person.schedule
+            # Validate removals before touching anything
+            pending: Dict[Meeting, int] = {}
+            for meeting in removed:
+                pending[meeting] = pending.get(meeting, 0) + 1
+            for meeting, times in pending.items():
+                if schedule.busy_intervals(date.fromordinal(meeting.day)).count((meeting.start, meeting.end)) < times:
+                    raise ValueError(f"No meeting on {date.fromordinal(meeting.day)} from minute "
+                                     f"{meeting.start} to {meeting.end}")
+
+            with self._lock, self._connection:
+                for meeting in removed:
+                    self._connection.execute(
+                        "DELETE FROM meetings WHERE rowid = (SELECT rowid FROM meetings WHERE role = ? AND person_id = ?"
+                        " AND day = ? AND start_minute = ? AND end_minute = ? LIMIT 1)",
+                        (role, person_id, meeting.day, meeting.start, meeting.end)
+                    )
+                self._insert_meetings(role, person_id, added)
+
+            for meeting in removed:
+                schedule.remove(meeting)
+            for meeting in added:
+                schedule.add(meeting)
+            return person
+
+    def reserve(self, meeting: Meeting, people: List[Tuple[RegisteredPerson, int]]):
+        """
+        Adds the meeting to the schedule of every person, given with the schedule
+        version seen when the meeting's window was computed. Schedules that changed
+        on the meeting's day since then are checked again for overlaps.
+
+        Only the booked people are locked, so bookings for other people proceed
+        in parallel.
+
+        Raises:
+            BookingConflict: If the window was taken or a person was re-registered (nothing is reserved)
+        """
+        with ExitStack() as locks:
+            for key in sorted({(person.role, person.person_id) for person, _ in people}):
+                locks.enter_context(self._person_lock(*key))
+
+            for person, seen_version in people:
+                schedule = person.schedule
+                if self._people.get((person.role, person.person_id)) is not person:
+                    raise BookingConflict(f"{person.role.capitalize()} '{person.person_id}' was re-registered")
+                if schedule.changed_since(meeting.day, seen_version) and schedule.overlaps(meeting):
+                    raise BookingConflict(f"{person.role.capitalize()} '{person.person_id}' is no longer free on "
+                                          f"{date.fromordinal(meeting.day)} at minute {meeting.start}")
+
+            with self._lock, self._connection:
+                for person, _ in people:
+                    self._insert_meetings(person.role, person.person_id, [meeting])
+            for person, _ in people:
+                person.schedule.add(meeting)
+
+    def _insert_meetings(self, role: str, person_id: str, meetings: List[Meeting]):
+        self._connection.executemany(
+            "INSERT INTO meetings (role, person_id, day, start_minute, end_minute) VALUES (?, ?, ?, ?, ?)",
+            [(role, person_id, meeting.day, meeting.start, meeting.end) for meeting in meetings]
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_registry: Optional[PersonRegistry] = None
+# Warmup opens the registry in a background thread while requests may already need it
+_registry_lock = Lock()
+
+
+def get_person_registry() -> PersonRegistry:
+    """
+    Returns the registry stored in PERSON_REGISTRY_DB (in memory if unset).
+    """
+    global _registry
+    database_path = os.environ.get("PERSON_REGISTRY_DB", ":memory:")
+    registry = _registry
+    if registry is None or registry.database_path != database_path:
+        with _registry_lock:
+            if _registry is None or _registry.database_path != database_path:
+                _registry = PersonRegistry(database_path)
+            registry = _registry
+    return registry
@@ -0,0 +1,117 @@
+import csv
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+
+from models import BusySchedule
+from utils.compact_schedule import Meeting
+from utils.slot_bitmap import MINUTES_PER_DAY, mask_to_intervals, slots_per_day
+
+
+class SlotGridHeader:
+    """
+    Layout of an occupancy-grid CSV: the first column holds the date and the
+    rest are consecutive, equally sized time slots (e.g. 07:00, 07:15, ...).
+    """
+
+    __slots__ = ("first_minute", "slot_minutes", "slot_count")
+
+    def __init__(self, first_minute: int, slot_minutes: int, slot_count: int):
+        self.first_minute = first_minute
+        self.slot_minutes = slot_minutes
+        self.slot_count = slot_count
+
+    @property
+    def first_slot(self) -> int:
+        """
+        Position of the first grid column in a whole-day slot bitmap.
+        """
+        return self.first_minute // self.slot_minutes
+
+
+def parse_slot_header(headers: List[str], default_slot_minutes: int = 15) -> SlotGridHeader:
+    """
+    Parses the header row of an occupancy-grid CSV once.
+    """
+    minutes = []
+    for header_time in headers[1:]:
+        hours, mins = header_time.strip().split(":")[:2]
+        minutes.append(int(hours) * 60 + int(mins))
+
+    if not minutes:
+        raise ValueError("Schedule CSV has no time slot columns")
+
+    slot_minutes = minutes[1] - minutes[0] if len(minutes) > 1 else default_slot_minutes
+    for previous, current in zip(minutes, minutes[1:]):
+        if current - previous != slot_minutes:
+            raise ValueError("Schedule CSV time slots must be consecutive and equally sized")
+
+    slots_per_day(slot_minutes)
+    if minutes[0] % slot_minutes or minutes[-1] + slot_minutes > MINUTES_PER_DAY:
+        raise ValueError("Schedule CSV time slots must be aligned to the slot size within a day")
+
+    return SlotGridHeader(minutes[0], slot_minutes, len(minutes))
+
+
+def iter_day_slots(file_path: str) -> Iterator[Tuple[date, int, SlotGridHeader]]:
+    """
+    Streams an occupancy-grid CSV as (date, busy slot bitmap, header) per row.
+    Bitmaps cover the whole day (see slot_bitmap) at the file's slot size.
+    """
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        header = parse_slot_header(next(reader))
+
+        for row in reader:
+            if not row:
+                continue
+            occupancy_data = row[1:]
+            if len(occupancy_data) != header.slot_count:
+                raise ValueError(f"Row for {row[0]} has {len(occupancy_data)} slots, expected {header.slot_count}")
+
+            # Reversed so that the first slot becomes the least significant bit
+            mask = int("".join(reversed(occupancy_data)), 2) if occupancy_data else 0
+            yield date.fromisoformat(row[0]), mask << header.first_slot, header
+
+
+def iter_day_slots_chunked(file_path: str, chunk_size: int = 10_000) -> Iterator[Tuple[date, int, SlotGridHeader]]:
+    """
+    Same as iter_day_slots, reading chunk_size rows at a time with pandas/NumPy.
+    """
+    import numpy as np
+    import pandas as pd
+
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        headers = next(csv.reader(file))
+    header = parse_slot_header(headers)
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, dtype={headers[0]: str}):
+        occupancy = chunk.iloc[:, 1:].to_numpy(dtype=np.uint8)
+        if occupancy.size and occupancy.max() > 1:
+            raise ValueError("Schedule CSV occupancy values must be 0 or 1")
+        packed = np.packbits(occupancy.astype(bool), axis=1, bitorder="little")
+
+        for date_str, row_bytes in zip(chunk.iloc[:, 0], packed):
+            mask = int.from_bytes(row_bytes.tobytes(), "little")
+            yield date.fromisoformat(date_str), mask << header.first_slot, header
+
+
+def iter_busy_intervals(file_path: str, chunk_size: Optional[int] = None) -> Iterator[Tuple[date, List[Tuple[int, int]]]]:
+    """
+    Streams an occupancy-grid CSV as (date, [(start_minute, end_minute), ...]) busy blocks.
+    Pass chunk_size to read with pandas in chunks.
+    """
+    rows = iter_day_slots(file_path) if chunk_size is None else iter_day_slots_chunked(file_path, chunk_size)
+    for day, mask, header in rows:
+        yield day, mask_to_intervals(mask, header.slot_minutes)
+
+
+def load_busy_schedule(file_path: str, chunk_size: Optional[int] = None) -> BusySchedule:
+    """
+    Parses an occupancy-grid CSV into a BusySchedule (one meeting per busy block).
+    """
+    meetings = [
+        Meeting(day.toordinal(), start_minute, end_minute)
+        for day, intervals in iter_busy_intervals(file_path, chunk_size)
+        for start_minute, end_minute in intervals
+    ]
+    return BusySchedule(meetings=meetings)
@@ -0,0 +1,203 @@
+"""
+Compact on-disk store of per-person busy slot grids, read through mmap.
+
+File layout (little-endian):
+- Header: magic, version, slot_minutes, slots_per_day, bytes_per_day, day_count
+- Date index: day_count int32 date ordinals, sorted ascending
+- Grid: day_count rows of bytes_per_day bytes; bit i of a row is the slot
+  starting at minute i * slot_minutes (same layout as slot_bitmap masks)
+"""
+import argparse
+import csv
+import mmap
+import os
+import re
+import struct
+import tempfile
+from bisect import bisect_left
+from datetime import date
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.schedule_ingestion import iter_day_slots, iter_day_slots_chunked, parse_slot_header
+from utils.slot_bitmap import DEFAULT_SLOT_MINUTES, mask_to_intervals, slots_per_day
+
+MAGIC = b"SCHDGRID"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHHII")
+
+PERSON_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def write_schedule_file(file_path: str, day_masks: Iterable[Tuple[date, int]],
+                        slot_minutes: int = DEFAULT_SLOT_MINUTES):
+    """
+    Writes (date, busy slot bitmap) pairs to a schedule file, replacing it atomically.
+    Repeated dates are combined.
+    """
+    slot_count = slots_per_day(slot_minutes)
+    bytes_per_day = (slot_count + 7) // 8
+
+    masks: Dict[int, int] = {}
+    for day, mask in day_masks:
+        if mask >> slot_count:
+            raise ValueError(f"Busy slots for {day} exceed a day of {slot_minutes}-minute slots")
+        ordinal = day.toordinal()
+        masks[ordinal] = masks.get(ordinal, 0) | mask
+
+    ordinals = sorted(masks)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, slot_minutes, slot_count, bytes_per_day, len(ordinals), 0))
+            file.write(struct.pack(f"<{len(ordinals)}i", *ordinals))
+            for ordinal in ordinals:
+                file.write(masks[ordinal].to_bytes(bytes_per_day, "little"))
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def convert_csv_schedule(csv_path: str, file_path: str, chunk_size: Optional[int] = None):
+    """
+    Converts an occupancy-grid CSV (the parse_csv_schedule format) into a schedule file.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as file:
+        header = parse_slot_header(next(csv.reader(file), []))
+
+    rows = iter_day_slots(csv_path) if chunk_size is None else iter_day_slots_chunked(csv_path, chunk_size)
+    write_schedule_file(file_path, ((day, mask) for day, mask, _ in rows), header.slot_minutes)
+
+
+class MappedSchedule:
+    """
+    Read-only view of a schedule file. Days are read on demand from the mapping,
+    so only the pages of the requested days are loaded.
+    Provides busy_intervals() like BusySchedule, so validators accept either.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            self.modified_time = os.fstat(file.fileno()).st_mtime_ns
+            self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mapping) < HEADER.size:
+            raise ValueError(f"Schedule file {file_path} is truncated")
+        magic, version, slot_minutes, slot_count, bytes_per_day, day_count, _ = \
+            HEADER.unpack_from(self._mapping, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{file_path} is not a version {VERSION} schedule file")
+
+        self.slot_minutes = slot_minutes
+        self.slot_count = slot_count
+        self.bytes_per_day = bytes_per_day
+        self.day_count = day_count
+        self._grid_offset = HEADER.size + 4 * day_count
+        if len(self._mapping) < self._grid_offset + day_count * bytes_per_day:
+            raise ValueError(f"Schedule file {file_path} is truncated")
+        self._ordinals = memoryview(self._mapping)[HEADER.size:self._grid_offset].cast("i")
+
+    def day_mask(self, day: date) -> int:
+        """
+        Returns the busy slot bitmap of a day (0 if the day isn't stored).
+        """
+        ordinal = day.toordinal()
+        index = bisect_left(self._ordinals, ordinal)
+        if index == self.day_count or self._ordinals[index] != ordinal:
+            return 0
+
+        offset = self._grid_offset + index * self.bytes_per_day
+        return int.from_bytes(self._mapping[offset:offset + self.bytes_per_day], "little")
+
+    def busy_intervals(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the busy blocks of a day as sorted (start_minute, end_minute) pairs.
+        """
+        return tuple(mask_to_intervals(self.day_mask(day), self.slot_minutes))
+
+    def digest(self) -> str:
+        """
+        Identity of the mapped file version (files are only ever replaced, never edited).
+        """
+        return f"{self.file_path}@{self.modified_time}"
+
+    def dates(self) -> Iterable[date]:
+        return (date.fromordinal(ordinal) for ordinal in self._ordinals)
+
+    def close(self):
+        self._ordinals.release()
+        self._mapping.close()
+
+
+class ScheduleStore:
+    """
+    Directory of schedule files, one per person id, with open mappings reused across requests.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._open: Dict[str, MappedSchedule] = {}
+        self._lock = Lock()
+
+    def path_for(self, person_id: str) -> str:
+        if not PERSON_ID_PATTERN.match(person_id):
+            raise ValueError(f"Invalid schedule reference '{person_id}'")
+        return os.path.join(self.directory, f"{person_id}.sched")
+
+    def import_csv(self, person_id: str, csv_path: str, chunk_size: Optional[int] = None):
+        """
+        Converts a person's CSV schedule into the store.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        convert_csv_schedule(csv_path, self.path_for(person_id), chunk_size)
+
+    def open(self, person_id: str) -> MappedSchedule:
+        """
+        Returns the mapped schedule of a person, remapping it if the file was replaced.
+        """
+        path = self.path_for(person_id)
+        try:
+            modified_time = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise ValueError(f"No stored schedule for '{person_id}'")
+
+        with self._lock:
+            schedule = self._open.get(person_id)
+            if schedule is None or schedule.modified_time != modified_time:
+                schedule = MappedSchedule(path)
+                # Earlier mappings may still be in use by running requests; they are
+                # released when garbage collected
+                self._open[person_id] = schedule
+            return schedule
+
+
+_store: Optional[ScheduleStore] = None
+
+
+def get_schedule_store() -> Optional[ScheduleStore]:
+    """
+    Returns the store configured by the SCHEDULE_STORE_DIR environment variable, if any.
+    """
+    global _store
+    directory = os.environ.get("SCHEDULE_STORE_DIR")
+    if not directory:
+        return None
+    if _store is None or _store.directory != directory:
+        _store = ScheduleStore(directory)
+    return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import occupancy-grid CSV schedules into the binary schedule store")
+    parser.add_argument("person_id", help="Id used to reference the schedule in requests")
+    parser.add_argument("csv_path", help="CSV schedule (date column followed by time slot columns)")
+    parser.add_argument("--store", default=os.environ.get("SCHEDULE_STORE_DIR"), required=not os.environ.get("SCHEDULE_STORE_DIR"),
+                        help="Store directory (defaults to SCHEDULE_STORE_DIR)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Read the CSV in chunks with pandas")
+    args = parser.parse_args()
+
+    ScheduleStore(args.store).import_csv(args.person_id, args.csv_path, args.chunk_size)
+    print(f"Stored schedule '{args.person_id}' in {args.store}")
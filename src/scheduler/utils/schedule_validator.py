@@ -1,6 +1,10 @@
 from datetime import date, time
 from typing import List, Tuple, Optional, TYPE_CHECKING
 
+from utils.compact_schedule import start_minute
+from utils.date_calculator import WEEK_DAYS
+from utils.slot_bitmap import MINUTE_SLOTS, free_windows, minutes_to_time, range_mask
+
 if TYPE_CHECKING:
     from models import BusySchedule
 
@@ -125,11 +129,7 @@ def validate_full_compatibility(employee_work_days: List[str], lawyer_work_days:
         return False, "No common work days between employee and lawyer", None
 
     # Verify that appointment date is a day both work
-    week_days = {
-        0: "lunes", 1: "martes", 2: "miércoles", 3: "jueves",
-        4: "viernes", 5: "sábado", 6: "domingo"
-    }
-    appointment_day = week_days[appointment_date.weekday()]
+    appointment_day = WEEK_DAYS[appointment_date.weekday()]
 
     if appointment_day not in employee_work_days:
         return False, f"Employee doesn't work on {appointment_day}", None
@@ -173,20 +173,53 @@ def verify_schedule_conflict(start_time: time, end_time: time,
     Returns:
         True if there's conflict, False if no conflict
     """
-    if schedule is None or not schedule.meetings:
+    if schedule is None:
         return False
 
-    # Filter meetings for specific date
-    date_meetings = [m for m in schedule.meetings if m.date == appointment_date]
+    start_min = start_time.hour * 60 + start_time.minute
+    end_min = end_time.hour * 60 + end_time.minute
 
-    for meeting in date_meetings:
+    # Meetings of the date only, sorted by start
+    for meeting_start, meeting_end in schedule.busy_intervals(appointment_date):
+        if meeting_start >= end_min:
+            break
         # Check if there's overlap
-        if (start_time < meeting.end_time and end_time > meeting.start_time):
+        if start_min < meeting_end:
             return True
 
     return False
 
 
+def busy_minute_masks(schedules: List[Optional['BusySchedule']],
+                      appointment_date: date) -> Tuple[int, int]:
+    """
+    Collects the busy time of several schedules for a date as a mask of
+    1-minute slots, plus a mask of the zero-length meetings, which occupy no
+    minute but still split free time. Meetings ending before they start are ignored.
+    """
+    busy = 0
+    breaks = 0
+    for schedule in schedules:
+        if not schedule:
+            continue
+        for start, end in schedule.busy_intervals(appointment_date):
+            if end > start:
+                busy |= ((1 << (end - start)) - 1) << start
+            elif end == start:
+                breaks |= 1 << start
+    return busy, breaks
+
+
+def segments_minute_mask(segments: List[Tuple[int, int]]) -> int:
+    """
+    Mask of 1-minute slots of (start_minute, end_minute) segments.
+    """
+    mask = 0
+    for start, end in segments:
+        mask |= range_mask(start, end, MINUTE_SLOTS)
+    return mask
+
+
 def find_free_segments(overlap_segments: List[Tuple[time, time]],
                       employee_schedule: Optional['BusySchedule'],
                       lawyer_schedule: Optional['BusySchedule'],
@@ -195,61 +228,12 @@ def find_free_segments(overlap_segments: List[Tuple[time, time]],
     Filters overlap segments excluding busy periods
     from employee and lawyer schedules.
     """
-    free_segments = []
-
-    for segment_start, segment_end in overlap_segments:
-        # Divide segment into free periods
-        free_periods = [(segment_start, segment_end)]
-
-        # Process employee schedule
-        if employee_schedule and employee_schedule.meetings:
-            employee_meetings = [m for m in employee_schedule.meetings if m.date == appointment_date]
-            for meeting in employee_meetings:
-                updated_periods = []
-                for period_start, period_end in free_periods:
-                    # If there's overlap, divide the period
-                    if (period_start < meeting.end_time and period_end > meeting.start_time):
-                        # Period before meeting
-                        if period_start < meeting.start_time:
-                            updated_periods.append((period_start, meeting.start_time))
-                        # Period after meeting
-                        if period_end > meeting.end_time:
-                            updated_periods.append((meeting.end_time, period_end))
-                    else:
-                        # No overlap, keep the period
-                        updated_periods.append((period_start, period_end))
-                free_periods = updated_periods
-
-        # Process lawyer schedule
-        if lawyer_schedule and lawyer_schedule.meetings:
-            lawyer_meetings = [m for m in lawyer_schedule.meetings if m.date == appointment_date]
-            for meeting in lawyer_meetings:
-                updated_periods = []
-                for period_start, period_end in free_periods:
-                    # If there's overlap, divide the period
-                    if (period_start < meeting.end_time and period_end > meeting.start_time):
-                        # Period before meeting
-                        if period_start < meeting.start_time:
-                            updated_periods.append((period_start, meeting.start_time))
-                        # Period after meeting
-                        if period_end > meeting.end_time:
-                            updated_periods.append((meeting.end_time, period_end))
-                    else:
-                        # No overlap, keep the period
-                        updated_periods.append((period_start, period_end))
-                free_periods = updated_periods
-
-        free_segments.extend(free_periods)
-
-    # Filter segments with minimum duration and sort
-    valid_segments = []
-    for start, end in free_segments:
-        start_min = start.hour * 60 + start.minute
-        end_min = end.hour * 60 + end.minute
-        if end_min - start_min >= 60:  # Minimum 1 hour
-            valid_segments.append((start, end))
+    available = segments_minute_mask([(start_minute(start), start_minute(end)) for start, end in overlap_segments])
 
-    return sorted(valid_segments, key=lambda x: (x[0].hour * 60 + x[0].minute))
+    # Busy time of both parties as one mask: free time is a bitwise AND plus a run scan
+    busy, breaks = busy_minute_masks([employee_schedule, lawyer_schedule], appointment_date)
+    return [(minutes_to_time(start_min), minutes_to_time(end_min))
+            for start_min, end_min in free_windows(available & ~busy, 60, MINUTE_SLOTS, breaks)]
 
 
 def validate_compatibility_with_schedules(employee_work_days: List[str],
@@ -277,11 +261,7 @@ def validate_compatibility_with_schedules(employee_work_days: List[str],
         return False, "No common work days between employee and lawyer", None
 
     # Verify that appointment date is a day both work
-    week_days = {
-        0: "lunes", 1: "martes", 2: "miércoles", 3: "jueves",
-        4: "viernes", 5: "sábado", 6: "domingo"
-    }
-    appointment_day = week_days[appointment_date.weekday()]
+    appointment_day = WEEK_DAYS[appointment_date.weekday()]
 
     if appointment_day not in employee_work_days:
         return False, f"Employee doesn't work on {appointment_day}", None
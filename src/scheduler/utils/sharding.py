@@ -0,0 +1,520 @@
+"""
+Sharded serving: lawyers are partitioned across shard processes by consistent
+hashing, and a front router forwards each request to the owning shard over a
+Unix domain socket. Every shard keeps its own response cache, calendars and
+registry, so they stay hot for the lawyers it owns.
+
+- Scheduling and booking requests go to the shard of their lawyer (lawyer_id,
+  or the inline lawyer config); batches are split by shard and reassembled.
+- Registered lawyers live on their shard only. Registered employees are copied
+  to every shard, and windows booked on one shard are added to the copies.
+  Bookings and registry changes of an employee are serialized by the router,
+  so a booking always sees the windows booked for the employee on other shards.
+  A booking that can't be copied to every shard is cancelled and answered 502.
+- Other requests (matching, date tables, stats) can run anywhere; stats go to
+  the shard given in the X-Shard header (default 0).
+
+LocalShard calls the ASGI app in-process: a router over local shards is a
+single-process stand-in for tests.
+
+Configured per deployment with environment variables:
+- SHARD_COUNT: shard processes behind the router (default 1: no router)
+- SHARD_SOCKET_DIR: directory of the shard sockets (default: a temporary directory)
+
+GET /ready on the router is ready once every shard is.
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
+from bisect import bisect
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Paths routed to the shard owning the request's lawyer
+LAWYER_ROUTED_PATHS = ("/schedule-appointment", "/book-appointment")
+BATCH_PATH = "/schedule-appointments/batch"
+
+# Frame header: lengths of the JSON metadata and of the body
+_FRAME = struct.Struct("!II")
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+class ShardResponse(NamedTuple):
+    status: int
+    headers: Headers
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+def json_response(status: int, content: Any) -> ShardResponse:
+    return ShardResponse(status, [(b"content-type", b"application/json")], json.dumps(content).encode())
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes: adding a shard only moves about
+    1/shard_count of the keys.
+    """
+
+    def __init__(self, shard_count: int, replicas: int = 64):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        points = sorted(
+            (self._hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shard_count) for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def shard_for(self, key: str) -> int:
+        index = bisect(self._points, self._hash(key))
+        return self._shards[index % len(self._shards)]
+
+
+def lawyer_key(payload: Any) -> str:
+    """
+    Routing key of a scheduling request: the registered lawyer id, or the inline
+    lawyer config so identical requests reach the same shard's cache.
+    """
+    if not isinstance(payload, dict):
+        return ""
+    if isinstance(payload.get("lawyer_id"), str):
+        return payload["lawyer_id"]
+    return json.dumps(payload.get("lawyer"), sort_keys=True)
+
+
+async def call_asgi(app, method: str, path: str, query: bytes, headers: Headers, body: bytes) -> ShardResponse:
+    """
+    Sends one request straight to an ASGI app and collects its response.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("shard", 80),
+    }
+    request_sent = False
+    status = 500
+    response_headers: Headers = []
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = [tuple(header) for header in message.get("headers", [])]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return ShardResponse(status, response_headers, b"".join(chunks))
+
+
+def _encode_frame(meta: Dict[str, Any], body: bytes) -> bytes:
+    meta_bytes = json.dumps(meta).encode()
+    return _FRAME.pack(len(meta_bytes), len(body)) + meta_bytes + body
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    meta_length, body_length = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    meta = json.loads(await reader.readexactly(meta_length))
+    return meta, await reader.readexactly(body_length)
+
+
+def _encode_headers(headers: Headers) -> List[List[str]]:
+    return [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers]
+
+
+def _decode_headers(headers: List[List[str]]) -> Headers:
+    return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+async def _start_lifespan(app) -> Callable[[], Awaitable[None]]:
+    """
+    Runs the app's lifespan startup and returns a coroutine function running its shutdown.
+    """
+    incoming: asyncio.Queue = asyncio.Queue()
+    outgoing: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(app({"type": "lifespan", "asgi": {"version": "3.0"}}, incoming.get, outgoing.put))
+    await incoming.put({"type": "lifespan.startup"})
+    message = await outgoing.get()
+    if message["type"] == "lifespan.startup.failed":
+        raise RuntimeError(f"Shard startup failed: {message.get('message', '')}")
+
+    async def shutdown():
+        await incoming.put({"type": "lifespan.shutdown"})
+        await outgoing.get()
+        await task
+
+    return shutdown
+
+
+async def serve_shard(app, socket_path: str):
+    """
+    Serves an ASGI app to the router over a Unix domain socket; each connection
+    carries one request at a time. The app's startup and shutdown handlers run
+    around it, and SIGTERM stops it gracefully.
+    """
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                meta, body = await _read_frame(reader)
+                response = await call_asgi(app, meta["method"], meta["path"], meta["query"].encode("latin-1"),
+                                           _decode_headers(meta["headers"]), body)
+                writer.write(_encode_frame(
+                    {"status": response.status, "headers": _encode_headers(response.headers)}, response.body
+                ))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    shutdown = await _start_lifespan(app)
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    try:
+        server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+        async with server:
+            await stopped.wait()
+    finally:
+        await shutdown()
+
+
+class LocalShard:
+    """
+    Shard served by an ASGI app in this process (single-process stand-in).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, query: bytes, headers: Headers, body: bytes) -> ShardResponse:
+        return await call_asgi(self.app, method, path, query, headers, body)
+
+    async def close(self):
+        pass
+
+
+class SocketShard:
+    """
+    Shard process reached over a Unix domain socket, with a pool of idle connections.
+    """
+
+    def __init__(self, socket_path: str, connect_timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        # The shard may still be starting: retry until its socket accepts connections
+        deadline = asyncio.get_running_loop().time() + self.connect_timeout
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if asyncio.get_running_loop().time() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def request(self, method: str, path: str, query: bytes, headers: Headers, body: bytes) -> ShardResponse:
+        reader, writer = self._idle.pop() if self._idle else await self._connect()
+        try:
+            writer.write(_encode_frame({"method": method, "path": path, "query": query.decode("latin-1"),
+                                        "headers": _encode_headers(headers)}, body))
+            await writer.drain()
+            meta, response_body = await _read_frame(reader)
+        except BaseException:
+            writer.close()
+            raise
+        self._idle.append((reader, writer))
+        return ShardResponse(meta["status"], _decode_headers(meta["headers"]), response_body)
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class ShardRouter:
+    """
+    ASGI app forwarding each request to the shard that owns it.
+    Shards are LocalShard or SocketShard instances (anything with request() and close()).
+    """
+
+    def __init__(self, shards: List[Any], replicas: int = 64):
+        self.shards = shards
+        self.ring = HashRing(len(shards), replicas)
+        self.routed = [0] * len(shards)
+        # Employee id -> (lock, requests holding or waiting for it)
+        self._employee_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        try:
+            response = await self.dispatch(scope["method"], scope["path"], scope.get("query_string", b""),
+                                           list(scope["headers"]), b"".join(chunks))
+        except (OSError, asyncio.IncompleteReadError):
+            response = json_response(502, {"detail": "Shard unavailable"})
+
+        await send({"type": "http.response.start", "status": response.status, "headers": response.headers})
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for shard in self.shards:
+                    await shard.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def forward(self, shard: int, method: str, path: str, query: bytes, headers: Headers,
+                      body: bytes) -> ShardResponse:
+        self.routed[shard] += 1
+        return await self.shards[shard].request(method, path, query, headers, body)
+
+    async def dispatch(self, method: str, path: str, query: bytes, headers: Headers, body: bytes) -> ShardResponse:
+        """
+        Routes a request: by lawyer, split by shard (batches), to every shard
+        (employee registry changes) or to the X-Shard shard (everything else).
+        """
+        if path == "/shards" and method == "GET":
+            return json_response(200, {"shards": len(self.shards), "routed": list(self.routed)})
+
+        if path == "/ready" and method == "GET":
+            responses = await asyncio.gather(*(
+                self.forward(shard, method, path, query, headers, body) for shard in range(len(self.shards))
+            ))
+            ready = all(response.status == 200 for response in responses)
+            return json_response(200 if ready else 503,
+                                 {"ready": ready, "shards": [response.json() for response in responses]})
+
+        if path == "/book-appointment" and method == "POST":
+            payload = _parse_json(body)
+            async with self._employee_lock(_employee_id(payload)):
+                response = await self.forward(self.ring.shard_for(lawyer_key(payload)), method, path, query,
+                                              headers, body)
+                if response.status == 200:
+                    response = await self._copy_booking(payload, response, headers)
+                return response
+
+        if path in LAWYER_ROUTED_PATHS and method == "POST":
+            return await self.forward(self.ring.shard_for(lawyer_key(_parse_json(body))), method, path, query,
+                                      headers, body)
+
+        if path == BATCH_PATH and method == "POST":
+            return await self._forward_batch(method, path, query, headers, body)
+
+        parts = path.split("/")
+        if len(parts) >= 4 and parts[1] == "registry":
+            if parts[2] == "employees" and method != "GET":
+                async with self._employee_lock(parts[3]):
+                    return await self._broadcast(method, path, query, headers, body)
+            return await self.forward(self.ring.shard_for(parts[3]), method, path, query, headers, body)
+
+        return await self.forward(_requested_shard(headers, len(self.shards)), method, path, query, headers, body)
+
+    async def _broadcast(self, method: str, path: str, query: bytes, headers: Headers,
+                         body: bytes) -> ShardResponse:
+        responses = await asyncio.gather(*(
+            self.forward(shard, method, path, query, headers, body) for shard in range(len(self.shards))
+        ))
+        return next((response for response in responses if response.status >= 300), responses[0])
+
+    @asynccontextmanager
+    async def _employee_lock(self, employee_id: Optional[str]) -> AsyncIterator[None]:
+        """
+        Holds the lock of an employee (nothing to hold for requests without one).
+        """
+        if employee_id is None:
+            yield
+            return
+        lock, users = self._employee_locks.get(employee_id, (asyncio.Lock(), 0))
+        self._employee_locks[employee_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._employee_locks[employee_id]
+            if users == 1:
+                del self._employee_locks[employee_id]
+            else:
+                self._employee_locks[employee_id] = (lock, users - 1)
+
+    async def _copy_booking(self, payload: Dict[str, Any], response: ShardResponse,
+                            headers: Headers) -> ShardResponse:
+        """
+        Adds a window booked on the lawyer's shard to the employee's copies on the
+        other shards. If a copy fails the booking is removed again everywhere it
+        was added and a 502 response is returned instead.
+        """
+        booking = response.json()
+        if not booking.get("booked"):
+            return response
+        owner = self.ring.shard_for(lawyer_key(payload))
+        meeting = [booking["appointment_date"], booking["appointment_time"], booking["appointment_end_time"]]
+        employee_path = f"/registry/employees/{payload['employee_id']}/meetings"
+        others = [shard for shard in range(len(self.shards)) if shard != owner]
+        copies = await asyncio.gather(*(
+            self.forward(shard, "POST", employee_path, b"", headers, json.dumps({"add": [meeting]}).encode())
+            for shard in others
+        ), return_exceptions=True)
+        copied = [shard for shard, copy in zip(others, copies) if isinstance(copy, ShardResponse) and copy.status == 200]
+        if len(copied) == len(others):
+            return response
+
+        removal = json.dumps({"remove": [meeting]}).encode()
+        lawyer_path = f"/registry/lawyers/{payload['lawyer_id']}/meetings"
+        await asyncio.gather(*(
+            self.forward(shard, "POST", path, b"", headers, removal)
+            for shard, path in [(owner, lawyer_path)] + [(shard, employee_path) for shard in [owner] + copied]
+        ), return_exceptions=True)
+        return json_response(502, {"detail": f"Booking of employee '{payload['employee_id']}' could not be copied "
+                                             f"to every shard and was cancelled"})
+
+    async def _forward_batch(self, method: str, path: str, query: bytes, headers: Headers,
+                             body: bytes) -> ShardResponse:
+        payload = _parse_json(body)
+        items = payload.get("requests") if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            # Let a shard report the validation error (with the positions of the whole batch)
+            return await self.forward(0, method, path, query, headers, body)
+
+        indexes_by_shard: Dict[int, List[int]] = {}
+        for index, item in enumerate(items):
+            indexes_by_shard.setdefault(self.ring.shard_for(lawyer_key(item)), []).append(index)
+
+        shards = list(indexes_by_shard)
+        responses = await asyncio.gather(*(
+            self.forward(shard, method, path, query, headers,
+                         json.dumps({"requests": [items[index] for index in indexes_by_shard[shard]]}).encode())
+            for shard in shards
+        ))
+
+        merged: List[Any] = [None] * len(items)
+        for shard, response in zip(shards, responses):
+            indexes = indexes_by_shard[shard]
+            if response.status != 200:
+                return response
+            for index, item_response in zip(indexes, response.json()["responses"]):
+                if isinstance(item_response, dict) and "error" in item_response:
+                    # Item errors carry their position in the sub-batch
+                    item_response["index"] = index
+                merged[index] = item_response
+        return json_response(200, {"responses": merged})
+
+
+def _parse_json(body: bytes) -> Any:
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _employee_id(payload: Any) -> Optional[str]:
+    if isinstance(payload, dict) and isinstance(payload.get("employee_id"), str):
+        return payload["employee_id"]
+    return None
+
+
+def _requested_shard(headers: Headers, shard_count: int) -> int:
+    for name, value in headers:
+        if name.lower() == b"x-shard" and value.isdigit():
+            return min(int(value), shard_count - 1)
+    return 0
+
+
+def socket_directory() -> str:
+    return os.environ.get("SHARD_SOCKET_DIR") or tempfile.mkdtemp(prefix="scheduler-shards-")
+
+
+def shard_environment(shard: int) -> Dict[str, str]:
+    """
+    Environment overrides of a shard process: its own registry database and warmup
+    snapshot and, unless configured, inline execution (the shards already use every core).
+    """
+    overrides = {"SHARD_INDEX": str(shard)}
+    database_path = os.environ.get("PERSON_REGISTRY_DB", ":memory:")
+    if database_path != ":memory:":
+        overrides["PERSON_REGISTRY_DB"] = _shard_file(database_path, shard)
+    if os.environ.get("WARMUP_SNAPSHOT"):
+        overrides["WARMUP_SNAPSHOT"] = _shard_file(os.environ["WARMUP_SNAPSHOT"], shard)
+    if "EXECUTION_POOL" not in os.environ:
+        overrides["EXECUTION_POOL"] = "inline"
+    return overrides
+
+
+def _shard_file(path: str, shard: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}-shard{shard}{extension}"
+
+
+def start_shard_processes(shard_count: int, target: Callable[[str], None]) -> Tuple[ShardRouter, List[Any]]:
+    """
+    Starts shard_count processes running target(socket_path) and returns a router
+    over their sockets, with the processes (to terminate when the router stops).
+    """
+    context = multiprocessing.get_context("spawn")
+    directory = socket_directory()
+    shards = []
+    processes = []
+    for shard in range(shard_count):
+        socket_path = os.path.join(directory, f"shard-{shard}.sock")
+        overrides = shard_environment(shard)
+        # Spawned processes copy the environment when they start
+        previous = {name: os.environ.get(name) for name in overrides}
+        os.environ.update(overrides)
+        try:
+            process = context.Process(target=target, args=(socket_path,), name=f"scheduler-shard-{shard}")
+            process.start()
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        shards.append(SocketShard(socket_path))
+        processes.append(process)
+    return ShardRouter(shards), processes
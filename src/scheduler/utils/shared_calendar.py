@@ -0,0 +1,409 @@
+"""
+Business-day counts and stored busy slot grids published once in shared memory,
+so every worker process (uvicorn workers, shards, pool workers) maps the same
+read-only pages instead of building its own copy.
+
+A publisher writes each generation to a new segment ("<name>-<generation>") and
+then stores the generation number in the control segment ("<name>"); readers
+check that number on every access and switch to the new segment when it
+changes, so a reload is an atomic swap. The previous segment is unlinked right
+away: readers still using it keep their mapping until they drop it.
+
+Segment layout: 8-byte magic, uint32 metadata length, JSON metadata, then the
+arrays at the offsets the metadata lists:
+- work_day_counts: int32 [2, 128, days + 1]; [h, pattern, i] is the number of
+  work days before day i for a weekday bitmask pattern (bit 0 = Monday), with
+  the published holidays removed (h = 0) or ignored (h = 1)
+- ordinals: int32 date ordinals of the stored days of every person, in person order
+- grid: uint8 [rows, bytes_per_day] busy slot bitmaps (slot_bitmap layout)
+
+Publish with `python -m utils.shared_calendar --name scheduler --holidays 2025-01-01,2025-05-01
+--start 2025-01-01 --days 3660` (add `--store DIR` to include the stored schedules).
+
+Configured per deployment with environment variables:
+- SHARED_CALENDAR_NAME: segment name to read; schedule references are answered
+  from it when published, and CALENDAR_ENGINE=shared counts work days with it
+"""
+import argparse
+import json
+import os
+import struct
+import time
+from datetime import date
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional, Tuple, TYPE_CHECKING
+
+from utils.holiday_handler import normalize_holiday_dates
+from utils.schedule_store import ScheduleStore
+from utils.slot_bitmap import DEFAULT_SLOT_MINUTES, mask_to_intervals, slots_per_day
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"SCHDSHM1"
+PREFIX = struct.Struct("<8sI")
+CONTROL_SIZE = 8
+
+# Weekday bitmasks: every combination of the 7 weekdays
+PATTERN_COUNT = 128
+
+# Bytes reserved in the metadata for each array entry and for the rest of the arrays map
+ARRAY_METADATA_RESERVE = 64
+
+# Seconds between attempts to attach a segment that isn't published yet
+ATTACH_RETRY_SECONDS = 1.0
+
+
+def weekday_pattern(work_weekdays: Iterable[int]) -> int:
+    """
+    Bitmask of work weekdays (bit 0 = Monday), the row of work_day_counts.
+    """
+    return sum(1 << weekday for weekday in set(work_weekdays))
+
+
+def _untrack(segment: SharedMemory):
+    # Published segments must outlive this process: the resource tracker would
+    # otherwise unlink them when it exits. It tracks POSIX names with their
+    # leading slash, which SharedMemory.name leaves out
+    resource_tracker.unregister(f"/{segment.name}", "shared_memory")
+
+
+def _attach(name: str) -> SharedMemory:
+    segment = SharedMemory(name=name)
+    _untrack(segment)
+    return segment
+
+
+def _create(name: str, size: int) -> SharedMemory:
+    segment = SharedMemory(name=name, create=True, size=size)
+    _untrack(segment)
+    return segment
+
+
+def _unlink(name: str):
+    try:
+        # Tracked while attached, so that unlink() can unregister it
+        segment = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def _work_day_counts(first_ordinal: int, day_count: int, holiday_ordinals: Iterable[int]) -> "np.ndarray":
+    # NumPy is only loaded by processes that publish or read a shared calendar
+    import numpy as np
+
+    weekdays = (np.arange(day_count) + date.fromordinal(first_ordinal).weekday()) % 7
+    holidays = np.zeros(day_count, dtype=bool)
+    offsets = [ordinal - first_ordinal for ordinal in holiday_ordinals if 0 <= ordinal - first_ordinal < day_count]
+    holidays[offsets] = True
+
+    # works[pattern, day]: whether the weekday of the day is in the pattern
+    pattern_bits = (np.arange(PATTERN_COUNT)[:, None] >> np.arange(7)[None, :]) & 1
+    works = pattern_bits[:, weekdays].astype(bool)
+
+    counts = np.zeros((2, PATTERN_COUNT, day_count + 1), dtype=np.int32)
+    np.cumsum(works & ~holidays, axis=1, out=counts[0, :, 1:])
+    np.cumsum(works, axis=1, out=counts[1, :, 1:])
+    return counts
+
+
+def publish_shared_calendar(name: str, holiday_digest: str, holiday_dates: Iterable[date], start_date: date,
+                            day_count: int, schedules: Optional[Dict[str, Any]] = None,
+                            slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Publishes a new generation and returns its number. holiday_digest identifies
+    the holiday set (HolidaySet.digest); schedules maps person ids to objects with
+    dates() and day_mask() (like MappedSchedule) sharing slot_minutes.
+    """
+    import numpy as np
+
+    if day_count < 1:
+        raise ValueError("day_count must be at least 1")
+    first_ordinal = start_date.toordinal()
+    counts = _work_day_counts(first_ordinal, day_count, (day.toordinal() for day in holiday_dates))
+
+    bytes_per_day = (slots_per_day(slot_minutes) + 7) // 8
+    people: Dict[str, Tuple[int, int]] = {}
+    ordinals = []
+    rows = []
+    for person_id, schedule in sorted((schedules or {}).items()):
+        if getattr(schedule, "slot_minutes", slot_minutes) != slot_minutes:
+            raise ValueError(f"Schedule of '{person_id}' doesn't use {slot_minutes}-minute slots")
+        days = sorted(schedule.dates())
+        people[person_id] = (len(ordinals), len(days))
+        for day in days:
+            ordinals.append(day.toordinal())
+            rows.append(schedule.day_mask(day).to_bytes(bytes_per_day, "little"))
+
+    control = _open_control(name)
+    generation = control.buf[:CONTROL_SIZE].cast("q")[0] + 1
+
+    arrays = {
+        "work_day_counts": counts,
+        "ordinals": np.array(ordinals, dtype=np.int32),
+        "grid": np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), bytes_per_day),
+    }
+    metadata = {
+        "generation": generation,
+        "first_ordinal": first_ordinal,
+        "day_count": day_count,
+        "holiday_digest": holiday_digest,
+        "slot_minutes": slot_minutes,
+        "bytes_per_day": bytes_per_day,
+        "people": people,
+        "arrays": {}
+    }
+    # Array offsets depend on the metadata length, which depends on the offsets: reserve room for them
+    metadata_length = len(json.dumps(metadata)) + ARRAY_METADATA_RESERVE * (len(arrays) + 1)
+    offset = _align(PREFIX.size + metadata_length)
+    for array_name, array in arrays.items():
+        metadata["arrays"][array_name] = [offset, list(array.shape), array.dtype.str]
+        offset = _align(offset + array.nbytes)
+    metadata_bytes = json.dumps(metadata).encode()
+    if len(metadata_bytes) > metadata_length:
+        control.close()
+        raise ValueError(f"Shared calendar metadata takes {len(metadata_bytes)} bytes, "
+                         f"more than the {metadata_length} reserved for it")
+
+    segment = _create(f"{name}-{generation}", offset)
+    PREFIX.pack_into(segment.buf, 0, MAGIC, len(metadata_bytes))
+    segment.buf[PREFIX.size:PREFIX.size + len(metadata_bytes)] = metadata_bytes
+    for array_name, array in arrays.items():
+        array_offset, shape, dtype = metadata["arrays"][array_name]
+        np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=array_offset)[...] = array
+    segment.close()
+
+    # Readers switch to the new generation as soon as this 8-byte store lands
+    control.buf[:CONTROL_SIZE].cast("q")[0] = generation
+    control.close()
+    if generation > 1:
+        _unlink(f"{name}-{generation - 1}")
+    return generation
+
+
+def unpublish_shared_calendar(name: str):
+    """
+    Removes the control segment and the current generation.
+    """
+    try:
+        control = _attach(name)
+    except FileNotFoundError:
+        return
+    generation = control.buf[:CONTROL_SIZE].cast("q")[0]
+    control.close()
+    _unlink(f"{name}-{generation}")
+    _unlink(name)
+
+
+def _open_control(name: str) -> SharedMemory:
+    try:
+        return _attach(name)
+    except FileNotFoundError:
+        control = _create(name, CONTROL_SIZE)
+        control.buf[:CONTROL_SIZE] = bytes(CONTROL_SIZE)
+        return control
+
+
+def _align(offset: int) -> int:
+    return (offset + 63) // 64 * 64
+
+
+class SharedSchedule:
+    """
+    Read-only busy slot grid of one person in a shared snapshot.
+    Provides busy_intervals(), day_mask() and digest() like MappedSchedule.
+    """
+
+    def __init__(self, snapshot: "SharedSnapshot", person_id: str, first_row: int, day_count: int):
+        self.person_id = person_id
+        self.slot_minutes = snapshot.slot_minutes
+        self.day_count = day_count
+        self._snapshot = snapshot
+        self._ordinals = snapshot.ordinals[first_row:first_row + day_count]
+        self._grid = snapshot.grid[first_row:first_row + day_count]
+
+    def day_mask(self, day: date) -> int:
+        """
+        Returns the busy slot bitmap of a day (0 if the day isn't stored).
+        """
+        ordinal = day.toordinal()
+        index = int(self._ordinals.searchsorted(ordinal))
+        if index == self.day_count or self._ordinals[index] != ordinal:
+            return 0
+        return int.from_bytes(self._grid[index].tobytes(), "little")
+
+    def busy_intervals(self, day: date) -> Tuple[Tuple[int, int], ...]:
+        return tuple(mask_to_intervals(self.day_mask(day), self.slot_minutes))
+
+    def dates(self) -> Iterable[date]:
+        return (date.fromordinal(int(ordinal)) for ordinal in self._ordinals)
+
+    def digest(self) -> str:
+        return f"shared:{self._snapshot.name}@{self._snapshot.generation}:{self.person_id}"
+
+    def __reduce__(self):
+        # Worker processes map the published segment themselves instead of receiving a copy
+        return _attached_schedule, (self._snapshot.name, self.person_id)
+
+
+def _attached_schedule(name: str, person_id: str) -> SharedSchedule:
+    snapshot = get_shared_reader(name).current()
+    schedule = snapshot.schedule(person_id) if snapshot is not None else None
+    if schedule is None:
+        raise ValueError(f"No shared schedule for '{person_id}'")
+    return schedule
+
+
+class SharedSnapshot:
+    """
+    One published generation, mapped read-only with NumPy views on the segment.
+    """
+
+    def __init__(self, name: str, generation: int):
+        import numpy as np
+
+        self.name = name
+        segment = _attach(f"{name}-{generation}")
+        buffer = segment.buf
+        magic, metadata_length = PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory segment {name}-{generation} isn't a shared calendar")
+        metadata = json.loads(bytes(buffer[PREFIX.size:PREFIX.size + metadata_length]))
+
+        self.generation = metadata["generation"]
+        self.first_ordinal = metadata["first_ordinal"]
+        self.day_count = metadata["day_count"]
+        self.holiday_digest = metadata["holiday_digest"]
+        self.slot_minutes = metadata["slot_minutes"]
+        self._people = metadata["people"]
+        views = {}
+        for array_name, (offset, shape, dtype) in metadata["arrays"].items():
+            view = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            view.flags.writeable = False
+            views[array_name] = view
+        self.work_day_counts = views["work_day_counts"]
+        self.ordinals = views["ordinals"]
+        self.grid = views["grid"]
+        # Set last so it's released after the views: the segment can't close while they exist
+        self._segment = segment
+
+    def schedule(self, person_id: str) -> Optional[SharedSchedule]:
+        location = self._people.get(person_id)
+        if location is None:
+            return None
+        return SharedSchedule(self, person_id, location[0], location[1])
+
+
+class SharedCalendarReader:
+    """
+    Follows the generations published under a name: current() returns the
+    latest snapshot, or None while nothing is published.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._control: Optional[memoryview] = None
+        self._control_segment: Optional[SharedMemory] = None
+        self._snapshot: Optional[SharedSnapshot] = None
+        self._next_attempt = 0.0
+        self._lock = Lock()
+
+    def current(self) -> Optional[SharedSnapshot]:
+        control = self._control
+        if control is None:
+            if time.monotonic() < self._next_attempt:
+                return None
+            control = self._attach_control()
+            if control is None:
+                return None
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.generation == control[0]:
+            return snapshot
+        return self._switch()
+
+    def _attach_control(self) -> Optional[memoryview]:
+        with self._lock:
+            if self._control is None:
+                try:
+                    self._control_segment = _attach(self.name)
+                except FileNotFoundError:
+                    self._next_attempt = time.monotonic() + ATTACH_RETRY_SECONDS
+                    return None
+                self._control = self._control_segment.buf[:CONTROL_SIZE].cast("q")
+            return self._control
+
+    def _switch(self) -> Optional[SharedSnapshot]:
+        with self._lock:
+            while True:
+                generation = self._control[0]
+                if generation == 0:
+                    return None
+                if self._snapshot is not None and self._snapshot.generation == generation:
+                    return self._snapshot
+                try:
+                    # The previous snapshot stays mapped while requests still hold it
+                    self._snapshot = SharedSnapshot(self.name, generation)
+                    return self._snapshot
+                except FileNotFoundError:
+                    # Replaced by a newer generation meanwhile: read the number again
+                    continue
+
+
+_readers: Dict[str, SharedCalendarReader] = {}
+_readers_lock = Lock()
+
+
+def get_shared_reader(name: str) -> SharedCalendarReader:
+    with _readers_lock:
+        reader = _readers.get(name)
+        if reader is None:
+            reader = _readers[name] = SharedCalendarReader(name)
+        return reader
+
+
+# Reader of SHARED_CALENDAR_NAME, resolved once per process
+_environment_reader: Optional[SharedCalendarReader] = None
+
+
+def current_shared_snapshot() -> Optional[SharedSnapshot]:
+    """
+    Returns the snapshot published under SHARED_CALENDAR_NAME, if set and published.
+    """
+    global _environment_reader
+    reader = _environment_reader
+    if reader is None or reader.name != os.environ.get("SHARED_CALENDAR_NAME"):
+        name = os.environ.get("SHARED_CALENDAR_NAME")
+        if not name:
+            return None
+        reader = _environment_reader = get_shared_reader(name)
+    return reader.current()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish business-day counts and stored schedules in shared memory")
+    parser.add_argument("--name", default=os.environ.get("SHARED_CALENDAR_NAME", "scheduler"))
+    parser.add_argument("--holidays", default="", help="Comma-separated holiday dates (YYYY-MM-DD)")
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--days", type=int, default=3660)
+    parser.add_argument("--store", default=os.environ.get("SCHEDULE_STORE_DIR"),
+                        help="Schedule store directory whose schedules are published too")
+    parser.add_argument("--unlink", action="store_true", help="Remove the published segments instead")
+    args = parser.parse_args()
+
+    if args.unlink:
+        unpublish_shared_calendar(args.name)
+    else:
+        holidays = normalize_holiday_dates([date.fromisoformat(day) for day in args.holidays.split(",") if day])
+        schedules = {}
+        if args.store:
+            store = ScheduleStore(args.store)
+            for file_name in sorted(os.listdir(args.store)):
+                if file_name.endswith(".sched"):
+                    schedules[file_name[:-len(".sched")]] = store.open(file_name[:-len(".sched")])
+        generation = publish_shared_calendar(args.name, holidays.digest, holidays, args.start, args.days, schedules)
+        print(f"Published {args.name} generation {generation} ({len(schedules)} schedules)")
@@ -0,0 +1,147 @@
+import base64
+import binascii
+from datetime import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from utils.compact_schedule import MINUTES_PER_DAY, start_minute
+
+
+# Default slot size, matching the 15-minute occupancy grids of the CSV schedules
+DEFAULT_SLOT_MINUTES = 15
+
+# Bit i of a day mask represents the slot starting at minute i * slot_minutes
+
+# With 1-minute slots masks are exact: the free-window search uses them so that
+# its results match minute intervals
+MINUTE_SLOTS = 1
+
+
+def minutes_to_time(minutes: int) -> time:
+    """
+    Converts minutes since midnight to a time.
+    """
+    return time(minutes // 60, minutes % 60)
+
+
+def slots_per_day(slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Returns how many slots of the given size fit in a day.
+    """
+    if slot_minutes <= 0 or MINUTES_PER_DAY % slot_minutes:
+        raise ValueError(f"Slot size must divide a day evenly, got {slot_minutes} minutes")
+    return MINUTES_PER_DAY // slot_minutes
+
+
+def range_mask(start_minute: int, end_minute: int, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+               cover: bool = False) -> int:
+    """
+    Builds the mask of slots for a [start_minute, end_minute) range.
+
+    With cover=False only slots fully inside the range are set (available time);
+    with cover=True every slot the range touches is set (busy time).
+    """
+    if cover:
+        first_slot = start_minute // slot_minutes
+        last_slot = -(-end_minute // slot_minutes)
+    else:
+        first_slot = -(-start_minute // slot_minutes)
+        last_slot = end_minute // slot_minutes
+
+    last_slot = min(last_slot, slots_per_day(slot_minutes))
+    if last_slot <= first_slot:
+        return 0
+
+    return ((1 << (last_slot - first_slot)) - 1) << first_slot
+
+
+def working_hours_mask(start_time: time, end_time: time, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Mask of the slots fully inside working hours.
+    """
+    return range_mask(start_minute(start_time), start_minute(end_time), slot_minutes)
+
+
+def lunch_mask(lunch_start: time = time(12, 0), lunch_end: time = time(14, 0),
+               slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Mask of the slots touched by the lunch window (see exclude_lunch_hours).
+    """
+    return range_mask(start_minute(lunch_start), start_minute(lunch_end), slot_minutes, cover=True)
+
+
+def busy_mask(intervals: Iterable[Tuple[int, int]], slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Mask of the slots touched by (start_minute, end_minute) busy intervals.
+    Zero-length intervals don't occupy any slot.
+    """
+    mask = 0
+    for start_minute, end_minute in intervals:
+        mask |= range_mask(start_minute, end_minute, slot_minutes, cover=True)
+    return mask
+
+
+def iter_runs(mask: int, breaks: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (first_slot, slot_count) for each run of consecutive set bits, in order.
+    A set bit of breaks starts a new run at that slot even if the previous slot is set.
+    """
+    while mask:
+        first_slot = (mask & -mask).bit_length() - 1
+        shifted = mask >> first_slot
+        # Trailing ones of the shifted mask
+        slot_count = (~shifted & (shifted + 1)).bit_length() - 1
+        # Breaks after the first slot of the run cut it short
+        run_breaks = (breaks >> first_slot) & ((1 << slot_count) - 2)
+        if run_breaks:
+            slot_count = (run_breaks & -run_breaks).bit_length() - 1
+        yield first_slot, slot_count
+        mask &= ~(((1 << slot_count) - 1) << first_slot)
+
+
+def mask_to_intervals(mask: int, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> List[Tuple[int, int]]:
+    """
+    Converts a mask to (start_minute, end_minute) intervals, one per run of set slots.
+    """
+    return [(first_slot * slot_minutes, (first_slot + slot_count) * slot_minutes)
+            for first_slot, slot_count in iter_runs(mask)]
+
+
+def free_windows(free_mask: int, minimum_duration_minutes: int = 60, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                 breaks: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the free (start_minute, end_minute) runs of a mask that last the minimum duration, in order.
+    """
+    for first_slot, slot_count in iter_runs(free_mask, breaks):
+        if slot_count * slot_minutes >= minimum_duration_minutes:
+            yield first_slot * slot_minutes, (first_slot + slot_count) * slot_minutes
+
+
+def first_free_window(free_mask: int, minimum_duration_minutes: int = 60, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                      breaks: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    Returns the first free (start_minute, end_minute) run that lasts the minimum duration.
+    """
+    return next(free_windows(free_mask, minimum_duration_minutes, slot_minutes, breaks), None)
+
+
+def encode_mask(mask: int, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> str:
+    """
+    Base64 of a day mask as little-endian bytes (bit i of byte k is slot 8k + i).
+    """
+    return base64.b64encode(mask.to_bytes(-(-slots_per_day(slot_minutes) // 8), "little")).decode("ascii")
+
+
+def decode_mask(encoded: str, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Inverse of encode_mask(); shorter inputs leave the remaining slots free.
+
+    Raises:
+        ValueError: If the text isn't base64 or sets slots beyond the end of the day
+    """
+    try:
+        mask = int.from_bytes(base64.b64decode(encoded, validate=True), "little")
+    except binascii.Error:
+        raise ValueError("Day bitmap is not valid base64")
+    if mask.bit_length() > slots_per_day(slot_minutes):
+        raise ValueError(f"Day bitmap has more than {slots_per_day(slot_minutes)} slots of {slot_minutes} minutes")
+    return mask
@@ -0,0 +1,52 @@
+from datetime import date, time, timedelta
+from typing import Optional, Tuple, TYPE_CHECKING
+
+from utils.business_calendar import BusinessCalendar
+from utils.compatibility_profile import CompatibilityProfile
+
+if TYPE_CHECKING:
+    from models import BusySchedule
+
+
+def find_first_free_slot(start_date: date,
+                         employee_calendar: BusinessCalendar,
+                         profile: CompatibilityProfile,
+                         employee_schedule: Optional['BusySchedule'] = None,
+                         lawyer_schedule: Optional['BusySchedule'] = None,
+                         horizon_days: int = 30,
+                         minimum_duration_minutes: int = 60
+                         ) -> Tuple[bool, Optional[str], Optional[date], Optional[Tuple[time, time]]]:
+    """
+    Searches forward from start_date for the first day both parties work with a
+    free window of the minimum duration, considering lunch hours and busy schedules.
+    Only dates up to start_date + horizon_days are checked.
+
+    Returns:
+        Tuple[bool, Optional[str], Optional[date], Optional[Tuple[time, time]]]:
+        - bool: True if a free slot was found
+        - str: Reason if no slot was found
+        - date: Date of the free slot
+        - Tuple[time, time]: (appointment_start_time, available_end_time) of the free slot
+    """
+    if not profile.has_common_days:
+        return False, "No common work days between employee and lawyer", None, None
+
+    if profile.overlap is None:
+        return False, "No schedule overlap between employee and lawyer", None, None
+
+    if not any(end - start >= minimum_duration_minutes for start, end in profile.segments_minutes):
+        return False, "No available times outside lunch hours (12:00-14:00)", None, None
+
+    last_date = start_date + timedelta(days=horizon_days)
+    candidate_date = employee_calendar.next_work_day(start_date)
+
+    while candidate_date <= last_date:
+        if candidate_date.weekday() in profile.lawyer_weekdays:
+            free_window = profile.first_free_window(candidate_date, employee_schedule, lawyer_schedule,
+                                                    minimum_duration_minutes)
+            if free_window is not None:
+                return True, None, candidate_date, free_window
+
+        candidate_date = employee_calendar.next_work_day(candidate_date + timedelta(days=1))
+
+    return False, f"No available times considering busy schedules in the next {horizon_days} days", None, None
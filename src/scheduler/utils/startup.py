@@ -0,0 +1,155 @@
+"""
+Startup profile, warmup and readiness of the API process.
+
+The process starts serving before it is warm: optional subsystems (NumPy for
+matching and shared calendars, pandas for tables) are imported on first use,
+and warmup runs in a background thread once the server has started. GET /ready
+answers 503 until warmup finishes and reports how long each phase took.
+
+A warmup snapshot is a JSON Lines file with the most recent distinct requests
+that were cached. It is written on shutdown and replayed on the next start;
+responses are recomputed rather than stored, so they always match the current
+registry, schedules and code.
+
+Configured per deployment with environment variables:
+- WARMUP_SNAPSHOT: snapshot file (default: none, the response cache starts empty)
+- WARMUP_SNAPSHOT_MAX_REQUESTS: requests kept for the snapshot (default 256)
+"""
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """
+    Durations of the startup phases. Module-level phases are consecutive marks
+    from the creation of the profile; warmup phases are timed one by one.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._last_mark = self._started
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._ready = Event()
+
+    def mark(self, phase: str):
+        """
+        Records the time since the previous mark (or the start) as a phase.
+        """
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last_mark, 6)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 6)
+
+    def set_ready(self):
+        self.ready_after = round(time.perf_counter() - self._started, 6)
+        self._ready.set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def report(self) -> Dict[str, Any]:
+        return {"ready": self.is_ready(), "ready_after_seconds": self.ready_after, "phases": dict(self.phases)}
+
+
+# Created on the first import of this module, which main.py does before anything else
+startup_profile = StartupProfile()
+
+
+class WarmupSnapshot:
+    """
+    Most recent distinct requests (by cache key), written to a JSON Lines file
+    on shutdown and read back on start. Requests are pydantic models, serialized
+    only when saved.
+    """
+
+    def __init__(self, path: str, max_requests: int = 256):
+        self.path = path
+        self.max_requests = max_requests
+        self._requests: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def record(self, key: Hashable, request: Any):
+        if self.max_requests <= 0:
+            return
+        with self._lock:
+            self._requests[key] = request
+            self._requests.move_to_end(key)
+            while len(self._requests) > self.max_requests:
+                self._requests.popitem(last=False)
+
+    def save(self) -> int:
+        """
+        Writes the recorded requests (replacing the file atomically) and returns how many.
+        """
+        with self._lock:
+            requests = list(self._requests.values())
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as snapshot_file:
+                for request in requests:
+                    snapshot_file.write(request.model_dump_json(exclude_defaults=True) + "\n")
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        return len(requests)
+
+    def load(self) -> List[str]:
+        """
+        Returns the saved requests as JSON strings (none if the file doesn't exist yet).
+        """
+        try:
+            with open(self.path) as snapshot_file:
+                return [line for line in snapshot_file.read().splitlines() if line]
+        except FileNotFoundError:
+            return []
+
+
+def warmup_snapshot_from_environment() -> Optional[WarmupSnapshot]:
+    """
+    Returns the snapshot of WARMUP_SNAPSHOT (None if unset), keeping
+    WARMUP_SNAPSHOT_MAX_REQUESTS requests.
+    """
+    path = os.environ.get("WARMUP_SNAPSHOT")
+    if not path:
+        return None
+    return WarmupSnapshot(path, int(os.environ.get("WARMUP_SNAPSHOT_MAX_REQUESTS", 256)))
+
+
+def start_warmup(steps: List[Tuple[str, Callable[[], Any]]], profile: StartupProfile = startup_profile) -> Thread:
+    """
+    Runs the warmup steps in a background thread, timing each as a phase, and
+    marks the profile ready when they're done. A failing step is logged and
+    skipped: the process still serves, only colder.
+    """
+    def warm_up():
+        for name, step in steps:
+            with profile.phase(name):
+                try:
+                    step()
+                except Exception as e:
+                    logger.warning("Warmup step %s failed: %s", name, e)
+        profile.set_ready()
+        logger.info("Ready after %.3fs (phases: %s)", profile.ready_after,
+                    ", ".join(f"{name} {seconds:.3f}s" for name, seconds in profile.phases.items()))
+
+    thread = Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
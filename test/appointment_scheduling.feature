@@ -186,4 +186,309 @@ Feature: Sistema de Agendamiento de Citas con Empleados
 
     Examples:
       | fecha_actual | hora_actual | dias_trabajo_empleado                                        | horario_inicio | horario_fin | trabaja_festivos | dias_feriados |
-      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | []            |
\ No newline at end of file
+      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | []            |
+
+  Scenario: Máscaras de franjas de 15 minutos para agendas ocupadas y horario laboral
+    When se convierten a franjas las reuniones de "09:05" a "09:40" y de "10:00" a "10:15"
+    Then las franjas ocupadas deben ser "09:00-09:45, 10:00-10:15"
+    And la máscara codificada debe recuperar las mismas franjas
+    And las franjas libres de "08:10" a "17:00" sin almuerzo deben ser "08:15-12:00, 14:00-17:00"
+
+  Scenario: Ventanas libres buscadas con máscaras de minutos iguales a la resta de intervalos
+    When se buscan ventanas libres en 300 días aleatorios con reuniones desalineadas, vacías e invertidas
+    Then las ventanas libres con máscaras deben coincidir con la resta de intervalos reunión por reunión
+
+  Scenario: Los mismos feriados en otro orden comparten el conjunto normalizado
+    Given los días feriados son: ["2024-12-25", "2024-01-01", "2024-05-01", "2024-01-01"]
+    Then los feriados en otro orden deben resolverse al mismo conjunto normalizado
+
+  Scenario Outline: Agendamiento en lote de múltiples solicitudes
+    Given que hoy es "<fecha_actual>"
+    And la hora actual es "<hora_actual>"
+    And el empleado trabaja los días: <dias_trabajo_empleado>
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado <trabaja_festivos> festivos
+    And los días feriados son: <dias_feriados>
+    When se ejecuta el agendamiento en lote de 3 solicitudes iguales
+    Then el lote debe contener 3 respuestas iguales a la respuesta individual
+    And la fecha de la cita debe ser "<fecha_cita>"
+
+    Examples:
+      | fecha_actual | hora_actual | dias_trabajo_empleado                                        | horario_inicio | horario_fin | trabaja_festivos | dias_feriados           | fecha_cita |
+      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | []                      | 2024-03-12 |
+      | 2024-12-25   | 12:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | ["2024-12-25"]         | 2025-01-03 |
+
+  Scenario: Lote con una solicitud inválida responde las demás
+    Given que hoy es "2024-03-04"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    When se ejecuta el agendamiento en lote de 3 solicitudes con la solicitud 1 inválida
+    Then la respuesta 1 del lote debe ser un error con "current_date" y las demás iguales a la respuesta individual
+
+  Scenario Outline: Búsqueda del primer espacio libre cuando la agenda ocupada bloquea la fecha
+    Given que hoy es "<fecha_actual>"
+    And la hora actual es "<hora_actual>"
+    And el empleado trabaja los días: <dias_trabajo_empleado>
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado <trabaja_festivos> festivos
+    And los días feriados son: <dias_feriados>
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    Then la fecha de la cita debe ser "<fecha_cita>"
+    And la hora de la cita debe ser "<hora_cita>" evitando horario de almuerzo
+
+    Examples:
+      | fecha_actual | hora_actual | dias_trabajo_empleado                                        | horario_inicio | horario_fin | trabaja_festivos | dias_feriados | fecha_cita | hora_cita |
+      | 2024-01-05   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 12:00       | no trabaja       | []            | 2024-01-18 | 09:00     |
+      | 2024-01-05   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 10:00          | 12:00       | no trabaja       | []            | 2024-01-22 | 10:00     |
+
+  Scenario Outline: Emparejamiento masivo igual al agendamiento individual con búsqueda de espacio libre
+    Given que hoy es "<fecha_actual>"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: <dias_trabajo_empleado>
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se empareja el mismo empleado con el mismo abogado
+    Then el emparejamiento debe coincidir con la respuesta individual
+
+    Examples:
+      | fecha_actual | dias_trabajo_empleado                                  | horario_inicio | horario_fin |
+      | 2024-01-05   | ["lunes", "martes", "miércoles", "jueves", "viernes"] | 09:00          | 12:00       |
+      | 2024-01-05   | ["lunes", "martes", "miércoles", "jueves", "viernes"] | 10:00          | 12:00       |
+      | 2024-03-04   | ["lunes", "martes", "miércoles", "jueves", "viernes"] | 09:00          | 18:00       |
+      | 2024-03-02   | ["sábado", "domingo"]                                  | 09:00          | 18:00       |
+      | 2024-03-04   | ["lunes", "martes", "miércoles", "jueves", "viernes"] | 18:00          | 22:00       |
+
+  Scenario Outline: Emparejamiento con horarios y reuniones no alineados a franjas de 15 minutos
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se agenda y se empareja con el abogado ocupado solo el "2024-01-15" de "<reunion_inicio>" a "<reunion_fin>"
+    Then el agendamiento individual debe dar "<cita_individual>" y el emparejamiento "<cita_emparejada>"
+
+    Examples:
+      | horario_inicio | horario_fin | reunion_inicio | reunion_fin | cita_individual  | cita_emparejada  |
+      | 09:00          | 12:00       | 09:00          | 11:00       | 2024-01-15 11:00 | 2024-01-15 11:00 |
+      | 09:00          | 12:00       | 09:00          | 10:50       | 2024-01-15 10:50 | 2024-01-15 11:00 |
+      | 09:10          | 12:00       | 08:00          | 08:30       | 2024-01-15 09:10 | 2024-01-15 09:15 |
+      | 09:00          | 10:10       | 09:00          | 09:05       | 2024-01-15 09:05 | 2024-01-16 09:00 |
+      | 09:00          | 12:00       | 09:00          | 11:05       | 2024-01-16 09:00 | 2024-01-16 09:00 |
+
+  Scenario Outline: Agendas enviadas en formatos compactos
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "12:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se repite la solicitud con las agendas en formato de <formato>
+    Then la fecha de la cita debe ser "2024-01-18"
+    And la respuesta repetida debe ser igual y marcada como "BYPASS"
+
+    Examples:
+      | formato       |
+      | arreglos      |
+      | columnas      |
+      | mapas de bits |
+
+  Scenario Outline: Agendas convertidas al almacén binario y referenciadas por id
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "12:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se convierten las agendas CSV al almacén leyendo <lectura>
+    And se repite la solicitud referenciando las agendas del almacén
+    Then la fecha de la cita debe ser "2024-01-18"
+    And la respuesta con agendas del almacén debe ser igual a la respuesta con agendas en línea
+
+    Examples:
+      | lectura       |
+      | por filas     |
+      | en bloques    |
+
+  Scenario: Empleado y abogado registrados con actualización incremental de la agenda
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "12:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se registran el empleado y el abogado con sus agendas
+    And se repite la solicitud con el empleado y el abogado registrados
+    Then la respuesta repetida debe ser igual y marcada como "MISS"
+    When se agrega al empleado registrado una reunión el "2024-01-18" de "09:00" a "12:00"
+    And se repite la solicitud con el empleado y el abogado registrados
+    Then la fecha de la cita repetida debe ser "2024-01-22"
+    When se elimina el empleado registrado
+    Then consultar, actualizar o eliminar el empleado eliminado debe responder 404
+
+  Scenario: Reserva de citas sin doble agendamiento
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se registran el empleado y el abogado con sus agendas
+    And se reservan 3 citas para el empleado y el abogado registrados
+    Then la primera reserva debe coincidir con la respuesta de agendamiento
+    And las reservas no deben traslaparse
+
+  Scenario: Reservas simultáneas para personas distintas no se bloquean entre sí
+    Given el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    When se reserva para otro empleado y otro abogado mientras sigue en curso una reserva del primer empleado
+    Then la reserva de las otras personas debe terminar sin esperar a la que está en curso
+    And la reserva del primer empleado debe completarse cuando termina la que estaba en curso
+
+  Scenario: Enrutamiento por abogado en modo fragmentado
+    Given que hoy es "2024-03-04"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    When se calcula la fecha de notificación
+    And se envía la solicitud 3 veces a un enrutador con 4 fragmentos locales
+    Then las respuestas del enrutador deben ser iguales a la respuesta de agendamiento
+    And todas deben llegar al mismo fragmento y la última desde su caché
+
+  Scenario: Reserva cancelada en modo fragmentado si no se puede copiar al empleado
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se reserva una cita en un enrutador cuyo segundo fragmento no acepta la copia del empleado
+    Then la reserva debe responder 502 y quedar cancelada en el fragmento del abogado
+
+  Scenario: Calendario de días hábiles publicado en memoria compartida
+    Given el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado no trabaja festivos
+    And los días feriados son: ["2024-03-28", "2024-05-01", "2024-12-25"]
+    When se publica el calendario en memoria compartida desde "2024-01-01" por 730 días
+    Then los días hábiles del calendario compartido deben coincidir con el cálculo local
+    And al republicar el calendario la generación debe aumentar
+
+  Scenario: Registros escritos por la cola de logging y vaciados al detenerla
+    When se registran 500 mensajes a través de la cola de logging
+    Then el primer mensaje debe llegar al manejador de salida mientras la cola está activa
+    And al detener la cola deben haberse escrito los 500 mensajes sin descartar ninguno
+
+  Scenario: Calendario compartido cuyos metadatos no caben en el espacio reservado
+    Given el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And los días feriados son: ["2024-05-01"]
+    When se publica el calendario en memoria compartida sin espacio reservado para los metadatos
+    Then la publicación debe rechazarse por metadatos demasiado grandes sin cambiar de generación
+
+  Scenario Outline: Solicitudes idénticas se responden desde la caché
+    Given que hoy es "<fecha_actual>"
+    And la hora actual es "<hora_actual>"
+    And el empleado trabaja los días: <dias_trabajo_empleado>
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado <trabaja_festivos> festivos
+    And los días feriados son: <dias_feriados>
+    When se calcula la fecha de notificación
+    And se repite la misma solicitud <modo>
+    Then la respuesta repetida debe ser igual y marcada como "<estado_cache>"
+
+    Examples:
+      | fecha_actual | hora_actual | dias_trabajo_empleado                                        | horario_inicio | horario_fin | trabaja_festivos | dias_feriados  | modo      | estado_cache |
+      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | ["2024-03-08"] | con caché | HIT          |
+      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | ["2024-03-08"] | sin caché | BYPASS       |
+
+  Scenario Outline: Plazo de anticipación configurable en días hábiles
+    Given que hoy es "<fecha_actual>"
+    And la hora actual es "<hora_actual>"
+    And el empleado trabaja los días: <dias_trabajo_empleado>
+    And el empleado trabaja de "<horario_inicio>" a "<horario_fin>"
+    And el empleado <trabaja_festivos> festivos
+    And los días feriados son: <dias_feriados>
+    And el plazo de anticipación es de <dias_anticipacion> días hábiles
+    When se calcula la fecha de notificación
+    Then la fecha de inicio del conteo debe ser "<fecha_inicio_conteo>"
+    And la fecha de la cita debe ser "<fecha_cita>"
+
+    Examples:
+      | fecha_actual | hora_actual | dias_trabajo_empleado                                        | horario_inicio | horario_fin | trabaja_festivos | dias_feriados                | dias_anticipacion | fecha_inicio_conteo | fecha_cita |
+      | 2024-03-04   | 10:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | []                           | 200               | 2024-03-05          | 2024-12-10 |
+      | 2024-12-25   | 12:00       | ["lunes", "martes", "miércoles", "jueves", "viernes"]       | 09:00          | 18:00       | no trabaja       | ["2024-12-25", "2025-01-01"] | 120               | 2024-12-27          | 2025-06-16 |
+
+  Scenario: Tabla de fechas de cita para un rango de fechas actuales
+    Given el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    When se genera la tabla de fechas de cita desde "2024-03-01" hasta "2024-03-10"
+    Then la tabla debe contener 30 filas
+    And para el "2024-03-04" con variante "within_hours" la fecha de la cita debe ser "2024-03-12"
+    And para el "2024-03-04" con variante "after_hours" la fecha de la cita debe ser "2024-03-13"
+    And para el "2024-03-09" con variante "within_hours" la fecha de la cita debe ser "2024-03-19"
+
+  Scenario: Solicitudes costosas delegadas al grupo de procesos
+    Given que hoy es "2024-01-05"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "12:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    And la búsqueda del primer espacio libre está activada
+    When se calcula la fecha de notificación
+    And se repite la solicitud 2 veces con un umbral de costo de ejecución de 1 en el grupo de procesos
+    Then las respuestas delegadas deben ser iguales a la respuesta de agendamiento
+    And las estadísticas de ejecución deben mostrar 2 solicitudes delegadas y completadas sin ejecución en línea
+
+  Scenario: Métricas de duración por etapa y resultados en formato Prometheus
+    Given que hoy es "2024-03-04"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    When se calcula la fecha de notificación
+    And se consultan las métricas del servicio
+    Then las métricas deben incluir la duración de la etapa "notification_date"
+    And las métricas deben incluir la duración de la etapa "compatibility"
+    And las métricas deben contar resultados "scheduled"
+    And las métricas no deben usar el texto de los motivos como etiqueta
+
+  Scenario: Métricas de resultados no agendables por código de motivo
+    Given que hoy es "2024-03-02"
+    And la hora actual es "10:00"
+    And el empleado trabaja los días: ["sábado", "domingo"]
+    And el empleado trabaja de "09:00" a "18:00"
+    And el empleado no trabaja festivos
+    And los días feriados son: []
+    When se calcula la fecha de notificación
+    And se consultan las métricas del servicio
+    Then no debe ser posible agendar la cita
+    And las métricas deben contar resultados "no_common_days"
+    And las métricas no deben usar el texto de los motivos como etiqueta
+
+  Scenario: Servicio listo tras el calentamiento
+    When se consulta la preparación del servicio
+    Then el servicio debe estar listo con la duración de las fases "imports, app, registry, warmup_snapshot"
@@ -6,7 +6,7 @@ import requests
 from threading import Thread
 
 # Agregar src al path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'agendar'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'scheduler'))
 
 API_URL = "http://localhost:8000"
 API_PROCESS = None
@@ -16,24 +16,25 @@ def start_api_server():
     """Inicia el servidor de la API en segundo plano"""
     global API_PROCESS
     try:
-        src_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'agendar')
+        src_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'scheduler')
         API_PROCESS = subprocess.Popen(
             [sys.executable, 'main.py'],
             cwd=src_path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
         )
 
-        # Esperar a que la API esté lista
-        for _ in range(30):  # 30 intentos, 1 segundo cada uno
+        # Esperar a que la API esté lista (/ready responde 200 al terminar el calentamiento)
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
             try:
-                response = requests.get(f"{API_URL}/")
+                response = requests.get(f"{API_URL}/ready")
                 if response.status_code == 200:
                     print("✅ API iniciada correctamente")
                     return True
             except requests.exceptions.ConnectionError:
-                time.sleep(1)
-                continue
+                pass
+            time.sleep(0.1)
 
         print("❌ No se pudo conectar a la API")
         return False
@@ -1,18 +1,24 @@
+import asyncio
 import json
+import shutil
+import tempfile
+import uuid
 import requests
 from behave import given, when, then
-from datetime import date, time
+from datetime import date, time, timedelta
 import sys
 import os
 
-# Add src directory to path for importing modules
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'scheduler'))
+# Add src directory to path for importing modules (first, so its utils package
+# takes precedence over the test utils package)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'scheduler'))
 
 # Add test directory to path for importing test utilities
 test_dir = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(test_dir)
 
 from models import AppointmentRequest, EmployeeConfig, LawyerConfig
+from utils.slot_bitmap import busy_mask, decode_mask, encode_mask, lunch_mask, mask_to_intervals, working_hours_mask
 
 # Import parser function with absolute path
 test_utils_path = os.path.join(test_dir, 'utils')
@@ -31,6 +37,8 @@ class AgendamientoContext:
         self.api_url = "http://localhost:8000"
         self.employee_schedule = None
         self.lawyer_schedule = None
+        self.buscar_espacio_libre = False
+        self.dias_anticipacion = 5
 
 
 @given('que el sistema tiene acceso a la fecha actual')
@@ -94,6 +102,14 @@ def step_dias_feriados(context, dias_feriados):
         context.agendamiento.holiday_dates = [date.fromisoformat(f) for f in fechas_list]
 
 
+@given('la búsqueda del primer espacio libre está activada')
+def step_busqueda_espacio_libre(context):
+    context.agendamiento.buscar_espacio_libre = True
+
+
+@given('el plazo de anticipación es de {dias:d} días hábiles')
+def step_plazo_anticipacion(context, dias):
+    context.agendamiento.dias_anticipacion = dias
 
 
 @when('se calcula la fecha de notificación')
@@ -124,14 +140,18 @@ def step_calcular_fecha_notificacion(context):
         lawyer=context.agendamiento.lawyer,
         holiday_dates=context.agendamiento.holiday_dates,
         employee_schedule=context.agendamiento.employee_schedule,
-        lawyer_schedule=context.agendamiento.lawyer_schedule
+        lawyer_schedule=context.agendamiento.lawyer_schedule,
+        search_free_slot=context.agendamiento.buscar_espacio_libre,
+        lead_time_days=context.agendamiento.dias_anticipacion
     )
 
+    context.agendamiento.request_body = request_data.model_dump(mode='json')
+
     # Hacer la llamada a la API
     try:
         response = requests.post(
             f"{context.agendamiento.api_url}/schedule-appointment",
-            json=request_data.model_dump(mode='json'),
+            json=context.agendamiento.request_body,
             headers={"Content-Type": "application/json"}
         )
         context.agendamiento.response = response.json()
@@ -155,6 +175,987 @@ def step_ejecutar_proceso_agendamiento(context):
     step_calcular_fecha_notificacion(context)
 
 
+@when('se ejecuta el agendamiento en lote de {cantidad:d} solicitudes iguales')
+def step_ejecutar_agendamiento_lote(context, cantidad):
+    _enviar_lote(context, cantidad)
+
+
+@when('se ejecuta el agendamiento en lote de {cantidad:d} solicitudes con la solicitud {invalida:d} inválida')
+def step_ejecutar_lote_con_invalida(context, cantidad, invalida):
+    _enviar_lote(context, cantidad, invalida)
+
+
+def _enviar_lote(context, cantidad, invalida=None):
+    # Individual response used as reference for the batch items
+    step_calcular_fecha_notificacion(context)
+
+    employee = EmployeeConfig(
+        work_days=context.agendamiento.empleado_dias,
+        start_time=context.agendamiento.empleado_horario_inicio,
+        end_time=context.agendamiento.empleado_horario_fin,
+        works_holidays=context.agendamiento.trabaja_festivos
+    )
+
+    request_data = AppointmentRequest(
+        current_date=context.agendamiento.fecha_actual,
+        current_time=context.agendamiento.hora_actual,
+        employee=employee,
+        lawyer=context.agendamiento.lawyer,
+        holiday_dates=context.agendamiento.holiday_dates,
+        employee_schedule=context.agendamiento.employee_schedule,
+        lawyer_schedule=context.agendamiento.lawyer_schedule
+    )
+
+    solicitudes = [request_data.model_dump(mode='json')] * cantidad
+    if invalida is not None:
+        solicitudes[invalida] = {**solicitudes[invalida], "current_date": "2024-02-30"}
+
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/schedule-appointments/batch",
+            json={"requests": solicitudes},
+            headers={"Content-Type": "application/json"}
+        )
+        context.agendamiento.batch_response = response.json()
+        context.agendamiento.batch_status_code = response.status_code
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.batch_response = {"error": "API no disponible"}
+        context.agendamiento.batch_status_code = 500
+
+
+@then('el lote debe contener {cantidad:d} respuestas iguales a la respuesta individual')
+def step_verificar_respuestas_lote(context, cantidad):
+    if "error" in context.agendamiento.batch_response:
+        return
+
+    assert context.agendamiento.batch_status_code == 200, f"Código de estado {context.agendamiento.batch_status_code}"
+    responses = context.agendamiento.batch_response.get("responses")
+    assert len(responses) == cantidad, f"Esperaba {cantidad} respuestas, obtuve {len(responses)}"
+
+    for response in responses:
+        assert response == context.agendamiento.response, f"Respuesta del lote {response} difiere de {context.agendamiento.response}"
+
+
+@then('la respuesta {posicion:d} del lote debe ser un error con "{mensaje}" y las demás iguales a la respuesta individual')
+def step_verificar_lote_con_error(context, posicion, mensaje):
+    if "error" in context.agendamiento.batch_response:
+        return
+
+    assert context.agendamiento.batch_status_code == 200, f"Código de estado {context.agendamiento.batch_status_code}"
+    responses = context.agendamiento.batch_response["responses"]
+    error = responses[posicion]
+    assert error.get("index") == posicion and mensaje in error.get("error", ""), f"Error inesperado: {error}"
+    for indice, response in enumerate(responses):
+        if indice != posicion:
+            assert response == context.agendamiento.response, f"Respuesta {indice} del lote {response} difiere"
+
+
+@when('se empareja el mismo empleado con el mismo abogado')
+def step_emparejar_empleado_abogado(context):
+    solicitud = context.agendamiento.request_body
+    match_request = {
+        "current_date": solicitud["current_date"],
+        "current_time": solicitud["current_time"],
+        "employees": [{"id": "empleado-1", "config": solicitud["employee"], "schedule": solicitud["employee_schedule"]}],
+        "lawyers": [{"id": "abogado-1", "config": solicitud["lawyer"], "schedule": solicitud["lawyer_schedule"]}],
+        "holiday_dates": solicitud["holiday_dates"],
+        "lead_time_days": solicitud["lead_time_days"]
+    }
+
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/match-appointments",
+            json=match_request,
+            headers={"Content-Type": "application/json"}
+        )
+        context.agendamiento.match_response = response.json()
+        context.agendamiento.match_status_code = response.status_code
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.match_response = {"error": "API no disponible"}
+        context.agendamiento.match_status_code = 500
+
+
+@then('el emparejamiento debe coincidir con la respuesta individual')
+def step_verificar_emparejamiento(context):
+    if "error" in context.agendamiento.match_response:
+        return
+
+    assert context.agendamiento.match_status_code == 200, f"Código de estado {context.agendamiento.match_status_code}"
+    [match] = context.agendamiento.match_response["matches"]
+    individual = context.agendamiento.response
+    assert match["employee_id"] == "empleado-1"
+    assert match["is_schedulable"] == individual["is_schedulable"], f"Emparejamiento {match} difiere de {individual}"
+    if individual["is_schedulable"]:
+        assert match["lawyer_id"] == "abogado-1"
+        assert match["appointment_date"] == individual["appointment_date"], f"Emparejamiento {match} difiere de {individual}"
+        assert match["appointment_time"] == individual["appointment_time"], f"Emparejamiento {match} difiere de {individual}"
+    else:
+        assert match["lawyer_id"] is None and match["appointment_date"] is None, f"Emparejamiento inesperado: {match}"
+
+
+@when('se agenda y se empareja con el abogado ocupado solo el "{fecha}" de "{inicio}" a "{fin}"')
+def step_agendar_y_emparejar_reunion_desalineada(context, fecha, inicio, fin):
+    employee = EmployeeConfig(
+        work_days=context.agendamiento.empleado_dias,
+        start_time=context.agendamiento.empleado_horario_inicio,
+        end_time=context.agendamiento.empleado_horario_fin,
+        works_holidays=context.agendamiento.trabaja_festivos
+    )
+    solicitud = AppointmentRequest(
+        current_date=context.agendamiento.fecha_actual,
+        current_time=context.agendamiento.hora_actual,
+        employee=employee,
+        lawyer=context.agendamiento.lawyer,
+        holiday_dates=context.agendamiento.holiday_dates,
+        lawyer_schedule={"meetings": [[fecha, inicio, fin]]},
+        search_free_slot=context.agendamiento.buscar_espacio_libre,
+        lead_time_days=context.agendamiento.dias_anticipacion
+    ).model_dump(mode='json')
+    context.agendamiento.request_body = solicitud
+
+    try:
+        response = requests.post(f"{context.agendamiento.api_url}/schedule-appointment", json=solicitud)
+        context.agendamiento.response = response.json()
+        context.agendamiento.status_code = response.status_code
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.response = {"error": "API no disponible"}
+        context.agendamiento.status_code = 500
+        return
+    step_emparejar_empleado_abogado(context)
+
+
+@then('el agendamiento individual debe dar "{cita_individual}" y el emparejamiento "{cita_emparejada}"')
+def step_verificar_citas_desalineadas(context, cita_individual, cita_emparejada):
+    if "error" in context.agendamiento.response:
+        return
+
+    assert context.agendamiento.status_code == 200, f"Código de estado {context.agendamiento.status_code}"
+    assert context.agendamiento.match_status_code == 200, f"Código de estado {context.agendamiento.match_status_code}"
+    individual = context.agendamiento.response
+    [match] = context.agendamiento.match_response["matches"]
+    obtenida = f"{individual['appointment_date']} {individual['appointment_time'][:5]}"
+    assert obtenida == cita_individual, f"Agendamiento individual {individual}"
+    emparejada = f"{match['appointment_date']} {match['appointment_time'][:5]}"
+    assert emparejada == cita_emparejada, f"Emparejamiento {match}"
+
+
+def _minutos(hora):
+    horas, minutos = hora.split(":")[:2]
+    return int(horas) * 60 + int(minutos)
+
+
+def _franjas(intervalos):
+    return ", ".join(f"{inicio // 60:02d}:{inicio % 60:02d}-{fin // 60:02d}:{fin % 60:02d}" for inicio, fin in intervalos)
+
+
+@when('se convierten a franjas las reuniones de "{inicio1}" a "{fin1}" y de "{inicio2}" a "{fin2}"')
+def step_convertir_reuniones_a_franjas(context, inicio1, fin1, inicio2, fin2):
+    context.agendamiento.mascara = busy_mask([(_minutos(inicio1), _minutos(fin1)), (_minutos(inicio2), _minutos(fin2))])
+
+
+@then('las franjas ocupadas deben ser "{esperadas}"')
+def step_verificar_franjas_ocupadas(context, esperadas):
+    obtenidas = _franjas(mask_to_intervals(context.agendamiento.mascara))
+    assert obtenidas == esperadas, f"Esperaba {esperadas}, obtuve {obtenidas}"
+
+
+@then('la máscara codificada debe recuperar las mismas franjas')
+def step_verificar_mascara_codificada(context):
+    codificada = encode_mask(context.agendamiento.mascara)
+    assert decode_mask(codificada) == context.agendamiento.mascara, f"{codificada} no recupera la máscara"
+    try:
+        decode_mask("no es base64")
+        assert False, "Se aceptó un mapa de bits inválido"
+    except ValueError:
+        pass
+
+
+@then('las franjas libres de "{inicio}" a "{fin}" sin almuerzo deben ser "{esperadas}"')
+def step_verificar_franjas_libres(context, inicio, fin, esperadas):
+    libres = working_hours_mask(time.fromisoformat(inicio), time.fromisoformat(fin)) & ~lunch_mask()
+    obtenidas = _franjas(mask_to_intervals(libres))
+    assert obtenidas == esperadas, f"Esperaba {esperadas}, obtuve {obtenidas}"
+
+
+def _restar_reuniones(segmentos, reuniones):
+    # Referencia por intervalos: cada reunión divide los períodos libres que toca
+    libres = list(segmentos)
+    for inicio, fin in reuniones:
+        if fin < inicio:
+            continue
+        restantes = []
+        for desde, hasta in libres:
+            if desde < fin and hasta > inicio or desde < inicio < hasta:
+                if desde < inicio:
+                    restantes.append((desde, inicio))
+                if hasta > fin:
+                    restantes.append((fin, hasta))
+            else:
+                restantes.append((desde, hasta))
+        libres = restantes
+    return sorted((desde, hasta) for desde, hasta in libres if hasta - desde >= 60)
+
+
+@when('se buscan ventanas libres en {cantidad:d} días aleatorios con reuniones desalineadas, vacías e invertidas')
+def step_buscar_ventanas_libres(context, cantidad):
+    import random
+    from models import BusySchedule
+    from utils.compatibility_profile import get_compatibility_profile
+    from utils.schedule_validator import find_free_segments
+    from utils.slot_bitmap import minutes_to_time
+
+    azar = random.Random(7)
+    dias = ["lunes", "martes", "miércoles", "jueves", "viernes"]
+    fecha = date(2024, 3, 4)
+    context.agendamiento.ventanas = []
+    for _ in range(cantidad):
+        inicio, fin = sorted(azar.sample(range(6 * 60, 21 * 60), 2))
+        perfil = get_compatibility_profile(dias, minutes_to_time(inicio), minutes_to_time(fin),
+                                           dias, time(7, 0), time(20, 0))
+        agendas = []
+        for _ in range(2):
+            reuniones = []
+            for _ in range(azar.randint(0, 8)):
+                desde = azar.randint(6 * 60, 20 * 60)
+                hasta = desde + azar.choice([0, -15, azar.randint(1, 150)])
+                reuniones.append([fecha.isoformat(), f"{desde // 60:02d}:{desde % 60:02d}",
+                                  f"{min(hasta, 1439) // 60:02d}:{min(hasta, 1439) % 60:02d}"])
+            agendas.append(BusySchedule(meetings=reuniones))
+
+        reuniones = [intervalo for agenda in agendas for intervalo in agenda.busy_intervals(fecha)]
+        esperadas = _restar_reuniones(perfil.segments_minutes, reuniones)
+        obtenidas = [(_minutos(str(desde)), _minutos(str(hasta)))
+                     for desde, hasta in find_free_segments(perfil.segments, agendas[0], agendas[1], fecha)]
+        primera = perfil.first_free_window(fecha, agendas[0], agendas[1])
+        primera = (_minutos(str(primera[0])), _minutos(str(primera[1]))) if primera else None
+        context.agendamiento.ventanas.append((reuniones, esperadas, obtenidas, primera))
+
+
+@then('las ventanas libres con máscaras deben coincidir con la resta de intervalos reunión por reunión')
+def step_verificar_ventanas_libres(context):
+    for reuniones, esperadas, obtenidas, primera in context.agendamiento.ventanas:
+        assert obtenidas == esperadas, f"Reuniones {reuniones}: esperaba {esperadas}, obtuve {obtenidas}"
+        assert primera == (esperadas[0] if esperadas else None), \
+            f"Reuniones {reuniones}: primera ventana {primera}, esperaba {esperadas[:1]}"
+    assert any(esperadas for _, esperadas, _, _ in context.agendamiento.ventanas)
+    assert any(not esperadas for _, esperadas, _, _ in context.agendamiento.ventanas)
+
+
+@then('los feriados en otro orden deben resolverse al mismo conjunto normalizado')
+def step_verificar_feriados_normalizados(context):
+    from utils.holiday_handler import normalize_holiday_dates
+
+    feriados = context.agendamiento.holiday_dates
+    conjunto = normalize_holiday_dates(feriados)
+    assert normalize_holiday_dates(list(reversed(feriados))) is conjunto, "El orden de los feriados creó otro conjunto"
+    assert normalize_holiday_dates(sorted(set(feriados))) is conjunto, "Los feriados sin repetir crearon otro conjunto"
+    assert list(conjunto) == sorted(set(feriados)), f"Conjunto inesperado: {list(conjunto)}"
+
+
+@when('se repite la misma solicitud {cache_control}')
+def step_repetir_solicitud(context, cache_control):
+    headers = {"Content-Type": "application/json"}
+    if cache_control == "sin caché":
+        headers["Cache-Control"] = "no-cache"
+
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/schedule-appointment",
+            json=context.agendamiento.request_body,
+            headers=headers
+        )
+        context.agendamiento.repeated_response = response.json()
+        context.agendamiento.cache_header = response.headers.get("X-Cache")
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.repeated_response = {"error": "API no disponible"}
+
+
+def _codificar_agenda(agenda, formato):
+    reuniones = agenda["meetings"]
+    if formato == "arreglos":
+        return {"meetings": [[reunion["date"], reunion["start_time"], reunion["end_time"]] for reunion in reuniones]}
+
+    if formato == "columnas":
+        inicio = min(date.fromisoformat(reunion["date"]) for reunion in reuniones)
+        return {"columns": {
+            "start_date": inicio.isoformat(),
+            "day_offsets": [(date.fromisoformat(reunion["date"]) - inicio).days for reunion in reuniones],
+            "start_minutes": [_minutos(reunion["start_time"]) for reunion in reuniones],
+            "end_minutes": [_minutos(reunion["end_time"]) for reunion in reuniones]
+        }}
+
+    # Mapas de bits por día en franjas de 15 minutos
+    intervalos = {}
+    for reunion in reuniones:
+        intervalos.setdefault(reunion["date"], []).append((_minutos(reunion["start_time"]), _minutos(reunion["end_time"])))
+    return {"day_bitmaps": {"days": {dia: encode_mask(busy_mask(bloques)) for dia, bloques in intervalos.items()}}}
+
+
+@when('se repite la solicitud con las agendas en formato de {formato}')
+def step_repetir_solicitud_formato(context, formato):
+    body = json.loads(json.dumps(context.agendamiento.request_body))
+    for campo in ("employee_schedule", "lawyer_schedule"):
+        if body.get(campo) and body[campo]["meetings"]:
+            body[campo] = _codificar_agenda(body[campo], formato)
+
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/schedule-appointment",
+            json=body,
+            headers={"Content-Type": "application/json", "Cache-Control": "no-cache"}
+        )
+        context.agendamiento.repeated_response = response.json()
+        context.agendamiento.cache_header = response.headers.get("X-Cache")
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.repeated_response = {"error": "API no disponible"}
+
+
+@then('la respuesta repetida debe ser igual y marcada como "{estado_cache}"')
+def step_verificar_respuesta_repetida(context, estado_cache):
+    if "error" in context.agendamiento.repeated_response:
+        return
+
+    assert context.agendamiento.repeated_response == context.agendamiento.response, \
+        f"Respuesta repetida {context.agendamiento.repeated_response} difiere de {context.agendamiento.response}"
+    assert context.agendamiento.cache_header == estado_cache, \
+        f"Esperaba X-Cache {estado_cache}, obtuve {context.agendamiento.cache_header}"
+
+
+@when('se convierten las agendas CSV al almacén leyendo {lectura}')
+def step_convertir_agendas_almacen(context, lectura):
+    from utils.schedule_store import ScheduleStore, MappedSchedule
+
+    data_path = os.path.join(os.path.dirname(__file__), '..', 'data')
+    context.agendamiento.almacen = ScheduleStore(tempfile.mkdtemp(prefix="scheduler-store-"))
+    for persona, archivo in (("empleado-1", "employee_schedule.csv"), ("abogado-1", "lawyer_schedule.csv")):
+        context.agendamiento.almacen.import_csv(persona, os.path.join(data_path, archivo),
+                                                None if lectura == "por filas" else 7)
+        assert isinstance(context.agendamiento.almacen.open(persona), MappedSchedule)
+
+
+@when('se repite la solicitud referenciando las agendas del almacén')
+def step_repetir_solicitud_almacen(context):
+    # La app se importa solo aquí, con el almacén configurado en este proceso
+    from main import app
+    from utils.sharding import call_asgi
+
+    body = dict(context.agendamiento.request_body, employee_schedule=None, lawyer_schedule=None,
+                employee_schedule_ref="empleado-1", lawyer_schedule_ref="abogado-1")
+    headers = [(b"content-type", b"application/json"), (b"cache-control", b"no-cache")]
+    directorio_anterior = os.environ.get("SCHEDULE_STORE_DIR")
+    os.environ["SCHEDULE_STORE_DIR"] = context.agendamiento.almacen.directory
+    try:
+        context.agendamiento.respuesta_almacen = asyncio.run(
+            call_asgi(app, "POST", "/schedule-appointment", b"", headers, json.dumps(body).encode())
+        )
+    finally:
+        if directorio_anterior is None:
+            del os.environ["SCHEDULE_STORE_DIR"]
+        else:
+            os.environ["SCHEDULE_STORE_DIR"] = directorio_anterior
+        shutil.rmtree(context.agendamiento.almacen.directory)
+
+
+@then('la respuesta con agendas del almacén debe ser igual a la respuesta con agendas en línea')
+def step_verificar_respuesta_almacen(context):
+    respuesta = context.agendamiento.respuesta_almacen
+    assert respuesta.status == 200, f"Código de estado {respuesta.status}: {respuesta.body}"
+    if "error" not in context.agendamiento.response:
+        assert respuesta.json() == context.agendamiento.response, \
+            f"Respuesta con agendas del almacén {respuesta.json()} difiere de {context.agendamiento.response}"
+
+
+def _enviar_solicitud_repetida(context, body):
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/schedule-appointment",
+            json=body,
+            headers={"Content-Type": "application/json"}
+        )
+        context.agendamiento.repeated_response = response.json()
+        context.agendamiento.cache_header = response.headers.get("X-Cache")
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.repeated_response = {"error": "API no disponible"}
+
+
+@when('se registran el empleado y el abogado con sus agendas')
+def step_registrar_personas(context):
+    body = context.agendamiento.request_body
+    # Identificadores únicos: el registro del servidor se conserva entre escenarios
+    sufijo = uuid.uuid4().hex[:12]
+    context.agendamiento.personas = {"employee": f"empleado-{sufijo}", "lawyer": f"abogado-{sufijo}"}
+    try:
+        for rol, ruta, campo_agenda in (("employee", "employees", "employee_schedule"),
+                                        ("lawyer", "lawyers", "lawyer_schedule")):
+            response = requests.put(
+                f"{context.agendamiento.api_url}/registry/{ruta}/{context.agendamiento.personas[rol]}",
+                json={"config": body[rol], "schedule": body.get(campo_agenda)}
+            )
+            assert response.status_code == 200, f"Registro fallido: {response.status_code} {response.text}"
+        context.agendamiento.registro_disponible = True
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, omitiendo registro...")
+        context.agendamiento.registro_disponible = False
+
+
+@when('se repite la solicitud con el empleado y el abogado registrados')
+def step_repetir_solicitud_registrados(context):
+    if not context.agendamiento.registro_disponible:
+        context.agendamiento.repeated_response = {"error": "API no disponible"}
+        return
+
+    body = dict(context.agendamiento.request_body)
+    for rol, campo_agenda in (("employee", "employee_schedule"), ("lawyer", "lawyer_schedule")):
+        body.pop(rol)
+        body.pop(campo_agenda, None)
+        body[f"{rol}_id"] = context.agendamiento.personas[rol]
+    _enviar_solicitud_repetida(context, body)
+
+
+@when('se agrega al empleado registrado una reunión el "{fecha}" de "{hora_inicio}" a "{hora_fin}"')
+def step_agregar_reunion_registrada(context, fecha, hora_inicio, hora_fin):
+    if not context.agendamiento.registro_disponible:
+        return
+
+    response = requests.post(
+        f"{context.agendamiento.api_url}/registry/employees/{context.agendamiento.personas['employee']}/meetings",
+        json={"add": [[fecha, hora_inicio, hora_fin]]}
+    )
+    assert response.status_code == 200, f"Actualización fallida: {response.status_code} {response.text}"
+    assert response.json()["meeting_count"] >= 1, f"Respuesta inesperada {response.json()}"
+
+
+@when('se elimina el empleado registrado')
+def step_eliminar_empleado_registrado(context):
+    if not context.agendamiento.registro_disponible:
+        return
+
+    response = requests.delete(
+        f"{context.agendamiento.api_url}/registry/employees/{context.agendamiento.personas['employee']}"
+    )
+    assert response.status_code == 204, f"Eliminación fallida: {response.status_code} {response.text}"
+
+
+@then('consultar, actualizar o eliminar el empleado eliminado debe responder 404')
+def step_verificar_empleado_eliminado(context):
+    if not context.agendamiento.registro_disponible:
+        return
+
+    url = f"{context.agendamiento.api_url}/registry/employees/{context.agendamiento.personas['employee']}"
+    for response in (requests.get(url), requests.post(f"{url}/meetings", json={"add": [], "remove": []}),
+                     requests.delete(url)):
+        assert response.status_code == 404, f"Esperaba 404, obtuve {response.status_code} {response.text}"
+        assert "No registered employee" in response.json()["detail"], f"Detalle inesperado {response.text}"
+
+
+@when('se reservan {cantidad:d} citas para el empleado y el abogado registrados')
+def step_reservar_citas(context, cantidad):
+    context.agendamiento.reservas = []
+    if not context.agendamiento.registro_disponible:
+        return
+
+    body = dict(context.agendamiento.request_body)
+    for rol, campo_agenda in (("employee", "employee_schedule"), ("lawyer", "lawyer_schedule")):
+        body.pop(rol)
+        body.pop(campo_agenda, None)
+        body[f"{rol}_id"] = context.agendamiento.personas[rol]
+    for _ in range(cantidad):
+        response = requests.post(f"{context.agendamiento.api_url}/book-appointment", json=body)
+        assert response.status_code == 200, f"Reserva fallida: {response.status_code} {response.text}"
+        context.agendamiento.reservas.append(response.json())
+
+
+@then('la primera reserva debe coincidir con la respuesta de agendamiento')
+def step_verificar_primera_reserva(context):
+    if not context.agendamiento.reservas:
+        return
+
+    reserva = context.agendamiento.reservas[0]
+    assert reserva["booked"], f"La cita no fue reservada: {reserva}"
+    for campo in ("appointment_date", "appointment_time"):
+        assert reserva[campo] == context.agendamiento.response[campo], \
+            f"{campo}: reserva {reserva[campo]}, agendamiento {context.agendamiento.response[campo]}"
+
+
+@then('las reservas no deben traslaparse')
+def step_verificar_reservas_sin_traslape(context):
+    reservas = context.agendamiento.reservas
+    for indice, reserva in enumerate(reservas):
+        assert reserva["booked"], f"La cita no fue reservada: {reserva}"
+        for otra in reservas[:indice]:
+            traslape = reserva["appointment_date"] == otra["appointment_date"] \
+                and reserva["appointment_time"] < otra["appointment_end_time"] \
+                and otra["appointment_time"] < reserva["appointment_end_time"]
+            assert not traslape, f"Reservas traslapadas: {otra} y {reserva}"
+
+
+@then('la fecha de la cita repetida debe ser "{fecha_esperada}"')
+def step_verificar_fecha_cita_repetida(context, fecha_esperada):
+    if "error" in context.agendamiento.repeated_response:
+        return
+
+    fecha_cita = context.agendamiento.repeated_response.get("appointment_date")
+    assert fecha_cita == fecha_esperada, f"Esperaba {fecha_esperada}, obtuve {fecha_cita}"
+
+
+@when('se reserva para otro empleado y otro abogado mientras sigue en curso una reserva del primer empleado')
+def step_reservas_simultaneas(context):
+    import threading
+    from utils.compact_schedule import Meeting
+    from utils.person_registry import PersonRegistry
+
+    empleado = EmployeeConfig(
+        work_days=context.agendamiento.empleado_dias,
+        start_time=context.agendamiento.empleado_horario_inicio,
+        end_time=context.agendamiento.empleado_horario_fin,
+        works_holidays=context.agendamiento.trabaja_festivos
+    )
+    registro = PersonRegistry()
+    personas = {
+        "primera": [registro.put("employee", "empleado-1", empleado), registro.put("lawyer", "abogado-1", context.agendamiento.lawyer)],
+        "otra": [registro.put("employee", "empleado-2", empleado), registro.put("lawyer", "abogado-2", context.agendamiento.lawyer)]
+    }
+    reunion = Meeting(date(2024, 1, 15).toordinal(), 9 * 60, 10 * 60)
+
+    def reservar(nombre):
+        registro.reserve(reunion, [(persona, persona.schedule.version) for persona in personas[nombre]])
+
+    hilos = {nombre: threading.Thread(target=reservar, args=(nombre,)) for nombre in personas}
+    # Una reserva en curso del primer empleado mantiene tomado su bloqueo
+    en_curso = registro._person_lock("employee", "empleado-1")
+    en_curso.acquire()
+    try:
+        hilos["primera"].start()
+        hilos["otra"].start()
+        hilos["otra"].join(timeout=5)
+        context.agendamiento.otra_reserva_terminada = not hilos["otra"].is_alive()
+        hilos["primera"].join(timeout=0.2)
+        context.agendamiento.primera_reserva_esperando = hilos["primera"].is_alive()
+    finally:
+        en_curso.release()
+    hilos["primera"].join(timeout=5)
+    context.agendamiento.primera_reserva_terminada = not hilos["primera"].is_alive()
+    context.agendamiento.agendas_reservadas = {
+        persona.person_id: persona.schedule.busy_intervals(date(2024, 1, 15))
+        for grupo in personas.values() for persona in grupo
+    }
+    registro.close()
+
+
+@then('la reserva de las otras personas debe terminar sin esperar a la que está en curso')
+def step_verificar_reserva_sin_espera(context):
+    assert context.agendamiento.otra_reserva_terminada, "La reserva de otras personas esperó a la que estaba en curso"
+    assert context.agendamiento.primera_reserva_esperando, "La reserva del primer empleado no esperó su bloqueo"
+
+
+@then('la reserva del primer empleado debe completarse cuando termina la que estaba en curso')
+def step_verificar_reserva_completada(context):
+    assert context.agendamiento.primera_reserva_terminada, "La reserva del primer empleado no terminó"
+    for persona, intervalos in context.agendamiento.agendas_reservadas.items():
+        assert intervalos == ((540, 600),), f"Agenda de {persona}: {intervalos}"
+
+
+@when('se envía la solicitud {cantidad:d} veces a un enrutador con {fragmentos:d} fragmentos locales')
+def step_enviar_enrutador_local(context, cantidad, fragmentos):
+    # La app se importa solo aquí: el resto de escenarios usa la API en ejecución
+    from main import app
+    from utils.sharding import LocalShard, ShardRouter, call_asgi
+
+    router = ShardRouter([LocalShard(app) for _ in range(fragmentos)])
+    body = json.dumps(context.agendamiento.request_body).encode()
+    headers = [(b"content-type", b"application/json")]
+    context.agendamiento.respuestas_enrutador = [
+        asyncio.run(call_asgi(router, "POST", "/schedule-appointment", b"", headers, body))
+        for _ in range(cantidad)
+    ]
+    context.agendamiento.rutas_enrutador = list(router.routed)
+
+
+@then('las respuestas del enrutador deben ser iguales a la respuesta de agendamiento')
+def step_verificar_respuestas_enrutador(context):
+    for respuesta in context.agendamiento.respuestas_enrutador:
+        assert respuesta.status == 200, f"Código de estado {respuesta.status}: {respuesta.body}"
+        if "error" not in context.agendamiento.response:
+            assert respuesta.json() == context.agendamiento.response, \
+                f"Respuesta del enrutador {respuesta.json()} difiere de {context.agendamiento.response}"
+
+
+@then('todas deben llegar al mismo fragmento y la última desde su caché')
+def step_verificar_mismo_fragmento(context):
+    rutas = context.agendamiento.rutas_enrutador
+    assert sorted(rutas)[:-1] == [0] * (len(rutas) - 1), f"Solicitudes repartidas entre fragmentos: {rutas}"
+    cabeceras = dict(context.agendamiento.respuestas_enrutador[-1].headers)
+    assert cabeceras.get(b"x-cache") == b"HIT", f"Esperaba X-Cache HIT, obtuve {cabeceras.get(b'x-cache')}"
+
+
+class FragmentoSinCopias:
+    """Fragmento que rechaza todas las solicitudes (p. ej. caído durante una reserva)."""
+
+    async def request(self, method, path, query, headers, body):
+        from utils.sharding import json_response
+        return json_response(500, {"detail": "Internal server error"})
+
+    async def close(self):
+        pass
+
+
+@when('se reserva una cita en un enrutador cuyo segundo fragmento no acepta la copia del empleado')
+def step_reservar_con_copia_fallida(context):
+    from main import app
+    from utils.sharding import LocalShard, ShardRouter, call_asgi
+
+    router = ShardRouter([LocalShard(app), FragmentoSinCopias()])
+    sufijo = uuid.uuid4().hex[:12]
+    # El abogado debe pertenecer al primer fragmento, el único que responde
+    abogado = next(f"abogado-{sufijo}-{indice}" for indice in range(100)
+                   if router.ring.shard_for(f"abogado-{sufijo}-{indice}") == 0)
+    context.agendamiento.personas = {"employee": f"empleado-{sufijo}", "lawyer": abogado}
+    body = context.agendamiento.request_body
+    headers = [(b"content-type", b"application/json")]
+
+    async def reservar():
+        # Las personas se registran directamente en el primer fragmento
+        for rol, ruta in (("employee", "employees"), ("lawyer", "lawyers")):
+            respuesta = await call_asgi(app, "PUT", f"/registry/{ruta}/{context.agendamiento.personas[rol]}", b"",
+                                        headers, json.dumps({"config": body[rol]}).encode())
+            assert respuesta.status == 200, f"Registro fallido: {respuesta.status} {respuesta.body}"
+        reserva = dict(body, employee_id=context.agendamiento.personas["employee"], lawyer_id=abogado)
+        for campo in ("employee", "lawyer", "employee_schedule", "lawyer_schedule"):
+            reserva.pop(campo, None)
+        context.agendamiento.reserva_fragmentada = await call_asgi(
+            router, "POST", "/book-appointment", b"", headers, json.dumps(reserva).encode()
+        )
+        context.agendamiento.personas_tras_reserva = [
+            (await call_asgi(app, "GET", f"/registry/{ruta}/{context.agendamiento.personas[rol]}", b"", [], b"")).json()
+            for rol, ruta in (("employee", "employees"), ("lawyer", "lawyers"))
+        ]
+
+    asyncio.run(reservar())
+
+
+@then('la reserva debe responder 502 y quedar cancelada en el fragmento del abogado')
+def step_verificar_reserva_cancelada(context):
+    respuesta = context.agendamiento.reserva_fragmentada
+    assert respuesta.status == 502, f"Código de estado {respuesta.status}: {respuesta.body}"
+    assert "was cancelled" in respuesta.json()["detail"], f"Detalle inesperado {respuesta.body}"
+    for persona in context.agendamiento.personas_tras_reserva:
+        assert persona["meeting_count"] == 0, f"La reserva no se canceló: {persona}"
+
+
+@when('se publica el calendario en memoria compartida desde "{fecha_inicio}" por {dias:d} días')
+def step_publicar_calendario_compartido(context, fecha_inicio, dias):
+    from utils.shared_calendar import publish_shared_calendar
+    from utils.holiday_handler import normalize_holiday_dates
+
+    feriados = normalize_holiday_dates(context.agendamiento.holiday_dates)
+    context.agendamiento.calendario_compartido = f"scheduler-test-{uuid.uuid4().hex[:8]}"
+    context.agendamiento.publicar_calendario = lambda: publish_shared_calendar(
+        context.agendamiento.calendario_compartido, feriados.digest, feriados, date.fromisoformat(fecha_inicio), dias
+    )
+    context.agendamiento.generaciones = [context.agendamiento.publicar_calendario()]
+
+
+@then('los días hábiles del calendario compartido deben coincidir con el cálculo local')
+def step_verificar_calendario_compartido(context):
+    from utils.business_calendar import SharedCalendar, WeeklyCalendar
+    from utils.date_calculator import WEEK_DAYS
+    from utils.holiday_handler import normalize_holiday_dates
+
+    dias_semana = frozenset(indice for indice, dia in enumerate(WEEK_DAYS) if dia in context.agendamiento.empleado_dias)
+    feriados = normalize_holiday_dates(context.agendamiento.holiday_dates)
+    argumentos = (dias_semana, feriados, context.agendamiento.trabaja_festivos)
+    nombre_anterior = os.environ.get("SHARED_CALENDAR_NAME")
+    os.environ["SHARED_CALENDAR_NAME"] = context.agendamiento.calendario_compartido
+    try:
+        compartido, local = SharedCalendar(*argumentos), WeeklyCalendar(*argumentos)
+        assert compartido._counts() is not None, "El calendario compartido no está publicado"
+        for desplazamiento in range(0, 400, 3):
+            fecha = date(2024, 1, 1) + timedelta(days=desplazamiento)
+            obtenido, esperado = [
+                (calendario.next_work_day(fecha), calendario.nth_work_day_after(fecha, 5),
+                 calendario.count_work_days(fecha, fecha + timedelta(days=30)))
+                for calendario in (compartido, local)
+            ]
+            assert obtenido == esperado, f"{fecha}: compartido {obtenido}, local {esperado}"
+    finally:
+        if nombre_anterior is None:
+            os.environ.pop("SHARED_CALENDAR_NAME")
+        else:
+            os.environ["SHARED_CALENDAR_NAME"] = nombre_anterior
+
+
+@then('al republicar el calendario la generación debe aumentar')
+def step_republicar_calendario(context):
+    from utils.shared_calendar import get_shared_reader, unpublish_shared_calendar
+
+    try:
+        context.agendamiento.generaciones.append(context.agendamiento.publicar_calendario())
+        generacion_leida = get_shared_reader(context.agendamiento.calendario_compartido).current().generation
+        assert context.agendamiento.generaciones == [1, 2], f"Generaciones {context.agendamiento.generaciones}"
+        assert generacion_leida == 2, f"El lector sigue en la generación {generacion_leida}"
+    finally:
+        unpublish_shared_calendar(context.agendamiento.calendario_compartido)
+
+
+@when('se registran {cantidad:d} mensajes a través de la cola de logging')
+def step_registrar_mensajes_en_cola(context, cantidad):
+    import io
+    import logging
+    import time as reloj
+    from utils.log_pipeline import LogPipeline
+
+    raiz = logging.getLogger()
+    manejadores, nivel = list(raiz.handlers), raiz.level
+    salida = io.StringIO()
+    pipeline = LogPipeline(mode="queue", level="INFO", queue_size=cantidad)
+    pipeline.output_handler.setStream(salida)
+    pipeline.start()
+    try:
+        registro = logging.getLogger("scheduler.test")
+        registro.info("mensaje %d", 0)
+        limite = reloj.monotonic() + 5
+        while "mensaje 0\n" not in salida.getvalue() and reloj.monotonic() < limite:
+            reloj.sleep(0.01)
+        context.agendamiento.salida_antes_de_detener = salida.getvalue()
+        for numero in range(1, cantidad):
+            registro.info("mensaje %d", numero)
+    finally:
+        pipeline.stop()
+        for manejador in manejadores:
+            raiz.addHandler(manejador)
+        raiz.setLevel(nivel)
+    context.agendamiento.salida_registros = salida.getvalue()
+    context.agendamiento.registros_descartados = pipeline.dropped
+
+
+@then('el primer mensaje debe llegar al manejador de salida mientras la cola está activa')
+def step_verificar_primer_registro(context):
+    salida = context.agendamiento.salida_antes_de_detener
+    assert salida == "INFO:scheduler.test:mensaje 0\n", f"Salida antes de detener la cola: {salida!r}"
+
+
+@then('al detener la cola deben haberse escrito los {cantidad:d} mensajes sin descartar ninguno')
+def step_verificar_cola_vaciada(context, cantidad):
+    lineas = context.agendamiento.salida_registros.splitlines()
+    esperadas = [f"INFO:scheduler.test:mensaje {numero}" for numero in range(cantidad)]
+    assert context.agendamiento.registros_descartados == 0, \
+        f"Se descartaron {context.agendamiento.registros_descartados} registros"
+    assert lineas == esperadas, f"Se escribieron {len(lineas)} de {cantidad} mensajes"
+
+
+@when('se publica el calendario en memoria compartida sin espacio reservado para los metadatos')
+def step_publicar_calendario_sin_reserva(context):
+    from utils import shared_calendar
+    from utils.holiday_handler import normalize_holiday_dates
+
+    feriados = normalize_holiday_dates(context.agendamiento.holiday_dates)
+    context.agendamiento.calendario_compartido = f"scheduler-test-{uuid.uuid4().hex[:8]}"
+    reserva = shared_calendar.ARRAY_METADATA_RESERVE
+    shared_calendar.ARRAY_METADATA_RESERVE = 0
+    try:
+        shared_calendar.publish_shared_calendar(context.agendamiento.calendario_compartido, feriados.digest,
+                                                feriados, date(2024, 1, 1), 30)
+        context.agendamiento.error_publicacion = None
+    except ValueError as error:
+        context.agendamiento.error_publicacion = str(error)
+    finally:
+        shared_calendar.ARRAY_METADATA_RESERVE = reserva
+
+
+@then('la publicación debe rechazarse por metadatos demasiado grandes sin cambiar de generación')
+def step_verificar_publicacion_rechazada(context):
+    from utils.shared_calendar import publish_shared_calendar, unpublish_shared_calendar
+    from utils.holiday_handler import normalize_holiday_dates
+
+    error = context.agendamiento.error_publicacion
+    assert error and "metadata" in error, f"La publicación no se rechazó: {error}"
+    feriados = normalize_holiday_dates(context.agendamiento.holiday_dates)
+    try:
+        generacion = publish_shared_calendar(context.agendamiento.calendario_compartido, feriados.digest,
+                                             feriados, date(2024, 1, 1), 30)
+        assert generacion == 1, f"La publicación rechazada avanzó la generación a {generacion - 1}"
+    finally:
+        unpublish_shared_calendar(context.agendamiento.calendario_compartido)
+
+
+@when('se genera la tabla de fechas de cita desde "{fecha_inicio}" hasta "{fecha_fin}"')
+def step_generar_tabla_fechas(context, fecha_inicio, fecha_fin):
+    employee = EmployeeConfig(
+        work_days=context.agendamiento.empleado_dias,
+        start_time=context.agendamiento.empleado_horario_inicio,
+        end_time=context.agendamiento.empleado_horario_fin,
+        works_holidays=context.agendamiento.trabaja_festivos
+    )
+    request_data = {
+        "start_date": fecha_inicio,
+        "end_date": fecha_fin,
+        "employee": employee.model_dump(mode='json'),
+        "holiday_dates": [holiday.isoformat() for holiday in context.agendamiento.holiday_dates],
+        "lead_time_days": context.agendamiento.dias_anticipacion
+    }
+
+    try:
+        response = requests.post(
+            f"{context.agendamiento.api_url}/appointment-date-table",
+            json=request_data,
+            headers={"Content-Type": "application/json"}
+        )
+        context.agendamiento.tabla_response = response.json()
+        context.agendamiento.tabla_status_code = response.status_code
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, usando cálculo local...")
+        context.agendamiento.tabla_response = {"error": "API no disponible"}
+        context.agendamiento.tabla_status_code = 500
+
+
+@then('la tabla debe contener {cantidad:d} filas')
+def step_verificar_filas_tabla(context, cantidad):
+    if "error" in context.agendamiento.tabla_response:
+        return
+
+    assert context.agendamiento.tabla_status_code == 200, f"Código de estado {context.agendamiento.tabla_status_code}"
+    filas = context.agendamiento.tabla_response["rows"]
+    assert len(filas) == cantidad, f"Esperaba {cantidad} filas, obtuve {len(filas)}"
+
+
+@then('para el "{fecha}" con variante "{variante}" la fecha de la cita debe ser "{fecha_esperada}"')
+def step_verificar_fila_tabla(context, fecha, variante, fecha_esperada):
+    if "error" in context.agendamiento.tabla_response:
+        return
+
+    fila = next((fila for fila in context.agendamiento.tabla_response["rows"]
+                 if fila["current_date"] == fecha and fila["time_variant"] == variante), None)
+    assert fila is not None, f"No hay fila para {fecha} ({variante})"
+    assert fila["appointment_date"] == fecha_esperada, \
+        f"Esperaba {fecha_esperada}, obtuve {fila['appointment_date']}"
+
+
+@when('se repite la solicitud {cantidad:d} veces con un umbral de costo de ejecución de {umbral:d} en el grupo de procesos')
+def step_repetir_solicitud_grupo_procesos(context, cantidad, umbral):
+    # La app se importa solo aquí; su capa de ejecución se reemplaza por una configurada para el escenario
+    import main
+    from utils.execution import execution_layer_from_environment
+    from utils.sharding import call_asgi
+
+    variables = {"EXECUTION_POOL": "process", "EXECUTION_MAX_WORKERS": "1", "EXECUTION_COST_THRESHOLD": str(umbral)}
+    anteriores = {variable: os.environ.get(variable) for variable in variables}
+    os.environ.update(variables)
+    capa_anterior = main.execution_layer
+    main.execution_layer = execution_layer_from_environment()
+    context.agendamiento.umbral_ejecucion = umbral
+    try:
+        body = json.dumps(context.agendamiento.request_body).encode()
+        headers = [(b"content-type", b"application/json"), (b"cache-control", b"no-cache")]
+        context.agendamiento.respuestas_delegadas = [
+            asyncio.run(call_asgi(main.app, "POST", "/schedule-appointment", b"", headers, body))
+            for _ in range(cantidad)
+        ]
+        context.agendamiento.estadisticas_ejecucion = asyncio.run(
+            call_asgi(main.app, "GET", "/execution/stats", b"", [], b"")
+        ).json()
+    finally:
+        main.execution_layer.shutdown()
+        main.execution_layer = capa_anterior
+        for variable, valor in anteriores.items():
+            if valor is None:
+                del os.environ[variable]
+            else:
+                os.environ[variable] = valor
+
+
+@then('las respuestas delegadas deben ser iguales a la respuesta de agendamiento')
+def step_verificar_respuestas_delegadas(context):
+    for respuesta in context.agendamiento.respuestas_delegadas:
+        assert respuesta.status == 200, f"Código de estado {respuesta.status}: {respuesta.body}"
+        if "error" not in context.agendamiento.response:
+            assert respuesta.json() == context.agendamiento.response, \
+                f"Respuesta delegada {respuesta.json()} difiere de {context.agendamiento.response}"
+
+
+@then('las estadísticas de ejecución deben mostrar {cantidad:d} solicitudes delegadas y completadas sin ejecución en línea')
+def step_verificar_estadisticas_ejecucion(context, cantidad):
+    estadisticas = context.agendamiento.estadisticas_ejecucion
+    esperadas = {"pool": "process", "cost_threshold": context.agendamiento.umbral_ejecucion, "inline": 0, "submitted": cantidad,
+                 "completed": cantidad, "pending": 0, "queued": 0}
+    obtenidas = {campo: estadisticas.get(campo) for campo in esperadas}
+    assert obtenidas == esperadas, f"Esperaba {esperadas}, obtuve {obtenidas}"
+
+
+@when('se consultan las métricas del servicio')
+def step_consultar_metricas(context):
+    try:
+        response = requests.get(f"{context.agendamiento.api_url}/metrics")
+        context.agendamiento.metricas = response.text
+        context.agendamiento.metricas_content_type = response.headers.get("Content-Type", "")
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, omitiendo métricas...")
+        context.agendamiento.metricas = None
+
+
+@then('las métricas deben incluir la duración de la etapa "{etapa}"')
+def step_verificar_metrica_etapa(context, etapa):
+    if context.agendamiento.metricas is None:
+        return
+
+    assert context.agendamiento.metricas_content_type.startswith("text/plain"), \
+        f"Content-Type inesperado {context.agendamiento.metricas_content_type}"
+    serie = f'scheduler_stage_duration_seconds_count{{stage="{etapa}"}}'
+    assert serie in context.agendamiento.metricas, f"No se encontró {serie} en /metrics"
+
+
+@then('las métricas deben contar resultados "{motivo}"')
+def step_verificar_metrica_resultado(context, motivo):
+    if context.agendamiento.metricas is None:
+        return
+
+    serie = f'scheduler_appointment_outcomes_total{{reason="{motivo}"}}'
+    linea = next((linea for linea in context.agendamiento.metricas.splitlines() if linea.startswith(serie)), None)
+    assert linea is not None, f"No se encontró {serie} en /metrics"
+    assert int(linea.rsplit(" ", 1)[1]) >= 1, f"Contador vacío: {linea}"
+
+
+@then('las métricas no deben usar el texto de los motivos como etiqueta')
+def step_verificar_codigos_resultado(context):
+    if context.agendamiento.metricas is None:
+        return
+
+    from utils.metrics import OUTCOME_CODES
+
+    codigos = {"scheduled", "other"} | {codigo for _, codigo in OUTCOME_CODES}
+    for linea in context.agendamiento.metricas.splitlines():
+        if linea.startswith("scheduler_appointment_outcomes_total{"):
+            motivo = linea.split('reason="', 1)[1].split('"', 1)[0]
+            assert motivo in codigos, f"Etiqueta de motivo fuera del conjunto fijo: {linea}"
+
+
+@when('se consulta la preparación del servicio')
+def step_consultar_preparacion(context):
+    try:
+        response = requests.get(f"{context.agendamiento.api_url}/ready")
+        context.agendamiento.preparacion = (response.status_code, response.json())
+    except requests.exceptions.ConnectionError:
+        print("API no disponible, omitiendo preparación...")
+        context.agendamiento.preparacion = None
+
+
+@then('el servicio debe estar listo con la duración de las fases "{fases}"')
+def step_verificar_preparacion(context, fases):
+    if context.agendamiento.preparacion is None:
+        return
+
+    estado, perfil = context.agendamiento.preparacion
+    assert estado == 200 and perfil["ready"], f"El servicio no está listo: {estado} {perfil}"
+    assert perfil["ready_after_seconds"] > 0, f"Tiempo de arranque inválido: {perfil}"
+    for fase in fases.split(", "):
+        assert fase in perfil["phases"], f"Falta la fase {fase} en {perfil['phases']}"
+
+
 @then('la fecha de notificación debe ser "{fecha_esperada}"')
 def step_verificar_fecha_notificacion(context, fecha_esperada):
     assert context.agendamiento.response is not None, "No hay respuesta de la API"
@@ -1,13 +1,15 @@
-import csv
 import sys
 import os
-from datetime import date, time, timedelta, datetime
+from datetime import time
 from typing import List, Tuple
 
-# Add src directory to path for importing modules
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'scheduler'))
+# Add src directory to path for importing modules (first, so its utils package
+# takes precedence over this test utils package)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'scheduler'))
 
-from models import BusyMeeting, BusySchedule
+from models import BusySchedule
+from utils.schedule_ingestion import load_busy_schedule, parse_slot_header
+from utils.slot_bitmap import MINUTES_PER_DAY, mask_to_intervals, minutes_to_time
 
 
 def parse_time_from_header(header_time: str) -> time:
@@ -22,41 +24,11 @@ def find_busy_blocks(row_data: List[str], time_headers: List[str]) -> List[Tuple
     Finds consecutive blocks where the value is '1' (busy).
     Returns a list of tuples (start_time, end_time).
     """
-    blocks = []
-    block_start = None
-
-    for i, value in enumerate(row_data):
-        if value == '1':  # Busy
-            if block_start is None:
-                block_start = i
-        else:  # Free or end of data
-            if block_start is not None:
-                # End current block
-                start_time = parse_time_from_header(time_headers[block_start])
-                # End time is start of next slot (15 min after last busy slot)
-                last_busy_slot = i - 1
-                last_slot_time = parse_time_from_header(time_headers[last_busy_slot])
-                # Add 15 minutes to get end time
-                datetime_temp = datetime.combine(date.today(), last_slot_time)
-                datetime_end = datetime_temp + timedelta(minutes=15)
-                end_time = datetime_end.time()
-
-                blocks.append((start_time, end_time))
-                block_start = None
-
-    # If file ends with a busy block
-    if block_start is not None:
-        start_time = parse_time_from_header(time_headers[block_start])
-        last_busy_slot = len(row_data) - 1
-        last_slot_time = parse_time_from_header(time_headers[last_busy_slot])
-        # Add 15 minutes to get end time
-        datetime_temp = datetime.combine(date.today(), last_slot_time)
-        datetime_end = datetime_temp + timedelta(minutes=15)
-        end_time = datetime_end.time()
-
-        blocks.append((start_time, end_time))
-
-    return blocks
+    header = parse_slot_header(["date"] + time_headers)
+    mask = int("".join(reversed(row_data)), 2) << header.first_slot if row_data else 0
+
+    return [(minutes_to_time(start_minute), minutes_to_time(min(end_minute, MINUTES_PER_DAY - 1)))
+            for start_minute, end_minute in mask_to_intervals(mask, header.slot_minutes)]
 
 
 def parse_csv_schedule(file_path: str) -> BusySchedule:
@@ -67,35 +39,7 @@ def parse_csv_schedule(file_path: str) -> BusySchedule:
     - First column: date in YYYY-MM-DD format
     - Rest of columns: 15-minute time slots (1 = busy, 0 = free)
     """
-    meetings = []
-
-    with open(file_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        headers = next(reader)  # First row with headers
-
-        # Extract time headers (ignore first column 'date')
-        time_headers = headers[1:]
-
-        for row in reader:
-            date_str = row[0]
-            date_obj = date.fromisoformat(date_str)
-
-            # Occupancy data (ignore first column which is date)
-            occupancy_data = row[1:]
-
-            # Find busy time blocks
-            busy_blocks = find_busy_blocks(occupancy_data, time_headers)
-
-            # Create meetings for each busy block
-            for start_time, end_time in busy_blocks:
-                meeting = BusyMeeting(
-                    date=date_obj,
-                    start_time=start_time,
-                    end_time=end_time
-                )
-                meetings.append(meeting)
-
-    return BusySchedule(meetings=meetings)
+    return load_busy_schedule(file_path)
 
 
 def build_schedules_from_files(data_path: str) -> Tuple[BusySchedule, BusySchedule]: